@@ -1,7 +1,9 @@
 from modelCodeGen import CodeGenerator
-from jsonLoader import process_json
+from jsonLoader import process_json, SchemaError
 
-num_tests = 1
+num_tests = 9
+# invalidN.json must be rejected with the SchemaError message in invalidN.txt
+num_invalid_tests = 3
 
 for test_idx in range(1, num_tests+1):
     input_file = open(f"tests/inputs/input{test_idx}.json", "r")
@@ -10,7 +12,7 @@ for test_idx in range(1, num_tests+1):
     print(json_dict)
     input_file.close()
 
-    codegen_obj = CodeGenerator("PrimaryModel")
+    codegen_obj = CodeGenerator("PrimaryModel", profile=bool(json_dict.get("training", {}).get("profile", False)))
     codegen_obj.set_model_dict(json_dict)
     codegen_linelist = codegen_obj.codegen_model()
     codegen_str = codegen_obj.str_traversal_codegen(codegen_linelist)
@@ -25,3 +27,23 @@ for test_idx in range(1, num_tests+1):
     else:
         print("Test passed! Generated code matches expected result!")
 
+for test_idx in range(1, num_invalid_tests+1):
+    input_file = open(f"tests/inputs/invalid{test_idx}.json", "r")
+    raw_json = input_file.read()
+    input_file.close()
+
+    expected_file = open(f"tests/expected/invalid{test_idx}.txt", "r")
+    expected_str = expected_file.read()
+    expected_file.close()
+    print(f"Checking invalid test {test_idx}...")
+    try:
+        process_json(raw_json)
+        message = "no error"
+    except SchemaError as error:
+        message = str(error)
+    if message.strip() != expected_str.strip():
+        print(message)
+        print(expected_str)
+        print("Test failed! Validation error does not match expected result.")
+    else:
+        print("Test passed! Validation error matches expected result!")
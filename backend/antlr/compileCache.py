@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+
+CACHE_DIR = "backend/antlr/build/compile_cache"
+MAX_ENTRIES = 64
+
+class CompileCache():
+    # Content-addressed store of generated model sources.
+    # Entries are keyed by a hash of the canonical model JSON and the codegen version,
+    # and the least recently used entries are evicted once max_entries is exceeded.
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def make_key(self, json_dict, name, codegen_version):
+        # Canonical form: sorted keys and no whitespace, so formatting changes in the
+        # frontend's JSON output do not cause spurious misses
+        canonical = json.dumps(json_dict, sort_keys=True, separators=(",", ":"))
+        key_str = f"{codegen_version}\n{name}\n{canonical}"
+        return hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, "r") as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        # refresh the mtime so eviction sees this entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, source, param_count):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {"source": source, "param_count": param_count}
+        path = self.entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as entry_file:
+            entry_file.write(json.dumps(entry))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
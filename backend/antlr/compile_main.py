@@ -1,37 +1,80 @@
 from modelCodeGen import CodeGenerator
-from jsonLoader import process_json
+from jsonLoader import process_json, SchemaError
+from compileCache import CompileCache
+from shapeAnalyzer import analyze_model, format_analysis, ShapeError
+from memoryPlanner import format_plan, MemoryBudgetError
 import sys
 import json
-import importlib
+
+def write_model_file(model_filename, gen_str):
+    # Only rewrite the file when its contents differ from the generated source
+    try:
+        with open(model_filename, "r") as model_file:
+            if model_file.read() == gen_str:
+                return
+    except OSError:
+        pass
+    with open(model_filename, "w+") as model_file:
+        model_file.write(gen_str)
+
+model_filenames = ["backend/local/build/PrimaryModel.py", "backend/antlr/build/PrimaryModel.py"]
+# Normalized model JSON of the generated model, read by run_main.py to key its run store
+packet_filename = "backend/local/build/PrimaryModel.json"
+
+def compile_model(json_dict, cache=None):
+    # Returns (source, parameter count, analysis report lines) for a processed model JSON.
+    # Raises ShapeError if the model is invalid, or MemoryBudgetError if it cannot fit its
+    # memory budget. Cache hits skip analysis and codegen entirely.
+    if cache is not None:
+        cache_key = cache.make_key(json_dict, "PrimaryModel", CodeGenerator.VERSION)
+        cache_entry = cache.get(cache_key)
+        if cache_entry is not None:
+            return cache_entry["source"], cache_entry["param_count"], []
+
+    # Validate shapes and count parameters statically, before any code is generated
+    analysis = analyze_model(json_dict)
+
+    gen_obj = CodeGenerator("PrimaryModel", profile=bool(json_dict.get("training", {}).get("profile", False)))
+    gen_obj.set_model_dict(json_dict)
+    gen_str = gen_obj.str_traversal_codegen(gen_obj.codegen_model())
+    #print(gen_str)
+
+    report_lines = format_analysis(analysis)
+    # Only layers that survive the IR passes end up in the generated model; layers whose
+    # result never reaches the output are dropped and hold no parameters
+    ir = gen_obj.get_ir()
+    if ir.dead_layers:
+        report_lines.append(f"Unused layers removed: {', '.join(str(layer_idx) for layer_idx in ir.dead_layers)}")
+    if gen_obj.get_memory_plan() is not None:
+        report_lines.append(format_plan(gen_obj.get_memory_plan()))
+    param_count = sum(analysis["layers"][node.index - 1]["parameters"] for node in ir.nodes)
+    if cache is not None:
+        cache.put(cache_key, gen_str, param_count)
+    return gen_str, param_count, report_lines
 
 def main():
     if len(sys.argv) != 2:
         print("CALL ERROR: \nUsage: python3 compile_main.py path_to_json_file")
         return -1
     json_filename = sys.argv[1]
-    model_filename = "backend/local/build/PrimaryModel.py"
     with open(json_filename, "r") as json_file:
         json_str = json_file.read()
 
-    json_dict = process_json(json_str=json_str)
-    gen_obj = CodeGenerator("PrimaryModel")
-    gen_obj.set_model_dict(json_dict)
-    gen_str = gen_obj.str_traversal_codegen(gen_obj.codegen_model())
-    #print(gen_str)
-
-    with open(model_filename, "w+") as model_file:
-        model_file.write(gen_str)
-
-    model_filename2 = "backend/antlr/build/PrimaryModel.py"
-    with open(model_filename2, "w+") as model_file:
-        model_file.write(gen_str)
+    try:
+        json_dict = process_json(json_str=json_str)
+        gen_str, param_count, analysis_lines = compile_model(json_dict, CompileCache())
+    except (SchemaError, ShapeError, MemoryBudgetError) as error:
+        print(f"MODEL ERROR: {error}")
+        return -1
+    for line in analysis_lines:
+        print(line)
 
-    #get parameter count
-    # import build.PrimaryModel as model
-    primaryModule = importlib.import_module("build.PrimaryModel")
-    curr_model = primaryModule.PrimaryModel()
-    print(f"Total parameters: {sum(p.numel() for p in curr_model.parameters())} parameters")
+    for model_filename in model_filenames:
+        write_model_file(model_filename, gen_str)
+    write_model_file(packet_filename, json.dumps(json_dict))
+    print(f"Total parameters: {param_count} parameters")
+    return 0
     
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -1,17 +1,365 @@
 import json
+from memoryPlanner import parse_bytes
 
-def parse_json(json_str):
-    result = json.loads(json_str)
+# Validating loader for model JSON packets.
+# The schema below is compiled once into per-type field tables, and a packet is checked and
+# normalized in a single pass: every error is collected with the JSON pointer (RFC 6901) of
+# the offending value, then reported together in a SchemaError. The result is the same
+# nested dict layout the rest of the compiler reads, reduced to the fields it knows, with
+# values converted to their types (ints, floats, bools, int pairs) and defaults filled in,
+# so later stages can index it without KeyErrors or string parsing. The packet is parsed
+# whole with the json module before validation; each layer is then replaced by its
+# normalized form as soon as it is checked, so the layer list is not copied.
+
+class SchemaError(Exception):
+    MAX_REPORTED = 20
+
+    def __init__(self, errors):
+        # errors: list of (json pointer, message)
+        self.errors = errors
+        lines = [f"{pointer or '/'}: {message}" for pointer, message in errors[:self.MAX_REPORTED]]
+        if len(errors) > self.MAX_REPORTED:
+            lines.append(f"... and {len(errors) - self.MAX_REPORTED} more errors")
+        super().__init__("invalid model JSON:\n" + "\n".join(lines))
+
+# Value converters: each returns the normalized value or raises ValueError with a message
+
+def describe(value):
+    text = json.dumps(value)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+def integer(value, min_value=1):
+    if isinstance(value, bool):
+        raise ValueError(f"expected an integer, got {describe(value)}")
+    try:
+        number = int(value) if not isinstance(value, float) or value.is_integer() else None
+    except (TypeError, ValueError):
+        number = None
+    if number is None:
+        raise ValueError(f"expected an integer, got {describe(value)}")
+    if number < min_value:
+        raise ValueError(f"expected an integer >= {min_value}, got {number}")
+    return number
+
+def positive_int(value):
+    return integer(value)
+
+def non_negative_int(value):
+    return integer(value, 0)
+
+def optional_int(value):
+    return None if value is None else integer(value)
+
+def number(value, min_value=0.0, exclusive=False):
+    if isinstance(value, bool):
+        raise ValueError(f"expected a number, got {describe(value)}")
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"expected a number, got {describe(value)}") from None
+    if result < min_value or (exclusive and result == min_value):
+        raise ValueError(f"expected a number {'>' if exclusive else '>='} {min_value}, got {result}")
+    return result
+
+def positive_number(value):
+    return number(value, exclusive=True)
+
+def non_negative_number(value):
+    return number(value)
+
+def boolean(value):
+    if not isinstance(value, bool):
+        raise ValueError(f"expected true or false, got {describe(value)}")
+    return value
+
+def dims(value, min_value=1):
+    # "784", 784, "32, 7, 7" or [32, 7, 7] -> int for one dimension, list of ints otherwise
+    if isinstance(value, str):
+        parts = [part for part in value.replace("(", "").replace(")", "").split(",") if part.strip()]
+    elif isinstance(value, list):
+        parts = value
+    else:
+        parts = [value]
+    if not parts:
+        raise ValueError(f"expected a size, got {describe(value)}")
+    result = [integer(part.strip() if isinstance(part, str) else part, min_value) for part in parts]
+    return result[0] if len(result) == 1 else result
+
+def size(value, min_value=1):
+    # kernel, stride and padding sizes: one int or a (height, width) pair
+    result = dims(value, min_value)
+    if isinstance(result, list) and len(result) != 2:
+        raise ValueError(f"expected one size or a (height, width) pair, got {describe(value)}")
     return result
-    
+
+def padding(value):
+    return size(value, 0)
+
+def layer_ref(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise ValueError(f"expected a layer id or index, got {describe(value)}")
+    return value
+
+def layer_refs(value):
+    if isinstance(value, list):
+        if not value:
+            raise ValueError("expected at least one input")
+        return [layer_ref(ref) for ref in value]
+    return layer_ref(value)
+
+def byte_size(value):
+    try:
+        if isinstance(value, bool) or parse_bytes(value) <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError(f"expected a byte count such as 268435456 or \"256MB\", got {describe(value)}") from None
+    return value
+
+def one_of(*choices):
+    def convert(value):
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(json.dumps(choice) for choice in choices)}, got {describe(value)}")
+        return value
+    return convert
+
+# Schema: field name -> (converter, required, default). Fields that are neither required nor
+# defaulted are left out of the normalized packet when absent.
+REQUIRED = (True, None)
+OPTIONAL = (False, None)
+
+def default(value):
+    return (False, value)
+
+LAYER_COMMON = {
+    "id": (layer_ref,) + OPTIONAL,
+    "inputs": (layer_refs,) + OPTIONAL,
+}
+
+LAYER_SCHEMAS = {
+    "linear": {"in_shape": (positive_int,) + REQUIRED, "out_shape": (positive_int,) + REQUIRED},
+    "conv2d": {"in_channels": (positive_int,) + REQUIRED, "out_channels": (positive_int,) + REQUIRED,
+               "kernel_size": (size,) + REQUIRED, "stride": (size,) + default(1), "padding": (padding,) + default(0)},
+    "maxpool2d": {"kernel_size": (size,) + REQUIRED, "stride": (size,) + OPTIONAL, "padding": (padding,) + OPTIONAL},
+    "view": {"out_shape": (dims,) + REQUIRED},
+    "relu": {},
+    "sigmoid": {},
+    "tanh": {},
+    "log_softmax": {},
+    "add": {},
+    "concat": {},
+}
+
+LAYER_ALIASES = {
+    "max_pool2d": "maxpool2d",
+}
+
+SHAPE_SCHEMA = {
+    "channels": (positive_int,) + REQUIRED,
+    "height": (positive_int,) + REQUIRED,
+    "width": (positive_int,) + REQUIRED,
+}
+
+DATASET_SCHEMAS = {
+    "mnist": {"shape": (SHAPE_SCHEMA,) + REQUIRED, "cache": (boolean,) + OPTIONAL},
+    "synthetic": {"shape": (SHAPE_SCHEMA,) + REQUIRED, "num_classes": (positive_int,) + OPTIONAL,
+                  "train_samples": (positive_int,) + OPTIONAL, "test_samples": (positive_int,) + OPTIONAL},
+}
+
+LOSS_SCHEMAS = {
+    "crossentropyloss": {"parameters": ({},) + OPTIONAL},
+    "mseloss": {"parameters": ({},) + OPTIONAL},
+}
+
+# The sgd learning rate and momentum used to sit next to "type" instead of under
+# "parameters"; legacy packets are moved under "parameters" before validation
+OPTIMIZER_SCHEMAS = {
+    "adam": {"parameters": ({"learning_rate": (positive_number,) + REQUIRED},) + REQUIRED},
+    "sgd": {"parameters": ({"learning_rate": (positive_number,) + REQUIRED,
+                            "momentum": (non_negative_number,) + default(0.0)},) + REQUIRED},
+}
+LEGACY_OPTIMIZER_FIELDS = {"lr": "learning_rate", "momentum": "momentum"}
+
+# Options read by modelTrainer and the code generator from the "training" section
+TRAINING_SCHEMA = {
+    "batch_size": (positive_int,) + OPTIONAL,
+    "test_batch_size": (positive_int,) + OPTIONAL,
+    "num_workers": (non_negative_int,) + OPTIONAL,
+    "pin_memory": (boolean,) + OPTIONAL,
+    "persistent_workers": (boolean,) + OPTIONAL,
+    "prefetch_factor": (positive_int,) + OPTIONAL,
+    "num_threads": (optional_int,) + OPTIONAL,
+    "autotune": (boolean,) + OPTIONAL,
+    "eval_mode": (one_of("full", "sampled"),) + OPTIONAL,
+    "eval_samples": (positive_int,) + OPTIONAL,
+    "async_eval": (boolean,) + OPTIONAL,
+    "micro_batches": (positive_int,) + OPTIONAL,
+    "memory_budget": (byte_size,) + OPTIONAL,
+    "profile": (boolean,) + OPTIONAL,
+    "profile_window": (positive_int,) + OPTIONAL,
+    "telemetry": (boolean,) + OPTIONAL,
+    "telemetry_window": (positive_int,) + OPTIONAL,
+    "compile": (boolean,) + OPTIONAL,
+    "precision": (one_of("float32", "bfloat16", "bf16"),) + OPTIONAL,
+    "channels_last": (boolean,) + OPTIONAL,
+    "seed": (non_negative_int,) + OPTIONAL,
+    "warm_start": (one_of("freeze", "finetune", "off"),) + OPTIONAL,
+}
+
+def compile_schema(schema):
+    # Field table -> (tuple of (name, converter or nested compiled schema, required, default), known names)
+    fields = []
+    for name, (converter, required, default_value) in schema.items():
+        if isinstance(converter, dict):
+            converter = compile_schema(converter)
+        fields.append((name, converter, required, default_value))
+    return (tuple(fields), frozenset(schema))
+
+COMPILED_LAYERS = {layer_type: compile_schema(dict(LAYER_COMMON, **fields)) for layer_type, fields in LAYER_SCHEMAS.items()}
+COMPILED_DATASETS = {dataset_type: compile_schema(fields) for dataset_type, fields in DATASET_SCHEMAS.items()}
+COMPILED_LOSSES = {loss_type: compile_schema(fields) for loss_type, fields in LOSS_SCHEMAS.items()}
+COMPILED_OPTIMIZERS = {optimizer_type: compile_schema(fields) for optimizer_type, fields in OPTIMIZER_SCHEMAS.items()}
+COMPILED_TRAINING = compile_schema(TRAINING_SCHEMA)
+
+def escape(key):
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+class packetValidator():
+    def __init__(self):
+        self.errors = []
+
+    def error(self, pointer, message):
+        self.errors.append((pointer, message))
+
+    def check_object(self, value, pointer):
+        if not isinstance(value, dict):
+            self.error(pointer, f"expected an object, got {describe(value)}")
+            return False
+        return True
+
+    def check_fields(self, value, compiled, pointer, out):
+        # Validates the fields of value against a compiled schema into out
+        fields, known = compiled
+        for name, converter, required, default_value in fields:
+            field_pointer = f"{pointer}/{escape(name)}"
+            if name not in value:
+                if required:
+                    self.error(field_pointer, "missing required field")
+                elif default_value is not None:
+                    out[name] = default_value
+                continue
+            if isinstance(converter, tuple):
+                if self.check_object(value[name], field_pointer):
+                    out[name] = self.check_fields(value[name], converter, field_pointer, {})
+                continue
+            try:
+                out[name] = converter(value[name])
+            except ValueError as error:
+                self.error(field_pointer, str(error))
+        for name in value:
+            if name not in known and name not in out:
+                self.error(f"{pointer}/{escape(name)}", "unknown field")
+        return out
+
+    def check_typed(self, value, schemas, pointer, type_key="type", aliases={}):
+        # Objects whose fields depend on their type field
+        if not self.check_object(value, pointer):
+            return None
+        if type_key not in value:
+            self.error(f"{pointer}/{type_key}", "missing required field")
+            return None
+        type_name = value[type_key]
+        # only strings name types; lists and objects are not even hashable
+        if isinstance(type_name, str):
+            type_name = aliases.get(type_name, type_name)
+        if not isinstance(type_name, str) or type_name not in schemas:
+            expected = ", ".join(json.dumps(name) for name in schemas)
+            self.error(f"{pointer}/{type_key}", f"expected one of {expected}, got {describe(value[type_key])}")
+            return None
+        return self.check_fields(value, schemas[type_name], pointer, {type_key: type_name})
+
+    def check_model(self, model):
+        if not self.check_object(model, "/model"):
+            return model
+        layers = model.get("layers")
+        if not isinstance(layers, list) or not layers:
+            self.error("/model/layers", "expected a non-empty list of layers" if "layers" in model else "missing required field")
+            layers = []
+        for position, layer in enumerate(layers):
+            # replaced in place, so the raw and normalized layer lists never coexist
+            normalized = self.check_typed(layer, COMPILED_LAYERS, f"/model/layers/{position}", "layer_type", LAYER_ALIASES)
+            layers[position] = normalized if normalized is not None else layer
+        out = {"layers": layers}
+        if "output" in model:
+            try:
+                out["output"] = layer_ref(model["output"])
+            except ValueError as error:
+                self.error("/model/output", str(error))
+        for name in model:
+            if name not in out:
+                self.error(f"/model/{escape(name)}", "unknown field")
+        return out
+
+    def check_optimizer(self, optimizer):
+        moved = {}
+        # legacy fields are merged only into a missing or object "parameters"; anything else is
+        # left for check_fields to report
+        if (isinstance(optimizer, dict) and any(name in optimizer for name in LEGACY_OPTIMIZER_FIELDS)
+                and isinstance(optimizer.get("parameters", {}), dict)):
+            optimizer = dict(optimizer)
+            parameters = dict(optimizer.get("parameters", {}))
+            for legacy_name, name in LEGACY_OPTIMIZER_FIELDS.items():
+                if legacy_name in optimizer and name not in parameters:
+                    parameters[name] = optimizer.pop(legacy_name)
+                    moved[f"/optimizer/parameters/{name}"] = f"/optimizer/{legacy_name}"
+            optimizer["parameters"] = parameters
+        first_error = len(self.errors)
+        result = self.check_typed(optimizer, COMPILED_OPTIMIZERS, "/optimizer")
+        # errors in moved fields point at where the packet actually has them
+        self.errors[first_error:] = [(moved.get(pointer, pointer), message) for pointer, message in self.errors[first_error:]]
+        return result
+
+    def check_packet(self, packet):
+        if not self.check_object(packet, ""):
+            return None
+        if packet.get("packet_type") != "model_params":
+            self.error("/packet_type", f"unrecognized packet type {describe(packet.get('packet_type'))}")
+            return None
+        out = {"packet_type": "model_params"}
+        sections = (("model", self.check_model), ("dataset", lambda value: self.check_typed(value, COMPILED_DATASETS, "/dataset")),
+                    ("loss_function", lambda value: self.check_typed(value, COMPILED_LOSSES, "/loss_function")),
+                    ("optimizer", self.check_optimizer))
+        for name, check in sections:
+            if name not in packet:
+                self.error(f"/{name}", "missing required field")
+                continue
+            out[name] = check(packet[name])
+        if "training" in packet and self.check_object(packet["training"], "/training"):
+            out["training"] = self.check_fields(packet["training"], COMPILED_TRAINING, "/training", {})
+        for name in packet:
+            if name not in out and name != "training":
+                self.error(f"/{escape(name)}", "unknown field")
+        return out
 
 def load_model_json(json_dict):
-    assert(json_dict["packet_type"] == "model_params")
-    return json_dict
+    # Returns the normalized packet, or raises SchemaError listing every problem found
+    validator = packetValidator()
+    packet = validator.check_packet(json_dict)
+    if validator.errors:
+        raise SchemaError(validator.errors)
+    return packet
+
+def parse_json(json_str):
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError as error:
+        raise SchemaError([("", f"invalid JSON at line {error.lineno} column {error.colno}: {error.msg}")]) from None
 
 def process_json(json_str):
-    json_dict = parse_json(json_str)
-    if json_dict["packet_type"] == "model_params":
-        return load_model_json(json_dict)
-    else:
-        raise Exception("Unrecognized JSON packet received")
\ No newline at end of file
+    return load_model_json(parse_json(json_str))
+
+def process_json_file(json_file):
+    # Parses the whole packet from an open file (text or binary), then validates it
+    try:
+        return load_model_json(json.load(json_file))
+    except json.JSONDecodeError as error:
+        raise SchemaError([("", f"invalid JSON at line {error.lineno} column {error.colno}: {error.msg}")]) from None
@@ -0,0 +1,99 @@
+import math
+
+# Memory-budget planning for training ("training": {"memory_budget": "256MB"}).
+# Activation memory is estimated per sample from the IR output shapes (float32). Plain
+# training keeps every node's output until backward. When the schedule is split into
+# checkpointed segments, only each segment's output is kept, and during backward one
+# segment at a time is recomputed. The planner picks the segment length with the smallest
+# estimated peak, then the smallest number of micro-batches that fits the configured batch
+# size into the budget. Gradient accumulation over micro-batches keeps the effective batch,
+# so the optimization result is unchanged.
+
+BYTES_PER_ELEMENT = 4
+# weights, gradients and up to two optimizer state tensors per parameter
+PARAMETER_COPIES = 4
+
+UNITS = {"gb": 1024**3, "mb": 1024**2, "kb": 1024, "b": 1}
+
+class MemoryBudgetError(Exception):
+    pass
+
+def parse_bytes(value):
+    # Accepts a byte count or a string such as "512MB" or "1.5 GB"
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().lower().replace(" ", "")
+    for unit, scale in UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * scale)
+    return int(text)
+
+def node_parameters(node):
+    attrs = node.attrs
+    if node.layer_type == "linear":
+        return attrs["in_features"] * attrs["out_features"] + attrs["out_features"]
+    if node.layer_type == "conv2d":
+        kernel = attrs["kernel_size"]
+        kernel_area = kernel[0] * kernel[1] if isinstance(kernel, tuple) else kernel * kernel
+        return attrs["in_channels"] * attrs["out_channels"] * kernel_area + attrs["out_channels"]
+    return 0
+
+def node_bytes(node):
+    if node.out_shape is None:
+        raise MemoryBudgetError(f"Layer {node.index} ({node.layer_type}): output shape unknown, cannot plan memory")
+    return math.prod(node.out_shape) * BYTES_PER_ELEMENT
+
+def split_segments(nodes, length):
+    # Contiguous (start, end) ranges of about length nodes. A segment never starts with an
+    # in-place activation, which would overwrite the previous segment's saved output.
+    segments = []
+    start = 0
+    while start < len(nodes):
+        end = min(start + length, len(nodes))
+        while end < len(nodes) and nodes[end].inplace:
+            end += 1
+        segments.append((start, end))
+        start = end
+    return segments
+
+def segment_peak(segments, sizes, prefix):
+    # Kept segment outputs plus the largest segment recomputed during backward
+    kept = sum(sizes[end - 1] for _, end in segments[:-1])
+    return kept + max(prefix[end] - prefix[start] for start, end in segments)
+
+def plan_memory(ir, training_config):
+    # Returns {"segments": [(start, end), ...] or None, "micro_batches", "estimated_peak_bytes"}
+    budget = parse_bytes(training_config["memory_budget"])
+    batch_size = int(training_config.get("batch_size", 64))
+    parameter_bytes = sum(node_parameters(node) for node in ir.nodes) * BYTES_PER_ELEMENT * PARAMETER_COPIES
+    available = budget - parameter_bytes
+    if available <= 0:
+        raise MemoryBudgetError(f"memory_budget of {budget} bytes does not cover the {parameter_bytes} bytes of parameters and optimizer state")
+    sizes = [node_bytes(node) for node in ir.nodes]
+    prefix = [0]
+    for size in sizes:
+        prefix.append(prefix[-1] + size)
+    input_bytes = math.prod(ir.in_shape) * BYTES_PER_ELEMENT if ir.in_shape else 0
+    per_sample = prefix[-1]
+    segments = None
+    if batch_size * (per_sample + input_bytes) > available:
+        # Every length is tried; each costs O(n / length), O(n log n) in total
+        for length in range(1, len(ir.nodes)):
+            candidate = split_segments(ir.nodes, length)
+            if len(candidate) < 2:
+                continue
+            peak = segment_peak(candidate, sizes, prefix)
+            if peak < per_sample:
+                per_sample, segments = peak, candidate
+    per_sample += input_bytes
+    micro_batches = min(batch_size, math.ceil(batch_size * per_sample / available))
+    if per_sample > available:
+        raise MemoryBudgetError(f"memory_budget of {budget} bytes is too small for a single sample "
+                                f"({per_sample} activation bytes after checkpointing)")
+    return {"segments": segments, "micro_batches": micro_batches,
+            "estimated_peak_bytes": parameter_bytes + math.ceil(batch_size / micro_batches) * per_sample}
+
+def format_plan(plan):
+    segments = "no checkpointing" if plan["segments"] is None else f"{len(plan['segments'])} checkpointed segments"
+    return (f"Memory plan: {segments}, {plan['micro_batches']} micro-batches per batch, "
+            f"estimated peak {plan['estimated_peak_bytes']} bytes")
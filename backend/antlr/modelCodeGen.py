@@ -1,27 +1,66 @@
+from modelIR import build_ir, run_passes, allocate_tensors, DEFAULT_PASSES
+from memoryPlanner import plan_memory
+
 class CodeGenerator():
-    def __init__(self, name):
+    # Bump whenever the emitted code (or the cached parameter count) changes so stale compile
+    # cache entries are not reused
+    VERSION = 8
+
+    def __init__(self, name, passes=None, profile=False):
         self.name = name
         self.model_dict = None
+        self.ir = None
+        # Optimization passes run over the IR before emission, in order
+        self.passes = DEFAULT_PASSES if passes is None else passes
+        # Instruments every layer with backend/local/layerProfiler.py
+        self.profile = profile
     
     def set_model_dict(self, json_dict):
         self.model_dict = json_dict
+        self.ir = None
+        self.memory_plan = None
+
+    def get_ir(self):
+        # Builds and optimizes the IR once; both emitters read from it
+        if self.ir is None:
+            self.ir = run_passes(build_ir(self.model_dict), self.passes)
+        return self.ir
+
+    def get_memory_plan(self):
+        # Checkpoint segments and micro-batch count for "training": {"memory_budget": ...}, or None
+        training = self.model_dict.get("training", {})
+        if "memory_budget" not in training:
+            return None
+        if self.memory_plan is None:
+            self.memory_plan = plan_memory(self.get_ir(), training)
+        return self.memory_plan
 
     def str_traversal_codegen(self, linelist): 
         # This function converts a linelist into a single printable string of Python code
         return self.recursive_traversal_codegen(linelist, 0)
     def recursive_traversal_codegen(self, linelist, depth):
-        final_str = ""
+        # Collects lines into a list and joins once, keeping emission linear in the output size
+        out_lines = []
+        self.collect_lines(linelist, depth, out_lines)
+        return "".join(out_lines)
+    def collect_lines(self, linelist, depth, out_lines):
+        indent = " " * (4 * depth)
         for elem in linelist:
             if type(elem) is str:
-                final_str += (" " * (4 * depth)) + elem + "\n"
+                out_lines.append(indent + elem + "\n")
             else:
-                final_str += self.recursive_traversal_codegen(elem, depth+1)
-        return final_str
+                self.collect_lines(elem, depth+1, out_lines)
     
     def codegen_model_dependencies(self):
         # Any needed imports will be 
         linelist = ["import torch",
                     "import torchvision"]
+        if self.model_dict["dataset"].get("cache", False) or self.model_dict["dataset"]["type"] == "synthetic":
+            linelist.append("import datasetCache")
+        if self.profile:
+            linelist.append("import layerProfiler")
+        if self.get_memory_plan() is not None and self.get_memory_plan()["segments"] is not None:
+            linelist.append("import torch.utils.checkpoint")
         return linelist
     
     def codegen_model(self):
@@ -40,15 +79,27 @@ class CodeGenerator():
     def codegen_model_init(self):
         linelist = ["def __init__(self):"]
         layerlist = [f"super({self.name}, self).__init__()"]
-        curr_layer = 1
         # initialize hyperparameters of the model
         dataset = self.model_dict["dataset"]["type"]
         loss_function = self.model_dict["loss_function"]
         optimizer = self.model_dict["optimizer"]
         #Handle dataset:
-        if dataset == "mnist":
+        if dataset == "mnist" and self.model_dict["dataset"].get("cache", False):
+            # Pre-decoded, memory-mapped tensors from backend/local/datasetCache.py
+            layerlist.append("self.train_dataset = datasetCache.load_dataset('mnist', 'build/data', train=True)")
+            layerlist.append("self.test_dataset = datasetCache.load_dataset('mnist', 'build/data', train=False)")
+        elif dataset == "mnist":
             layerlist.append("self.train_dataset = torchvision.datasets.MNIST('build/data', train=True, download=True, transform=torchvision.transforms.ToTensor())")
             layerlist.append("self.test_dataset = torchvision.datasets.MNIST('build/data', train=False, download=True, transform=torchvision.transforms.ToTensor())")
+        elif dataset == "synthetic":
+            # Random in-memory samples of the declared shape, for benchmarks and offline runs
+            shape = self.model_dict["dataset"]["shape"]
+            dims = (int(shape["channels"]), int(shape["height"]), int(shape["width"]))
+            num_classes = int(self.model_dict["dataset"].get("num_classes", 10))
+            train_samples = int(self.model_dict["dataset"].get("train_samples", 60000))
+            test_samples = int(self.model_dict["dataset"].get("test_samples", 10000))
+            layerlist.append(f"self.train_dataset = datasetCache.synthetic_dataset({dims}, {num_classes}, {train_samples}, seed=0)")
+            layerlist.append(f"self.test_dataset = datasetCache.synthetic_dataset({dims}, {num_classes}, {test_samples}, seed=1)")
 
         #Handle loss function:
         if loss_function["type"] == "crossentropyloss":
@@ -56,72 +107,149 @@ class CodeGenerator():
         elif loss_function["type"] == "mseloss":
             layerlist.append("self.loss_function = torch.nn.MSELoss()")
 
+        #Handle training options (read by modelTrainer):
+        if "training" in self.model_dict:
+            training = dict(self.model_dict["training"])
+            if self.get_memory_plan() is not None:
+                # gradient accumulation steps chosen by the memory planner, unless set explicitly
+                training.setdefault("micro_batches", self.get_memory_plan()["micro_batches"])
+            layerlist.append(f"self.training_config = {repr(training)}")
+
+        #Handle profiling (windows are counted in training steps):
+        if self.profile:
+            layer_types = {f"layer{node.index}": node.layer_type for node in self.get_ir().nodes}
+            window = int(self.model_dict.get("training", {}).get("profile_window", 50))
+            layerlist.append(f"self.profiler = layerProfiler.layerProfiler({repr(layer_types)}, window={window})")
+
         # Initializes all specified layers
-        for layer in self.model_dict["model"]["layers"]:
-            # Layer blocks:
-            if layer["layer_type"] == "linear":
-                in_shape = layer["in_shape"]
-                out_shape = layer["out_shape"]
-                layerlist.append(f"self.layer{curr_layer} = torch.nn.Linear({in_shape}, {out_shape})")
-            if layer["layer_type"] == "conv2d":
-                in_channels = layer["in_channels"]
-                out_channels = layer["out_channels"]
-                kernel_size = layer["kernel_size"]
-                stride = layer["stride"]
-                padding = layer["padding"]
-                layerlist.append(f"self.layer{curr_layer} = torch.nn.Conv2d({in_channels}, {out_channels}, kernel_size={kernel_size}, stride={stride}, padding={padding})")
-
-            # Activation Functions:
-            elif layer["layer_type"] == "relu":
-                layerlist.append(f"self.layer{curr_layer} = torch.nn.functional.relu")
-            elif layer["layer_type"] == "sigmoid":
-                layerlist.append(f"self.layer{curr_layer} = torch.nn.functional.sigmoid")
-            elif layer["layer_type"] == "tanh":
-                layerlist.append(f"self.layer{curr_layer} = torch.nn.functional.tanh")
-
-            # Other blocks:
-            elif layer["layer_type"] == "log_softmax":
-                layerlist.append(f"self.layer{curr_layer} = torch.nn.functional.log_softmax")
-            elif layer["layer_type"] == "view":
-                pass #handle within forward function
-
-            curr_layer += 1
+        for node in self.get_ir().nodes:
+            line = self.codegen_layer_init(node)
+            if line is not None:
+                layerlist.append(line)
 
         #Handle optimizer:
         if optimizer["type"] == "adam":
             learning_rate = float(optimizer["parameters"]["learning_rate"])
             layerlist.append(f"self.optimizer = torch.optim.Adam(self.parameters(), lr={learning_rate})")
         elif optimizer["type"] == "sgd":
-            learning_rate = float(optimizer["lr"])
-            momentum = float(optimizer["momentum"])
+            learning_rate = float(optimizer["parameters"]["learning_rate"])
+            momentum = float(optimizer["parameters"].get("momentum", 0.0))
             layerlist.append(f"self.optimizer = torch.optim.SGD(self.parameters(), lr={learning_rate}, momentum={momentum})")
 
         linelist.append(layerlist)
         return linelist
-    
+
+    def codegen_layer_init(self, node):
+        # Returns the __init__ line for a single IR node, or None if it is handled inline in forward
+        attrs = node.attrs
+        # Layer blocks:
+        if node.layer_type == "linear":
+            return f"self.layer{node.index} = torch.nn.Linear({attrs['in_features']}, {attrs['out_features']})"
+        elif node.layer_type == "conv2d":
+            return (f"self.layer{node.index} = torch.nn.Conv2d({attrs['in_channels']}, {attrs['out_channels']}, "
+                    f"kernel_size={attrs['kernel_size']}, stride={attrs['stride']}, padding={attrs['padding']})")
+
+        # Activation Functions:
+        elif node.layer_type == "relu":
+            return f"self.layer{node.index} = torch.nn.functional.{'relu_' if node.inplace else 'relu'}"
+        elif node.layer_type == "sigmoid":
+            return f"self.layer{node.index} = {'torch.sigmoid_' if node.inplace else 'torch.nn.functional.sigmoid'}"
+        elif node.layer_type == "tanh":
+            return f"self.layer{node.index} = {'torch.tanh_' if node.inplace else 'torch.nn.functional.tanh'}"
+
+        # Other blocks:
+        elif node.layer_type == "log_softmax":
+            return f"self.layer{node.index} = torch.nn.functional.log_softmax"
+        return None #view and maxpool2d are handled within the forward function
+
     def codegen_model_forward(self):
         # Generates the forward method for the neural network
         # Backwards method/gradient descent is superseded within the nn.Module class
         linelist = ["def forward(self, curr_tensor):"]
+        steps, out_var = allocate_tensors(self.get_ir())
+        plan = self.get_memory_plan()
+        if plan is None or plan["segments"] is None:
+            linelist.append(self.codegen_steps(steps) + [f"return {out_var}"])
+            return linelist
+        # Memory budget: every segment but the last runs under activation checkpointing,
+        # as a method taking and returning the tensors live across its boundaries
         layerlist = []
-        curr_layer = 1
-        for layer in self.model_dict["model"]["layers"]:
-
-            if layer["layer_type"] == "log_softmax":
-                layerlist.append(f"curr_tensor = self.layer{curr_layer}(curr_tensor, -1)")
+        methods = []
+        segments = plan["segments"]
+        for seg_idx, (start, end) in enumerate(segments[:-1], start=1):
+            live_in, live_out = segment_interface(steps, start, end, out_var)
+            methods.append(f"def segment{seg_idx}(self, {', '.join(live_in)}):")
+            methods.append(self.codegen_steps(steps[start:end]) + [f"return {', '.join(live_out)}"])
+            layerlist.append(f"{', '.join(live_out)} = torch.utils.checkpoint.checkpoint(self.segment{seg_idx}, "
+                             f"{', '.join(live_in)}, use_reentrant=False)")
+            outer_freed = [var for step in steps[start:end] for var in step[3] if var in live_in and var not in live_out]
+            if outer_freed:
+                layerlist.append(f"del {', '.join(dict.fromkeys(outer_freed))}")
+        layerlist += self.codegen_steps(steps[segments[-1][0]:])
+        layerlist.append(f"return {out_var}")
+        linelist.append(layerlist)
+        return linelist + methods
 
-            elif layer["layer_type"] == "view":
-                shape1 = layer["out_shape"]
-                layerlist.append(f"curr_tensor = curr_tensor.view(-1, {shape1})") #parentheses are added
+    def codegen_steps(self, steps):
+        layerlist = []
+        for node, in_vars, target, freed in steps:
+            if self.profile:
+                layerlist.append(f"self.profiler.start('layer{node.index}')")
+            layerlist.append(f"{target} = {self.codegen_layer_forward(node, in_vars)}")
+            if self.profile:
+                layerlist.append(f"self.profiler.stop('layer{node.index}', {target})")
+            if freed:
+                layerlist.append(f"del {', '.join(freed)}")
+        return layerlist
 
-            elif layer["layer_type"] == "maxpool2d":
-                kernel_size = int(layer["kernel_size"])
-                layerlist.append(f"curr_tensor = torch.nn.functional.max_pool2d(curr_tensor, kernel_size={kernel_size})") #parentheses are added
-            # more layer edge cases should be added here
+    def codegen_layer_forward(self, node, in_vars):
+        # Returns the expression computing a single IR node from its input variables
+        src = in_vars[0]
+        if node.layer_type == "log_softmax":
+            return f"self.layer{node.index}({src}, -1)"
+        elif node.layer_type == "view":
+            shape = ", ".join(str(dim) for dim in node.attrs["shape"])
+            if self.model_dict.get("training", {}).get("channels_last", False):
+                # channels_last tensors are not contiguous in NCHW order, so view cannot flatten them
+                return f"{src}.reshape(-1, {shape})"
+            return f"{src}.view(-1, {shape})" #parentheses are added
+        elif node.layer_type == "maxpool2d":
+            # stride and padding are only spelled out when they differ from max_pool2d's defaults
+            args = f"kernel_size={node.attrs['kernel_size']}"
+            if node.attrs["stride"] != node.attrs["kernel_size"]:
+                args += f", stride={node.attrs['stride']}"
+            if node.attrs["padding"] != 0:
+                args += f", padding={node.attrs['padding']}"
+            return f"torch.nn.functional.max_pool2d({src}, {args})" #parentheses are added
+        elif node.layer_type == "add":
+            return " + ".join(in_vars)
+        elif node.layer_type == "concat":
+            return f"torch.cat([{', '.join(in_vars)}], dim=1)"
+        # more layer edge cases should be added here
+        return f"self.layer{node.index}({src})"
 
-            else:
-                layerlist.append(f"curr_tensor = self.layer{curr_layer}(curr_tensor)")
-            curr_layer += 1
-        layerlist.append("return curr_tensor")
-        linelist.append(layerlist)
-        return linelist
+def segment_interface(steps, start, end, out_var):
+    # Returns (live_in, live_out) variable names of the steps in [start, end): the tensors
+    # read before being written inside the segment, and the ones it writes that are read
+    # later (or returned) before being overwritten
+    live_in = []
+    written = set()
+    for node, in_vars, target, freed in steps[start:end]:
+        for var in in_vars:
+            if var not in written and var not in live_in:
+                live_in.append(var)
+        written.add(target)
+        written.difference_update(freed)
+    live_out = []
+    pending = set(written)
+    for node, in_vars, target, freed in steps[end:]:
+        for var in in_vars:
+            if var in pending:
+                live_out.append(var)
+                pending.discard(var)
+        pending.discard(target)
+        if not pending:
+            break
+    if out_var in pending:
+        live_out.append(out_var)
+    return live_in, live_out
@@ -0,0 +1,88 @@
+import heapq
+
+# Graph structure of a model JSON.
+# A layer may list its producers in "inputs", referring to other layers by their "id" field
+# or by 1-based position, with "input" (or 0) naming the model input. Layers without
+# "inputs" read the previous layer, so plain sequential layer lists keep working.
+# The model output is "model.output" if present, otherwise the last layer.
+
+INPUT = 0 # pseudo layer index of the model input
+
+class GraphError(Exception):
+    def __init__(self, layer_idx, message):
+        self.layer_idx = layer_idx
+        self.message = message
+        super().__init__(f"Layer {layer_idx}: {message}")
+
+def build_id_map(layers):
+    id_map = {"input": INPUT}
+    for layer_idx, layer in enumerate(layers, start=1):
+        if "id" in layer:
+            layer_id = str(layer["id"])
+            if layer_id in id_map:
+                raise GraphError(layer_idx, f"duplicate layer id '{layer_id}'")
+            id_map[layer_id] = layer_idx
+    return id_map
+
+def resolve_ref(ref, id_map, num_layers, layer_idx):
+    if isinstance(ref, str) and ref in id_map:
+        return id_map[ref]
+    try:
+        index = int(ref)
+    except (TypeError, ValueError):
+        raise GraphError(layer_idx, f"unknown input '{ref}'") from None
+    if index < 0 or index > num_layers:
+        raise GraphError(layer_idx, f"input index {index} out of range")
+    return index
+
+def layer_inputs(model_dict):
+    # Returns the producer indices of every layer, as a list indexed by layer position - 1
+    layers = model_dict["model"]["layers"]
+    id_map = build_id_map(layers)
+    inputs = []
+    for layer_idx, layer in enumerate(layers, start=1):
+        if "inputs" in layer:
+            refs = layer["inputs"] if isinstance(layer["inputs"], list) else [layer["inputs"]]
+            if not refs:
+                raise GraphError(layer_idx, "empty inputs list")
+            inputs.append([resolve_ref(ref, id_map, len(layers), layer_idx) for ref in refs])
+        else:
+            inputs.append([layer_idx - 1])
+    return inputs
+
+def output_index(model_dict):
+    layers = model_dict["model"]["layers"]
+    if "output" in model_dict["model"]:
+        return resolve_ref(model_dict["model"]["output"], build_id_map(layers), len(layers), "output")
+    return len(layers)
+
+def is_sequential(inputs):
+    return all(srcs == [layer_idx - 1] for layer_idx, srcs in enumerate(inputs, start=1))
+
+def topological_order(inputs):
+    # Kahn's algorithm, always taking the lowest ready layer index so that sequential
+    # models keep their original order and the schedule is deterministic
+    num_layers = len(inputs)
+    pending = [0] * (num_layers + 1)
+    consumers = [[] for _ in range(num_layers + 1)]
+    for layer_idx, srcs in enumerate(inputs, start=1):
+        for src in srcs:
+            if src == layer_idx:
+                raise GraphError(layer_idx, "layer reads its own output")
+            if src != INPUT:
+                pending[layer_idx] += 1
+                consumers[src].append(layer_idx)
+    ready = [layer_idx for layer_idx in range(1, num_layers + 1) if pending[layer_idx] == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        layer_idx = heapq.heappop(ready)
+        order.append(layer_idx)
+        for user in consumers[layer_idx]:
+            pending[user] -= 1
+            if pending[user] == 0:
+                heapq.heappush(ready, user)
+    if len(order) != num_layers:
+        stuck = min(layer_idx for layer_idx in range(1, num_layers + 1) if pending[layer_idx] > 0)
+        raise GraphError(stuck, "layer is part of a cycle")
+    return order
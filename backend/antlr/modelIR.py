@@ -0,0 +1,230 @@
+from shapeAnalyzer import analyze_layer, input_shape, parse_dims, ShapeError
+from modelGraph import layer_inputs, output_index, topological_order, INPUT
+from jsonLoader import SchemaError
+
+# Intermediate representation consumed by both CodeGenerator emitters.
+# Nodes are kept in a topological schedule, and each node keeps the 1-based index of its
+# layer in the model JSON, so the generated self.layerN names stay stable no matter
+# which nodes the passes remove.
+
+# Normalizes layer type spellings used by the frontend
+LAYER_ALIASES = {
+    "max_pool2d": "maxpool2d",
+}
+
+ACTIVATIONS = ("relu", "sigmoid", "tanh")
+
+class LayerNode():
+    def __init__(self, index, layer_type, attrs, inputs):
+        self.index = index
+        self.layer_type = layer_type
+        self.attrs = attrs
+        self.inputs = inputs
+        self.out_shape = None
+        self.inplace = False
+
+class ModelIR():
+    def __init__(self, nodes, output, in_shape=None):
+        self.nodes = nodes
+        self.output = output
+        self.in_shape = in_shape
+        # Indices of the layers eliminate_dead_layers dropped
+        self.dead_layers = []
+
+    def node_map(self):
+        return {node.index: node for node in self.nodes}
+
+    def consumers(self):
+        # Maps each node index (and INPUT) to the indices of the nodes reading it
+        consumer_map = {INPUT: []}
+        for node in self.nodes:
+            consumer_map[node.index] = []
+        for node in self.nodes:
+            for src in node.inputs:
+                consumer_map[src].append(node.index)
+        return consumer_map
+
+    def remove_nodes(self, aliases):
+        # Removes the nodes in aliases, redirecting their readers to the aliased node.
+        # Done in one sweep so that passes stay linear in the number of nodes.
+        def resolve(index):
+            target = index
+            while target in aliases:
+                target = aliases[target]
+            if index in aliases:
+                aliases[index] = target
+            return target
+        self.nodes = [node for node in self.nodes if node.index not in aliases]
+        for node in self.nodes:
+            node.inputs = [resolve(src) for src in node.inputs]
+        self.output = resolve(self.output)
+
+def parse_size(value):
+    dims = parse_dims(value)
+    return dims[0] if len(dims) == 1 else dims
+
+def parse_attrs(layer_type, layer):
+    # Converts the loosely typed JSON fields of a layer into ints and tuples
+    if layer_type == "linear":
+        return {"in_features": int(layer["in_shape"]), "out_features": int(layer["out_shape"])}
+    if layer_type == "conv2d":
+        return {"in_channels": int(layer["in_channels"]),
+                "out_channels": int(layer["out_channels"]),
+                "kernel_size": parse_size(layer["kernel_size"]),
+                "stride": parse_size(layer["stride"]),
+                "padding": parse_size(layer["padding"])}
+    if layer_type == "maxpool2d":
+        return {"kernel_size": parse_size(layer["kernel_size"]),
+                "stride": parse_size(layer.get("stride", layer["kernel_size"])),
+                "padding": parse_size(layer.get("padding", 0))}
+    if layer_type == "view":
+        return {"shape": parse_dims(layer["out_shape"])}
+    if layer_type in ACTIVATIONS or layer_type in ("log_softmax", "add", "concat"):
+        return {}
+    raise ValueError(f"unsupported layer type '{layer_type}'")
+
+def build_ir(model_dict):
+    layers = model_dict["model"]["layers"]
+    inputs = layer_inputs(model_dict)
+    nodes = []
+    for layer_idx in topological_order(inputs):
+        layer = layers[layer_idx - 1]
+        layer_type = LAYER_ALIASES.get(layer["layer_type"], layer["layer_type"])
+        pointer = f"/model/layers/{layer_idx - 1}"
+        try:
+            attrs = parse_attrs(layer_type, layer)
+        except KeyError as error:
+            raise SchemaError([(f"{pointer}/{error.args[0]}", f"layer {layer_idx} ({layer_type}): missing field")]) from None
+        except (TypeError, ValueError) as error:
+            raise SchemaError([(pointer, f"layer {layer_idx} ({layer_type}): {error}")]) from None
+        nodes.append(LayerNode(layer_idx, layer_type, attrs, list(inputs[layer_idx - 1])))
+    ir = ModelIR(nodes, output_index(model_dict))
+    annotate_shapes(ir, model_dict)
+    return ir
+
+def annotate_shapes(ir, model_dict):
+    # Shapes are best effort: passes that need them skip nodes whose shape is unknown
+    try:
+        ir.in_shape = input_shape(model_dict)
+    except (KeyError, TypeError, ValueError):
+        return
+    layers = model_dict["model"]["layers"]
+    shapes = {INPUT: ir.in_shape}
+    for node in ir.nodes:
+        in_shapes = [shapes.get(src) for src in node.inputs]
+        if None in in_shapes:
+            continue
+        try:
+            node.out_shape = analyze_layer(node.index, layers[node.index - 1], in_shapes)[0]
+        except ShapeError:
+            continue
+        shapes[node.index] = node.out_shape
+
+def allocate_tensors(ir):
+    # Liveness analysis over the schedule. Returns one (node, in_vars, out_var, freed_vars)
+    # step per node: a tensor variable is freed right after its last reader, and the result
+    # of a node reuses the name of an input that dies there, so chains compile to curr_tensor
+    # reassignments and branches only keep the tensors that are still needed.
+    last_use = {INPUT: -1}
+    for node in ir.nodes:
+        last_use[node.index] = -1
+    for pos, node in enumerate(ir.nodes):
+        for src in node.inputs:
+            last_use[src] = pos
+    last_use[ir.output] = len(ir.nodes)
+    var_of = {INPUT: "curr_tensor"}
+    free_vars = []
+    num_vars = 0
+    steps = []
+    for pos, node in enumerate(ir.nodes):
+        in_vars = [var_of[src] for src in node.inputs]
+        dying = [var_of[src] for src in dict.fromkeys(node.inputs) if last_use[src] == pos]
+        if dying:
+            out_var = dying[0]
+            freed = dying[1:]
+        else:
+            if free_vars:
+                out_var = free_vars.pop()
+            else:
+                num_vars += 1
+                out_var = f"tensor{num_vars}"
+            freed = []
+        if last_use[node.index] == -1:
+            # result is never read
+            freed.append(out_var)
+        free_vars.extend(freed)
+        var_of[node.index] = out_var
+        steps.append((node, in_vars, out_var, freed))
+    return steps, var_of[ir.output]
+
+# Optimization passes. Each takes a ModelIR and returns the (possibly modified) ModelIR.
+
+def remove_noop_views(ir):
+    # A view is a no-op when its input already has the requested per-sample shape
+    node_map = ir.node_map()
+    aliases = {}
+    for node in ir.nodes:
+        if node.layer_type != "view":
+            continue
+        src = node.inputs[0]
+        in_shape = ir.in_shape if src == INPUT else node_map[src].out_shape
+        if in_shape is not None and tuple(in_shape) == node.attrs["shape"]:
+            aliases[node.index] = src
+    ir.remove_nodes(aliases)
+    return ir
+
+def fold_reshapes(ir):
+    # view(-1, a) followed by view(-1, b) is equivalent to view(-1, b) alone
+    consumer_map = ir.consumers()
+    node_map = ir.node_map()
+    aliases = {}
+    for node in ir.nodes:
+        if node.layer_type != "view" or node.index == ir.output:
+            continue
+        users = consumer_map[node.index]
+        if users and all(node_map[user].layer_type == "view" for user in users):
+            aliases[node.index] = node.inputs[0]
+    ir.remove_nodes(aliases)
+    return ir
+
+def eliminate_dead_layers(ir):
+    # Drops nodes whose result never reaches the model output
+    node_map = ir.node_map()
+    live = set()
+    stack = [ir.output]
+    while stack:
+        index = stack.pop()
+        if index == INPUT or index in live:
+            continue
+        live.add(index)
+        stack.extend(node_map[index].inputs)
+    ir.dead_layers = sorted(node.index for node in ir.nodes if node.index not in live)
+    ir.nodes = [node for node in ir.nodes if node.index in live]
+    return ir
+
+def fuse_inplace_activations(ir):
+    # Activations may overwrite their input when it comes from a linear or conv2d layer
+    # (neither needs its own output for backward) and nothing else reads that tensor
+    consumer_map = ir.consumers()
+    node_map = ir.node_map()
+    for node in ir.nodes:
+        if node.layer_type not in ACTIVATIONS:
+            continue
+        src = node.inputs[0]
+        if src == INPUT or node_map[src].layer_type not in ("linear", "conv2d"):
+            continue
+        if len(consumer_map[src]) == 1 and src != ir.output:
+            node.inplace = True
+    return ir
+
+DEFAULT_PASSES = [
+    remove_noop_views,
+    fold_reshapes,
+    eliminate_dead_layers,
+    fuse_inplace_activations,
+]
+
+def run_passes(ir, passes):
+    for ir_pass in passes:
+        ir = ir_pass(ir)
+    return ir
@@ -0,0 +1,184 @@
+import math
+from modelGraph import layer_inputs, output_index, topological_order, GraphError, INPUT
+
+# Static shape, parameter and FLOP analysis of a model JSON.
+# Shapes exclude the batch dimension, and layers are numbered from 1 to match the
+# self.layerN attributes in the generated model. FLOP counts are approximate
+# (one multiply-add counts as two FLOPs, elementwise ops count one per element).
+
+BYTES_PER_ELEMENT = 4 # generated models run in float32
+
+class ShapeError(Exception):
+    def __init__(self, layer_idx, layer_type, message):
+        self.layer_idx = layer_idx
+        self.layer_type = layer_type
+        super().__init__(f"Layer {layer_idx} ({layer_type}): {message}")
+
+def parse_dims(value):
+    # Shape fields arrive either as ints or as strings such as "784" or "32, 7, 7"
+    if isinstance(value, (list, tuple)):
+        return tuple(int(dim) for dim in value)
+    if isinstance(value, str):
+        return tuple(int(dim) for dim in value.replace("(", "").replace(")", "").split(",") if dim.strip())
+    return (int(value),)
+
+def parse_pair(value):
+    dims = parse_dims(value)
+    if len(dims) == 1:
+        return (dims[0], dims[0])
+    return dims[:2]
+
+def input_shape(model_dict):
+    shape = model_dict["dataset"]["shape"]
+    return (int(shape["channels"]), int(shape["height"]), int(shape["width"]))
+
+def analyze_view(layer, in_shape):
+    out_shape = parse_dims(layer["out_shape"])
+    if math.prod(out_shape) != math.prod(in_shape):
+        raise ValueError(f"cannot view input of shape {list(in_shape)} ({math.prod(in_shape)} elements) as {list(out_shape)} ({math.prod(out_shape)} elements)")
+    return out_shape, 0, 0
+
+def analyze_linear(layer, in_shape):
+    in_features = int(layer["in_shape"])
+    out_features = int(layer["out_shape"])
+    if in_shape[-1] != in_features:
+        raise ValueError(f"expected {in_features} input features, got input of shape {list(in_shape)}")
+    rows = math.prod(in_shape[:-1])
+    params = in_features * out_features + out_features
+    flops = 2 * rows * in_features * out_features
+    return in_shape[:-1] + (out_features,), params, flops
+
+def analyze_conv2d(layer, in_shape):
+    in_channels = int(layer["in_channels"])
+    out_channels = int(layer["out_channels"])
+    kernel_h, kernel_w = parse_pair(layer["kernel_size"])
+    stride_h, stride_w = parse_pair(layer.get("stride", 1))
+    pad_h, pad_w = parse_pair(layer.get("padding", 0))
+    if len(in_shape) != 3:
+        raise ValueError(f"expected a (channels, height, width) input, got shape {list(in_shape)}")
+    if in_shape[0] != in_channels:
+        raise ValueError(f"expected {in_channels} input channels, got input of shape {list(in_shape)}")
+    out_h = (in_shape[1] + 2 * pad_h - kernel_h) // stride_h + 1
+    out_w = (in_shape[2] + 2 * pad_w - kernel_w) // stride_w + 1
+    if out_h < 1 or out_w < 1:
+        raise ValueError(f"kernel {kernel_h}x{kernel_w} does not fit input of shape {list(in_shape)}")
+    params = out_channels * in_channels * kernel_h * kernel_w + out_channels
+    flops = 2 * in_channels * kernel_h * kernel_w * out_channels * out_h * out_w
+    return (out_channels, out_h, out_w), params, flops
+
+def analyze_maxpool2d(layer, in_shape):
+    # stride defaults to the kernel size, as in torch.nn.functional.max_pool2d
+    kernel_h, kernel_w = parse_pair(layer["kernel_size"])
+    stride_h, stride_w = parse_pair(layer.get("stride", layer["kernel_size"]))
+    pad_h, pad_w = parse_pair(layer.get("padding", 0))
+    if len(in_shape) != 3:
+        raise ValueError(f"expected a (channels, height, width) input, got shape {list(in_shape)}")
+    if 2 * pad_h > kernel_h or 2 * pad_w > kernel_w:
+        raise ValueError(f"padding {pad_h}x{pad_w} is more than half of kernel {kernel_h}x{kernel_w}")
+    out_h = (in_shape[1] + 2 * pad_h - kernel_h) // stride_h + 1
+    out_w = (in_shape[2] + 2 * pad_w - kernel_w) // stride_w + 1
+    if out_h < 1 or out_w < 1:
+        raise ValueError(f"kernel {kernel_h}x{kernel_w} does not fit input of shape {list(in_shape)}")
+    out_shape = (in_shape[0], out_h, out_w)
+    return out_shape, 0, math.prod(out_shape) * kernel_h * kernel_w
+
+def analyze_elementwise(layer, in_shape):
+    return in_shape, 0, math.prod(in_shape)
+
+def analyze_log_softmax(layer, in_shape):
+    # max, subtract, exp, sum and log per element
+    return in_shape, 0, 5 * math.prod(in_shape)
+
+def analyze_add(layer, in_shapes):
+    for shape in in_shapes[1:]:
+        if shape != in_shapes[0]:
+            raise ValueError(f"cannot add inputs of shapes {[list(shape) for shape in in_shapes]}")
+    return in_shapes[0], 0, (len(in_shapes) - 1) * math.prod(in_shapes[0])
+
+def analyze_concat(layer, in_shapes):
+    # Concatenates along the first non-batch dimension (channels or features)
+    for shape in in_shapes[1:]:
+        if len(shape) != len(in_shapes[0]) or shape[1:] != in_shapes[0][1:]:
+            raise ValueError(f"cannot concatenate inputs of shapes {[list(shape) for shape in in_shapes]}")
+    out_shape = (sum(shape[0] for shape in in_shapes),) + in_shapes[0][1:]
+    return out_shape, 0, 0
+
+LAYER_ANALYZERS = {
+    "view": analyze_view,
+    "linear": analyze_linear,
+    "conv2d": analyze_conv2d,
+    "maxpool2d": analyze_maxpool2d,
+    "max_pool2d": analyze_maxpool2d,
+    "relu": analyze_elementwise,
+    "sigmoid": analyze_elementwise,
+    "tanh": analyze_elementwise,
+    "log_softmax": analyze_log_softmax,
+}
+
+# Layers reading more than one input receive the list of input shapes
+MERGE_ANALYZERS = {
+    "add": analyze_add,
+    "concat": analyze_concat,
+}
+
+def analyze_layer(layer_idx, layer, in_shapes):
+    layer_type = layer.get("layer_type")
+    if layer_type in MERGE_ANALYZERS:
+        analyzer = MERGE_ANALYZERS[layer_type]
+    elif layer_type in LAYER_ANALYZERS:
+        if len(in_shapes) != 1:
+            raise ShapeError(layer_idx, layer_type, f"expected 1 input, got {len(in_shapes)}")
+        analyzer = LAYER_ANALYZERS[layer_type]
+        in_shapes = in_shapes[0]
+    else:
+        raise ShapeError(layer_idx, layer_type, "unsupported layer type")
+    try:
+        return analyzer(layer, in_shapes)
+    except KeyError as error:
+        raise ShapeError(layer_idx, layer_type, f"missing field {error}") from None
+    except (TypeError, ValueError) as error:
+        raise ShapeError(layer_idx, layer_type, str(error)) from None
+
+def analyze_model(model_dict, batch_size=1):
+    # Propagates the dataset shape through every layer, in dependency order, and returns
+    # per-layer statistics. Raises ShapeError naming the first layer whose input does not fit.
+    layers = model_dict["model"]["layers"]
+    try:
+        inputs = layer_inputs(model_dict)
+        order = topological_order(inputs)
+        output = output_index(model_dict)
+    except GraphError as error:
+        layer_idx = error.layer_idx
+        layer_type = layers[layer_idx - 1].get("layer_type") if isinstance(layer_idx, int) else "output"
+        raise ShapeError(layer_idx, layer_type, error.message) from None
+    shapes = {INPUT: input_shape(model_dict)}
+    stats = {}
+    for layer_idx in order:
+        layer = layers[layer_idx - 1]
+        in_shapes = [shapes[src] for src in inputs[layer_idx - 1]]
+        out_shape, params, flops = analyze_layer(layer_idx, layer, in_shapes)
+        shapes[layer_idx] = out_shape
+        stats[layer_idx] = {
+            "index": layer_idx,
+            "layer_type": layer["layer_type"],
+            "output_shape": list(out_shape),
+            "parameters": params,
+            "activation_bytes": batch_size * math.prod(out_shape) * BYTES_PER_ELEMENT,
+            "flops": batch_size * flops,
+        }
+    result = {"input_shape": list(shapes[INPUT]), "layers": [stats[layer_idx] for layer_idx in range(1, len(layers) + 1)]}
+    result["output_shape"] = list(shapes[output])
+    result["total_parameters"] = sum(layer["parameters"] for layer in result["layers"])
+    result["total_flops"] = sum(layer["flops"] for layer in result["layers"])
+    result["total_activation_bytes"] = sum(layer["activation_bytes"] for layer in result["layers"])
+    return result
+
+def format_analysis(analysis):
+    # Human-readable per-layer summary, one line per layer
+    lines = [f"Input: {analysis['input_shape']}"]
+    for layer in analysis["layers"]:
+        lines.append(f"Layer {layer['index']} ({layer['layer_type']}): output {layer['output_shape']}, "
+                     f"{layer['parameters']} parameters, {layer['activation_bytes']} activation bytes, {layer['flops']} FLOPs")
+    lines.append(f"Total FLOPs: {analysis['total_flops']}")
+    lines.append(f"Total activation memory: {analysis['total_activation_bytes']} bytes")
+    return lines
@@ -7,7 +7,7 @@ class PrimaryModel(torch.nn.Module):
         self.test_dataset = torchvision.datasets.MNIST('build/data', train=False, download=True, transform=torchvision.transforms.ToTensor())
         self.loss_function = torch.nn.CrossEntropyLoss()
         self.layer2 = torch.nn.Linear(784, 10)
-        self.layer3 = torch.nn.functional.relu
+        self.layer3 = torch.nn.functional.relu_
         self.layer4 = torch.nn.functional.log_softmax
         self.optimizer = torch.optim.Adam(self.parameters(), lr=0.001)
     def forward(self, curr_tensor):
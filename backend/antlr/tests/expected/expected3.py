@@ -0,0 +1,30 @@
+import torch
+import torchvision
+class PrimaryModel(torch.nn.Module):
+    def __init__(self):
+        super(PrimaryModel, self).__init__()
+        self.train_dataset = torchvision.datasets.MNIST('build/data', train=True, download=True, transform=torchvision.transforms.ToTensor())
+        self.test_dataset = torchvision.datasets.MNIST('build/data', train=False, download=True, transform=torchvision.transforms.ToTensor())
+        self.loss_function = torch.nn.CrossEntropyLoss()
+        self.layer1 = torch.nn.Conv2d(1, 8, kernel_size=3, stride=1, padding=1)
+        self.layer2 = torch.nn.functional.relu_
+        self.layer3 = torch.nn.Conv2d(8, 8, kernel_size=3, stride=1, padding=1)
+        self.layer4 = torch.nn.functional.relu_
+        self.layer11 = torch.nn.Linear(1764, 10)
+        self.layer12 = torch.nn.functional.log_softmax
+        self.optimizer = torch.optim.Adam(self.parameters(), lr=0.001)
+    def forward(self, curr_tensor):
+        tensor1 = self.layer1(curr_tensor)
+        tensor1 = self.layer2(tensor1)
+        tensor2 = self.layer3(tensor1)
+        tensor2 = self.layer4(tensor2)
+        tensor1 = tensor1 + tensor2
+        del tensor2
+        tensor1 = torch.nn.functional.max_pool2d(tensor1, kernel_size=2)
+        curr_tensor = torch.nn.functional.max_pool2d(curr_tensor, kernel_size=2)
+        tensor1 = torch.cat([tensor1, curr_tensor], dim=1)
+        del curr_tensor
+        tensor1 = tensor1.view(-1, 1764)
+        tensor1 = self.layer11(tensor1)
+        tensor1 = self.layer12(tensor1, -1)
+        return tensor1
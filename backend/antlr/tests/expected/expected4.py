@@ -0,0 +1,33 @@
+import torch
+import torchvision
+import layerProfiler
+class PrimaryModel(torch.nn.Module):
+    def __init__(self):
+        super(PrimaryModel, self).__init__()
+        self.train_dataset = torchvision.datasets.MNIST('build/data', train=True, download=True, transform=torchvision.transforms.ToTensor())
+        self.test_dataset = torchvision.datasets.MNIST('build/data', train=False, download=True, transform=torchvision.transforms.ToTensor())
+        self.loss_function = torch.nn.CrossEntropyLoss()
+        self.training_config = {'profile': True, 'profile_window': 20}
+        self.profiler = layerProfiler.layerProfiler({'layer1': 'view', 'layer2': 'linear', 'layer3': 'relu', 'layer4': 'linear', 'layer5': 'log_softmax'}, window=20)
+        self.layer2 = torch.nn.Linear(784, 64)
+        self.layer3 = torch.nn.functional.relu_
+        self.layer4 = torch.nn.Linear(64, 10)
+        self.layer5 = torch.nn.functional.log_softmax
+        self.optimizer = torch.optim.Adam(self.parameters(), lr=0.001)
+    def forward(self, curr_tensor):
+        self.profiler.start('layer1')
+        curr_tensor = curr_tensor.view(-1, 784)
+        self.profiler.stop('layer1', curr_tensor)
+        self.profiler.start('layer2')
+        curr_tensor = self.layer2(curr_tensor)
+        self.profiler.stop('layer2', curr_tensor)
+        self.profiler.start('layer3')
+        curr_tensor = self.layer3(curr_tensor)
+        self.profiler.stop('layer3', curr_tensor)
+        self.profiler.start('layer4')
+        curr_tensor = self.layer4(curr_tensor)
+        self.profiler.stop('layer4', curr_tensor)
+        self.profiler.start('layer5')
+        curr_tensor = self.layer5(curr_tensor, -1)
+        self.profiler.stop('layer5', curr_tensor)
+        return curr_tensor
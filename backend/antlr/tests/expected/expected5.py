@@ -0,0 +1,17 @@
+import torch
+import torchvision
+import datasetCache
+class PrimaryModel(torch.nn.Module):
+    def __init__(self):
+        super(PrimaryModel, self).__init__()
+        self.train_dataset = datasetCache.synthetic_dataset((3, 8, 8), 5, 512, seed=0)
+        self.test_dataset = datasetCache.synthetic_dataset((3, 8, 8), 5, 128, seed=1)
+        self.loss_function = torch.nn.CrossEntropyLoss()
+        self.layer2 = torch.nn.Linear(192, 5)
+        self.layer3 = torch.nn.functional.log_softmax
+        self.optimizer = torch.optim.Adam(self.parameters(), lr=0.001)
+    def forward(self, curr_tensor):
+        curr_tensor = curr_tensor.view(-1, 192)
+        curr_tensor = self.layer2(curr_tensor)
+        curr_tensor = self.layer3(curr_tensor, -1)
+        return curr_tensor
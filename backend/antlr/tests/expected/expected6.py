@@ -0,0 +1,41 @@
+import torch
+import torchvision
+import torch.utils.checkpoint
+class PrimaryModel(torch.nn.Module):
+    def __init__(self):
+        super(PrimaryModel, self).__init__()
+        self.train_dataset = torchvision.datasets.MNIST('build/data', train=True, download=True, transform=torchvision.transforms.ToTensor())
+        self.test_dataset = torchvision.datasets.MNIST('build/data', train=False, download=True, transform=torchvision.transforms.ToTensor())
+        self.loss_function = torch.nn.CrossEntropyLoss()
+        self.training_config = {'batch_size': 64, 'memory_budget': '8MB', 'micro_batches': 3}
+        self.layer1 = torch.nn.Conv2d(1, 16, kernel_size=3, stride=1, padding=1)
+        self.layer2 = torch.nn.functional.relu_
+        self.layer3 = torch.nn.Conv2d(16, 16, kernel_size=3, stride=1, padding=1)
+        self.layer4 = torch.nn.functional.relu_
+        self.layer5 = torch.nn.Conv2d(16, 16, kernel_size=3, stride=1, padding=1)
+        self.layer6 = torch.tanh_
+        self.layer7 = torch.nn.Conv2d(16, 16, kernel_size=3, stride=1, padding=1)
+        self.layer8 = torch.nn.functional.relu_
+        self.layer11 = torch.nn.Linear(3136, 10)
+        self.layer12 = torch.nn.functional.log_softmax
+        self.optimizer = torch.optim.SGD(self.parameters(), lr=0.01, momentum=0.9)
+    def forward(self, curr_tensor):
+        curr_tensor = torch.utils.checkpoint.checkpoint(self.segment1, curr_tensor, use_reentrant=False)
+        curr_tensor = torch.utils.checkpoint.checkpoint(self.segment2, curr_tensor, use_reentrant=False)
+        curr_tensor = torch.nn.functional.max_pool2d(curr_tensor, kernel_size=2)
+        curr_tensor = curr_tensor.view(-1, 3136)
+        curr_tensor = self.layer11(curr_tensor)
+        curr_tensor = self.layer12(curr_tensor, -1)
+        return curr_tensor
+    def segment1(self, curr_tensor):
+        curr_tensor = self.layer1(curr_tensor)
+        curr_tensor = self.layer2(curr_tensor)
+        curr_tensor = self.layer3(curr_tensor)
+        curr_tensor = self.layer4(curr_tensor)
+        return curr_tensor
+    def segment2(self, curr_tensor):
+        curr_tensor = self.layer5(curr_tensor)
+        curr_tensor = self.layer6(curr_tensor)
+        curr_tensor = self.layer7(curr_tensor)
+        curr_tensor = self.layer8(curr_tensor)
+        return curr_tensor
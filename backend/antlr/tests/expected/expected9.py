@@ -0,0 +1,21 @@
+import torch
+import torchvision
+class PrimaryModel(torch.nn.Module):
+    def __init__(self):
+        super(PrimaryModel, self).__init__()
+        self.train_dataset = torchvision.datasets.MNIST('build/data', train=True, download=True, transform=torchvision.transforms.ToTensor())
+        self.test_dataset = torchvision.datasets.MNIST('build/data', train=False, download=True, transform=torchvision.transforms.ToTensor())
+        self.loss_function = torch.nn.CrossEntropyLoss()
+        self.layer1 = torch.nn.Conv2d(1, 4, kernel_size=3, stride=1, padding=1)
+        self.layer2 = torch.nn.functional.relu_
+        self.layer5 = torch.nn.Linear(784, 10)
+        self.layer6 = torch.nn.functional.log_softmax
+        self.optimizer = torch.optim.Adam(self.parameters(), lr=0.001)
+    def forward(self, curr_tensor):
+        curr_tensor = self.layer1(curr_tensor)
+        curr_tensor = self.layer2(curr_tensor)
+        curr_tensor = torch.nn.functional.max_pool2d(curr_tensor, kernel_size=3, stride=2, padding=1)
+        curr_tensor = curr_tensor.view(-1, 784)
+        curr_tensor = self.layer5(curr_tensor)
+        curr_tensor = self.layer6(curr_tensor, -1)
+        return curr_tensor
@@ -0,0 +1,201 @@
+import ast
+import hashlib
+import json
+import os
+import sys
+import zipfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "local")
+ANTLR_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "antlr")
+sys.path.append(LOCAL_DIR)
+sys.path.append(ANTLR_DIR)
+
+# Colab bundle: a notebook plus content-hashed artifacts.
+# The training code (run_main.py and every backend module it imports) is packed into a zip
+# that the notebook puts on sys.path, and datasets with a pre-decoded cache (see
+# datasetCache.py) ship their cache files, so Colab neither re-downloads nor re-decodes them.
+# Artifact names carry a hash of their contents: the uploader skips names already in Drive,
+# and the notebook copies each artifact to the Colab disk once per session. The notebook
+# embeds only the generated model and the artifact names, and is byte-for-byte identical
+# for identical inputs.
+
+BUILD_DIR = "backend/google/build"
+ARTIFACT_DIR = os.path.join(BUILD_DIR, "artifacts")
+NOTEBOOK_FILENAME = os.path.join(BUILD_DIR, "PrimaryModel.ipynb")
+MANIFEST_FILENAME = os.path.join(BUILD_DIR, "bundle.json")
+SKELETON_FILENAME = "backend/google/SkeletonNotebook.json"
+PACKET_FILENAME = "backend/local/build/PrimaryModel.json"
+DATA_ROOT = "build/data"
+
+DRIVE_DIR = "/content/drive/MyDrive/TorchBlocks"
+COLAB_DIR = "/content/torchblocks"
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+def file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as hashed_file:
+        for block in iter(lambda: hashed_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hashed_name(stem, extension, digest):
+    return f"{stem}-{digest[:16]}{extension}"
+
+def imported_modules(filename):
+    with open(filename, "r") as source_file:
+        tree = ast.parse(source_file.read(), filename)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name.split(".")[0]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            yield node.module.split(".")[0]
+
+def code_modules(entry="run_main"):
+    # Source files of entry and every backend module it imports, directly or not
+    search_dirs = (LOCAL_DIR, ANTLR_DIR)
+    found = {}
+    pending = [entry]
+    while pending:
+        module = pending.pop()
+        if module in found:
+            continue
+        for search_dir in search_dirs:
+            filename = os.path.join(search_dir, f"{module}.py")
+            if os.path.exists(filename):
+                found[module] = filename
+                pending.extend(imported_modules(filename))
+                break
+    return found
+
+def build_code_archive(out_dir):
+    # Deterministic zip (sorted entries, fixed timestamps) of the training code
+    tmp_filename = os.path.join(out_dir, "code.zip.tmp")
+    with zipfile.ZipFile(tmp_filename, "w", zipfile.ZIP_DEFLATED) as archive:
+        for module, filename in sorted(code_modules().items()):
+            info = zipfile.ZipInfo(f"{module}.py", date_time=ZIP_DATE)
+            info.external_attr = 0o644 << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(filename, "rb") as source_file:
+                archive.writestr(info, source_file.read())
+    name = hashed_name("code", ".zip", file_hash(tmp_filename))
+    filename = os.path.join(out_dir, name)
+    os.replace(tmp_filename, filename)
+    return {"name": name, "path": filename, "colab_path": None}
+
+def build_dataset_artifacts(dataset_type):
+    # The pre-decoded train and test cache files, uploaded as they are. In Colab they are
+    # linked to where datasetCache.load_dataset looks for them.
+    import datasetCache
+    artifacts = []
+    for train in (True, False):
+        filename = datasetCache.cache_filename(dataset_type, DATA_ROOT, train)
+        if not os.path.exists(filename):
+            datasetCache.build_cache(dataset_type, DATA_ROOT, train)
+        stem, extension = os.path.splitext(os.path.basename(filename))
+        artifacts.append({"name": hashed_name(stem, extension, file_hash(filename)), "path": filename,
+                          "colab_path": os.path.join(DATA_ROOT, "cache", os.path.basename(filename))})
+    return artifacts
+
+def model_source(packet):
+    # Regenerates the model so that it reads the dataset cache shipped in the bundle
+    import datasetCache
+    from compile_main import compile_model
+    from compileCache import CompileCache
+    if packet["dataset"]["type"] in datasetCache.DECODERS:
+        packet = dict(packet, dataset=dict(packet["dataset"], cache=True))
+    return compile_model(packet, CompileCache())[0]
+
+def code_cell(cell_id, source):
+    lines = source.splitlines(keepends=True)
+    return {"cell_type": "code", "execution_count": None, "metadata": {"id": cell_id}, "outputs": [], "source": lines}
+
+def setup_source(artifacts):
+    code_path = next(f"{COLAB_DIR}/{artifact['name']}" for artifact in artifacts if artifact["colab_path"] is None)
+    entries = "".join(f"    ({artifact['name']!r}, {artifact['colab_path']!r}),\n" for artifact in artifacts)
+    return (
+        "# Copies the bundle's artifacts from Drive to the Colab disk (once per session) and puts\n"
+        "# the training code on sys.path\n"
+        "import os\n"
+        "import shutil\n"
+        "import sys\n"
+        "from google.colab import drive\n"
+        "drive.mount('/content/drive')\n"
+        f"drive_dir = {DRIVE_DIR!r}\n"
+        "out_filename = drive_dir + \"/output_results.json\"\n"
+        f"colab_dir = {COLAB_DIR!r}\n"
+        "os.makedirs(colab_dir, exist_ok=True)\n"
+        "artifacts = [\n"
+        f"{entries}"
+        "]\n"
+        "for name, link in artifacts:\n"
+        "    local_path = os.path.join(colab_dir, name)\n"
+        "    if not os.path.exists(local_path):\n"
+        "        shutil.copyfile(os.path.join(drive_dir, \"artifacts\", name), local_path + \".tmp\")\n"
+        "        os.replace(local_path + \".tmp\", local_path)\n"
+        "    if link is not None:\n"
+        "        os.makedirs(os.path.dirname(link), exist_ok=True)\n"
+        "        if os.path.lexists(link):\n"
+        "            os.remove(link)\n"
+        "        os.symlink(local_path, link)\n"
+        f"sys.path.insert(0, {code_path!r})\n"
+    )
+
+def run_source(epochs):
+    return (
+        "import json\n"
+        "import torch\n"
+        "import run_main\n"
+        "from metricsLog import compact_metrics, stream_filename\n"
+        "results_filename = os.path.join(colab_dir, \"local_results.json\")\n"
+        "run_main.out_filename = results_filename\n"
+        "run_main.model_filename = os.path.join(colab_dir, \"model_params.txt\")\n"
+        "\n"
+        "def publish_results(finished=False):\n"
+        "    # Rewrites the Drive results file in place, keeping the file id the TorchBlocks results\n"
+        "    # sync polls; finished tells it to stop\n"
+        "    compact_metrics(stream_filename(results_filename), results_filename)\n"
+        "    with open(results_filename, \"r\") as results_file:\n"
+        "        results = json.load(results_file)\n"
+        "    results[\"finished\"] = finished\n"
+        "    with open(out_filename, \"w\") as outfile:\n"
+        "        outfile.write(json.dumps(results, indent=4))\n"
+        "    return False\n"
+        "\n"
+        "if __name__ == \"__main__\":\n"
+        "    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')\n"
+        f"    run_main.run_training({epochs}, device, model_class=PrimaryModel, should_stop=lambda results: publish_results())\n"
+        "    publish_results(finished=True)\n"
+    )
+
+def build_notebook(source, artifacts, epochs):
+    with open(SKELETON_FILENAME, "r") as skeleton_file:
+        skeleton = json.load(skeleton_file)
+    cells = [cell for cell in skeleton["cells"] if cell["cell_type"] == "markdown"]
+    cells.append(code_cell("setup", setup_source(artifacts)))
+    cells.append(code_cell("model", source))
+    cells.append(code_cell("run", run_source(epochs)))
+    return {"cells": cells, "metadata": skeleton["metadata"], "nbformat": 4, "nbformat_minor": 0}
+
+def build_bundle(epochs=2, packet_filename=PACKET_FILENAME):
+    # Writes the notebook, the artifacts and bundle.json (what the uploader reads); returns the manifest
+    import datasetCache
+    with open(packet_filename, "r") as packet_file:
+        packet = json.load(packet_file)
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    artifacts = [build_code_archive(ARTIFACT_DIR)]
+    if packet["dataset"]["type"] in datasetCache.DECODERS:
+        artifacts += build_dataset_artifacts(packet["dataset"]["type"])
+    # only the current code archive is kept
+    for filename in os.listdir(ARTIFACT_DIR):
+        if filename != artifacts[0]["name"]:
+            os.remove(os.path.join(ARTIFACT_DIR, filename))
+    notebook = build_notebook(model_source(packet), artifacts, epochs)
+    with open(NOTEBOOK_FILENAME, "w") as nb_file:
+        nb_file.write(json.dumps(notebook, indent=1, sort_keys=True) + "\n")
+    manifest = {"notebook": NOTEBOOK_FILENAME,
+                "artifacts": [{"name": artifact["name"], "path": artifact["path"]} for artifact in artifacts]}
+    with open(MANIFEST_FILENAME, "w") as manifest_file:
+        manifest_file.write(json.dumps(manifest, indent=4))
+    return manifest
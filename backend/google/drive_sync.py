@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import time
+
+# Drive side of a Colab run.
+# The TorchBlocks folder, the notebook and the results file are looked up by name and reused,
+# so every upload updates the same files (and keeps the same Colab link); an unchanged
+# notebook is not re-sent. Bundle artifacts (see bundle_builder.py) go to TorchBlocks/artifacts
+# and are skipped when their content-hashed name is already there. The results file is
+# then polled: its metadata is cheap to fetch, so it is downloaded only when its modifiedTime
+# or md5Checksum changed. Polling backs off while nothing changes and stops once the notebook
+# marks the results finished or nothing has changed for max_idle seconds.
+# The Drive API is reached through a client object: googleDriveClient wraps the Drive v3
+# service, and localDriveClient keeps the "Drive" in a local directory, so the whole flow
+# also runs without Google credentials.
+
+FOLDER_NAME = "TorchBlocks"
+FOLDER_MIMETYPE = "application/vnd.google-apps.folder"
+NOTEBOOK_NAME = "PrimaryModel.ipynb"
+RESULTS_NAME = "output_results.json"
+ARTIFACT_FOLDER_NAME = "artifacts"
+MIMETYPE = "text/plain"
+ARTIFACT_MIMETYPE = "application/octet-stream"
+
+class googleDriveClient():
+    def __init__(self, drive_service):
+        import googleapiclient.errors
+        import httplib2
+        self.service = drive_service
+        # errors that are retried on the next poll instead of ending the sync
+        self.transient_errors = (googleapiclient.errors.HttpError, httplib2.HttpLib2Error, OSError)
+
+    def find(self, name, parent_id, mimetype=None):
+        # Most recently modified non-trashed file called name in parent_id, or None
+        query = f"name = '{name}' and '{parent_id}' in parents and trashed = false"
+        if mimetype is not None:
+            query += f" and mimeType = '{mimetype}'"
+        found = self.service.files().list(q=query, spaces="drive", orderBy="modifiedTime desc",
+                                          fields="files(id)").execute().get("files", [])
+        return found[0]["id"] if found else None
+
+    def create_folder(self, name, parent_id):
+        body = {"name": name, "parents": [parent_id], "mimeType": FOLDER_MIMETYPE}
+        return self.service.files().create(body=body, fields="id").execute().get("id")
+
+    def upload(self, filename, name, parent_id, description, file_id=None, mimetype=MIMETYPE):
+        # Creates the file, or replaces the contents of file_id
+        import googleapiclient.http
+        media_body = googleapiclient.http.MediaFileUpload(filename, mimetype=mimetype, resumable=True)
+        if file_id is not None:
+            return self.service.files().update(fileId=file_id, media_body=media_body, fields="id").execute().get("id")
+        body = {"name": name, "parents": [parent_id], "description": description}
+        return self.service.files().create(body=body, media_body=media_body, fields="id").execute().get("id")
+
+    def metadata(self, file_id):
+        return self.service.files().get(fileId=file_id, fields="modifiedTime,md5Checksum").execute()
+
+    def download(self, file_id):
+        import googleapiclient.http
+        import io
+        buffer = io.BytesIO()
+        downloader = googleapiclient.http.MediaIoBaseDownload(buffer, self.service.files().get_media(fileId=file_id))
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+        return buffer.getvalue()
+
+class localDriveClient():
+    # Drive stand-in backed by a directory: folders are directories, file ids are paths
+    # relative to root and "root" is the directory itself
+    def __init__(self, root):
+        self.root = root
+        self.transient_errors = (OSError,)
+
+    def path(self, file_id):
+        return self.root if file_id == "root" else os.path.join(self.root, file_id)
+
+    def file_id(self, parent_id, name):
+        return name if parent_id == "root" else os.path.join(parent_id, name)
+
+    def find(self, name, parent_id, mimetype=None):
+        path = os.path.join(self.path(parent_id), name)
+        if not os.path.exists(path) or (mimetype == FOLDER_MIMETYPE) != os.path.isdir(path):
+            return None
+        return self.file_id(parent_id, name)
+
+    def create_folder(self, name, parent_id):
+        os.makedirs(os.path.join(self.path(parent_id), name), exist_ok=True)
+        return self.file_id(parent_id, name)
+
+    def upload(self, filename, name, parent_id, description, file_id=None, mimetype=MIMETYPE):
+        if file_id is None:
+            file_id = self.file_id(parent_id, name)
+        with open(filename, "rb") as source_file:
+            write_atomic(self.path(file_id), source_file.read())
+        return file_id
+
+    def metadata(self, file_id):
+        path = self.path(file_id)
+        with open(path, "rb") as drive_file:
+            md5 = hashlib.md5(drive_file.read()).hexdigest()
+        return {"modifiedTime": str(os.stat(path).st_mtime_ns), "md5Checksum": md5}
+
+    def download(self, file_id):
+        with open(self.path(file_id), "rb") as drive_file:
+            return drive_file.read()
+
+def write_atomic(filename, content):
+    # Readers see either the old or the new file, never a partial write
+    tmp_filename = f"{filename}.tmp{os.getpid()}"
+    with open(tmp_filename, "wb") as tmp_file:
+        tmp_file.write(content)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_filename, filename)
+
+def file_md5(filename):
+    with open(filename, "rb") as hashed_file:
+        return hashlib.md5(hashed_file.read()).hexdigest()
+
+def publish_artifacts(client, folder_id, artifacts):
+    # artifacts: [{"name", "path"}] with content-hashed names. Returns the number uploaded.
+    artifact_folder_id = (client.find(ARTIFACT_FOLDER_NAME, folder_id, FOLDER_MIMETYPE)
+                          or client.create_folder(ARTIFACT_FOLDER_NAME, folder_id))
+    uploaded = 0
+    for artifact in artifacts:
+        if client.find(artifact["name"], artifact_folder_id) is not None:
+            print(f"Artifact {artifact['name']} already in Drive, skipped")
+            continue
+        client.upload(artifact["path"], artifact["name"], artifact_folder_id, "TorchBlocks bundle artifact",
+                      mimetype=ARTIFACT_MIMETYPE)
+        uploaded += 1
+    return uploaded
+
+def publish_run(client, notebook_filename, results_skeleton, artifacts=()):
+    # Uploads the bundle artifacts and the notebook and resets the results file, reusing
+    # whatever already exists. Returns (folder_id, notebook_id, results_id).
+    folder_id = client.find(FOLDER_NAME, "root", FOLDER_MIMETYPE) or client.create_folder(FOLDER_NAME, "root")
+    if artifacts:
+        publish_artifacts(client, folder_id, artifacts)
+    notebook_id = client.find(NOTEBOOK_NAME, folder_id)
+    if notebook_id is None or client.metadata(notebook_id).get("md5Checksum") != file_md5(notebook_filename):
+        notebook_id = client.upload(notebook_filename, NOTEBOOK_NAME, folder_id, "Main Jupyter Notebook", notebook_id)
+    results_id = client.upload(results_skeleton, RESULTS_NAME, folder_id, "Execution results",
+                               client.find(RESULTS_NAME, folder_id))
+    return folder_id, notebook_id, results_id
+
+class resultsSync():
+    def __init__(self, client, file_id, out_filename, min_interval=5.0, max_interval=60.0, backoff=1.5,
+                 max_idle=4*3600.0, clock=time.monotonic, sleep=time.sleep):
+        self.client = client
+        self.file_id = file_id
+        self.out_filename = out_filename
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_idle = max_idle
+        self.clock = clock
+        self.sleep = sleep
+        self.version = None # (modifiedTime, md5Checksum) of the last version handled
+        self.md5 = None # md5 of the last content written
+        self.finished = False
+        self.downloads = 0
+
+    def poll(self):
+        # Returns True if the local results file was updated
+        metadata = self.client.metadata(self.file_id)
+        version = (metadata.get("modifiedTime"), metadata.get("md5Checksum"))
+        if version == self.version:
+            return False
+        if version[1] is not None and version[1] == self.md5:
+            # touched, but the contents are the ones already written
+            self.version = version
+            return False
+        content = self.client.download(self.file_id)
+        self.downloads += 1
+        try:
+            results = json.loads(content)
+        except ValueError:
+            # caught mid-write; the version is not recorded, so the next poll retries
+            return False
+        self.version = version
+        md5 = hashlib.md5(content).hexdigest()
+        if md5 == self.md5:
+            return False
+        write_atomic(self.out_filename, content)
+        self.md5 = md5
+        self.finished = bool(results.get("finished", False))
+        return True
+
+    def run(self):
+        interval = self.min_interval
+        last_change = self.clock()
+        while True:
+            try:
+                changed = self.poll()
+            except self.client.transient_errors as error:
+                print(f"Results sync error, retrying: {error}")
+                changed = False
+            if self.finished:
+                print("Results sync finished: the run is complete")
+                return True
+            now = self.clock()
+            if changed:
+                interval = self.min_interval
+                last_change = now
+            elif now - last_change >= self.max_idle:
+                print(f"Results sync stopped: no new results for {self.max_idle:.0f} seconds")
+                return False
+            else:
+                interval = min(self.max_interval, interval * self.backoff)
+            self.sleep(interval)
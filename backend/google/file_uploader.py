@@ -19,7 +19,6 @@
 This script uploads a single file to Google Drive.
 """
 
-import googleapiclient.http
 import httplib2
 import oauth2client.client
 from googleapiclient.discovery import build
@@ -28,7 +27,8 @@ from googleapiclient.errors import HttpError
 import sys
 import time
 import json
-import io
+
+from drive_sync import googleDriveClient, publish_run, resultsSync
 
 # OAuth 2.0 scope that will be authorized.
 # Check https://developers.google.com/drive/scopes for all available scopes.
@@ -41,15 +41,14 @@ CLIENT_SECRETS = "backend/google/build/client_secrets.json"
 AUTHINFO_FILE = "backend/google/build/authinfo.json"
 AUTHINFO_SKELETON = "backend/google/SkeletonAuth.json"
 RESULTS_FILE = "backend/local/build/local_results.json"
+RESULTS_SKELETON = "backend/google/SkeletonResults.json"
 
-# Path to the file to upload.
+# Path to the file to upload, and optionally the bundle.json of its artifacts (see gen_notebook.py).
 FILENAME = sys.argv[1]
-
-# Metadata about the file.
-MIMETYPE = "text/plain"
-MAIN_FOLDER = "torchblocks"
-TITLE = "PrimaryModel.ipynb"
-DESCRIPTION = "Main Jupyter Notebook"
+ARTIFACTS = []
+if len(sys.argv) > 2:
+    with open(sys.argv[2], "r") as manifest_fp:
+        ARTIFACTS = json.load(manifest_fp)["artifacts"]
 
 with open(AUTHINFO_FILE, "rb") as auth_fp:
     self_authinfo = json.load(auth_fp)
@@ -103,77 +102,21 @@ http = httplib2.Http()
 credentials.authorize(http)
 drive_service = build("drive", "v3", http=http)
 
-file_metadata = {
-        "name": "TorchBlocks",
-        "mimeType": "application/vnd.google-apps.folder",
-    }
-
-# pylint: disable=maybe-no-member
-folderfile = drive_service.files().create(body=file_metadata, fields="id").execute()
-
-folder_id = folderfile.get("id")
-print(f"Folder ID: {folder_id}")
-
-# Insert a file. Files are comprised of contents and metadata.
-# MediaFileUpload abstracts uploading file contents from a file on disk.
-media_body = googleapiclient.http.MediaFileUpload(
-    FILENAME, mimetype=MIMETYPE, resumable=True
-)
-# The body contains the metadata for the file.
-body = {
-    "name": TITLE,
-    "parents": [folder_id],
-    "description": DESCRIPTION,
-}
-
-# Perform the request and print the result.
-try:
-    new_file = (
-      drive_service.files().create(body=body, media_body=media_body).execute()
-    )
-    print(f"File ID: {new_file.get('id')}")
-    colab_link = "https://colab.research.google.com/drive/" + new_file.get("id")
-    self_authinfo["colab_link"] = colab_link
-    with open(AUTHINFO_FILE, "wb") as auth_fp:
-        auth_fp.write(json.dumps(self_authinfo).encode("utf-8"))
+client = googleDriveClient(drive_service)
 
-except HttpError as error:
-  # TODO(developer) - Handle errors from drive API.
-  print(f"An error occurred: {error}")
-
-# First, insert json file to the folder.
-JSON_FILENAME = "backend/google/SkeletonResults.json"
-media_body = googleapiclient.http.MediaFileUpload(
-    JSON_FILENAME, mimetype=MIMETYPE, resumable=True
-)
-# The body contains the metadata for the file.
-body = {
-    "name": "output_results.json",
-    "parents": [folder_id],
-    "description": "Execution results",
-}
-
-# Perform the request and print the result.
+# Reuse the TorchBlocks folder, notebook, artifacts and results file of earlier uploads.
 try:
-    new_file = (
-      drive_service.files().create(body=body, media_body=media_body).execute()
-    )
-    print(f"JSON File ID: {new_file.get('id')}")
-    json_file_id = new_file.get("id")
-
+    folder_id, notebook_id, json_file_id = publish_run(client, FILENAME, RESULTS_SKELETON, ARTIFACTS)
 except HttpError as error:
-  # TODO(developer) - Handle errors from drive API.
-  print(f"An error occurred: {error}")
-
-
-# Then, check for updated results.
-while True:
-    request = drive_service.files().get_media(fileId=json_file_id)
-    file = io.BytesIO()
-    downloader = googleapiclient.http.MediaIoBaseDownload(file, request)
-    done = False
-    while done is False:
-        status, done = downloader.next_chunk()
-    with open(RESULTS_FILE, "wb") as results_fp:
-        results_fp.write(file.getvalue())
-    time.sleep(5)
\ No newline at end of file
+    print(f"An error occurred: {error}")
+    sys.exit(1)
+print(f"Folder ID: {folder_id}")
+print(f"File ID: {notebook_id}")
+print(f"JSON File ID: {json_file_id}")
+colab_link = "https://colab.research.google.com/drive/" + notebook_id
+self_authinfo["colab_link"] = colab_link
+with open(AUTHINFO_FILE, "wb") as auth_fp:
+    auth_fp.write(json.dumps(self_authinfo).encode("utf-8"))
+
+# Then, check for updated results until the notebook finishes the run.
+resultsSync(client, json_file_id, RESULTS_FILE).run()
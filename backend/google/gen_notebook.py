@@ -1,34 +1,15 @@
-import json
-
-nb_filename = "backend/google/build/PrimaryModel.ipynb"
-skeleton_filename = "backend/google/SkeletonNotebook.json"
-
-#generate cells:
-with open(skeleton_filename, "r") as skeleton_file:
-    main_entry = json.load(fp=skeleton_file)
-
-#generate model cell
-model_entry = dict()
-model_entry["cell_type"] = "code"
-model_entry["execution_count"] = 0
-model_entry["metadata"] = {"id": "123456781234"}
-model_entry["outputs"] = []
-model_source = []
-#retrieve code from PrimaryModel.py
-model_filename = "backend/local/build/PrimaryModel.py"
-with open(model_filename, "r") as model_file:
-    model_strs = model_file.readlines()
-    for line in model_strs:
-        model_source.append(line)
-model_entry["source"] = model_source
-
-main_entry["cells"][2] = model_entry
-
-
-#finish json and output to ipynb
-main_entry["nbformat"] = 4
-main_entry["nbformat_minor"] = 0
-
-gen_str = json.dumps(main_entry)
-with open(nb_filename, "w") as nb_file:
-    nb_file.write(gen_str)
\ No newline at end of file
+import argparse
+
+from bundle_builder import build_bundle, MANIFEST_FILENAME
+
+# Builds the Colab bundle for the compiled model (see bundle_builder.py):
+# backend/google/build/PrimaryModel.ipynb, the content-hashed artifacts it loads, and the
+# bundle.json manifest passed to file_uploader.py.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Colab notebook bundle for the compiled model")
+    parser.add_argument("--epochs", type=int, default=2)
+    args = parser.parse_args()
+    manifest = build_bundle(args.epochs)
+    for artifact in manifest["artifacts"]:
+        print(f"Artifact {artifact['name']} ({artifact['path']})")
+    print(f"Notebook written to {manifest['notebook']}, manifest to {MANIFEST_FILENAME}")
@@ -0,0 +1,188 @@
+import torch
+from modelTrain import modelTrainer
+
+import sys
+import os
+import argparse
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+import types
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(SCRIPT_DIR), "antlr"))
+
+from modelCodeGen import CodeGenerator
+
+# Offline CPU benchmarks of the hot paths.
+#   codegen.<N>_layers   CodeGenerator time and peak Python memory on a synthetic N-layer graph
+#   train.<arch>         modelTrainer.train steps/sec and samples/sec on a synthetic dataset
+#   test.<arch>          modelTrainer.test latency on a synthetic test set
+# Results are written as JSON; --compare checks them against a saved baseline and exits
+# with status 1 if any metric regressed by more than --threshold.
+
+results_filename = "backend/local/build/bench_results.json"
+CODEGEN_SIZES = [10, 100, 1000, 10000]
+QUICK_CODEGEN_SIZES = [10, 100, 1000]
+
+def synthetic_dataset_dict(channels, height, width, train_samples, test_samples):
+    return {"type": "synthetic", "shape": {"channels": channels, "height": height, "width": width},
+            "num_classes": 10, "train_samples": train_samples, "test_samples": test_samples}
+
+def model_dict(layers, dataset, batch_size=64):
+    return {"packet_type": "model_params", "model": {"layers": layers}, "dataset": dataset,
+            "loss_function": {"type": "crossentropyloss", "parameters": {}},
+            "optimizer": {"type": "adam", "parameters": {"learning_rate": 0.001}},
+            "training": {"batch_size": batch_size, "test_batch_size": 1000}}
+
+def chain_layers(num_layers, width=32):
+    # view followed by alternating linear/relu layers, ending in log_softmax: num_layers in total
+    layers = [{"layer_type": "view", "out_shape": "64"},
+              {"layer_type": "linear", "in_shape": 64, "out_shape": str(width)}]
+    while len(layers) < num_layers - 1:
+        if layers[-1]["layer_type"] == "linear":
+            layers.append({"layer_type": "relu"})
+        else:
+            layers.append({"layer_type": "linear", "in_shape": width, "out_shape": str(width)})
+    layers.append({"layer_type": "log_softmax"})
+    return layers[:num_layers]
+
+def architectures(train_samples, test_samples):
+    mnist_like = synthetic_dataset_dict(1, 28, 28, train_samples, test_samples)
+    return {
+        "mlp": model_dict([{"layer_type": "view", "out_shape": "784"},
+                           {"layer_type": "linear", "in_shape": 784, "out_shape": "10"},
+                           {"layer_type": "relu"},
+                           {"layer_type": "log_softmax"}], mnist_like),
+        "deep_mlp": model_dict([{"layer_type": "view", "out_shape": "784"},
+                                {"layer_type": "linear", "in_shape": 784, "out_shape": "256"},
+                                {"layer_type": "relu"},
+                                {"layer_type": "linear", "in_shape": 256, "out_shape": "256"},
+                                {"layer_type": "relu"},
+                                {"layer_type": "linear", "in_shape": 256, "out_shape": "10"},
+                                {"layer_type": "log_softmax"}], mnist_like),
+        "conv": model_dict([{"layer_type": "conv2d", "in_channels": 1, "out_channels": 8, "kernel_size": 3, "stride": 1, "padding": 1},
+                            {"layer_type": "relu"},
+                            {"layer_type": "max_pool2d", "kernel_size": 2, "stride": 2, "padding": 0},
+                            {"layer_type": "view", "out_shape": "1568"},
+                            {"layer_type": "linear", "in_shape": 1568, "out_shape": "10"},
+                            {"layer_type": "log_softmax"}], mnist_like),
+    }
+
+def metric(name, value, unit, higher_is_better):
+    return {"name": name, "value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+def generate(json_dict):
+    gen_obj = CodeGenerator("PrimaryModel")
+    gen_obj.set_model_dict(json_dict)
+    return gen_obj.str_traversal_codegen(gen_obj.codegen_model())
+
+def bench_codegen(sizes):
+    results = []
+    for num_layers in sizes:
+        json_dict = model_dict(chain_layers(num_layers), synthetic_dataset_dict(1, 8, 8, 64, 64))
+        repeats = 5 if num_layers <= 1000 else 2
+        times = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            generate(json_dict)
+            times.append(time.perf_counter() - start_time)
+        tracemalloc.start()
+        generate(json_dict)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append(metric(f"codegen.{num_layers}_layers.seconds", min(times), "s", False))
+        results.append(metric(f"codegen.{num_layers}_layers.peak_bytes", peak_bytes, "bytes", False))
+    return results
+
+def load_model(source):
+    module = types.ModuleType("PrimaryModel_bench")
+    exec(compile(source, "<bench>", "exec"), module.__dict__)
+    torch.manual_seed(0)
+    return module.PrimaryModel()
+
+def bench_model(name, json_dict, out_filename, test_repeats):
+    trainer = modelTrainer(load_model(generate(json_dict)))
+    device = torch.device("cpu")
+    batch_size = int(trainer.loader_options["batch_size"])
+    num_samples = len(trainer.model.train_dataset)
+    # divs=1 never reaches a mid-epoch checkpoint, so only training steps are timed.
+    # The first epoch warms up allocator and thread pools.
+    trainer.train(device, 0, [], [], out_filename, divs=1)
+    start_time = time.perf_counter()
+    trainer.train(device, 1, [], [], out_filename, divs=1)
+    train_seconds = time.perf_counter() - start_time
+    num_steps = len(trainer.train_loader)
+    trainer.test(device)
+    latencies = []
+    for _ in range(test_repeats):
+        start_time = time.perf_counter()
+        trainer.test(device)
+        latencies.append(time.perf_counter() - start_time)
+    test_samples = len(trainer.model.test_dataset)
+    latency = statistics.median(latencies)
+    return [metric(f"train.{name}.steps_per_sec", num_steps / train_seconds, "steps/s", True),
+            metric(f"train.{name}.samples_per_sec", min(num_steps * batch_size, num_samples) / train_seconds, "samples/s", True),
+            metric(f"test.{name}.latency_ms", 1000 * latency, "ms", False),
+            metric(f"test.{name}.samples_per_sec", test_samples / latency, "samples/s", True)]
+
+def run_benchmarks(quick=False):
+    if quick:
+        sizes, train_samples, test_samples, test_repeats = QUICK_CODEGEN_SIZES, 2048, 1000, 3
+    else:
+        sizes, train_samples, test_samples, test_repeats = CODEGEN_SIZES, 16384, 5000, 7
+    results = bench_codegen(sizes)
+    with tempfile.TemporaryDirectory() as out_dir:
+        out_filename = os.path.join(out_dir, "results.json")
+        for name, json_dict in architectures(train_samples, test_samples).items():
+            results += bench_model(name, json_dict, out_filename, test_repeats)
+    meta = {"torch": torch.__version__, "python": platform.python_version(), "machine": platform.machine(),
+            "cpu_count": os.cpu_count(), "num_threads": torch.get_num_threads(), "quick": quick,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+def compare(current, baseline, threshold):
+    # Returns the names of metrics that are worse than the baseline by more than threshold
+    baseline_values = {entry["name"]: entry["value"] for entry in baseline["results"]}
+    regressions = []
+    for entry in current["results"]:
+        if entry["name"] not in baseline_values:
+            continue
+        base = baseline_values[entry["name"]]
+        change = (entry["value"] - base) / base if base else 0.0
+        worse = -change if entry["higher_is_better"] else change
+        status = "REGRESSION" if worse > threshold else "ok"
+        if worse > threshold:
+            regressions.append(entry["name"])
+        print(f"{entry['name']:<40} {base:>14.4g} -> {entry['value']:>14.4g} {entry['unit']:<10} {100*change:+7.1f}%  {status}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark codegen, training and evaluation on CPU")
+    parser.add_argument("--quick", action="store_true", help="smaller graphs and datasets")
+    parser.add_argument("--output", default=results_filename, help="where to write the results JSON")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to check against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown (or memory growth) counted as a regression")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    current = run_benchmarks(args.quick)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as results_file:
+        results_file.write(json.dumps(current, indent=4))
+    if args.compare is None:
+        for entry in current["results"]:
+            print(f"{entry['name']:<40} {entry['value']:>14.4g} {entry['unit']}")
+        sys.exit(0)
+    with open(args.compare, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {100*args.threshold:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print("No regressions")
@@ -0,0 +1,62 @@
+import torch
+import os
+import threading
+
+# Training checkpoints.
+# A checkpoint is a torch zip archive holding the model and optimizer state_dicts plus a
+# "progress" dict (epoch, next batch, metrics history, shuffle seed, data loader options). Tensors are stored
+# as flat storages, so loading with mmap=True maps them instead of reading the whole file.
+
+def clone_tensors(obj):
+    # Deep-copies the tensors of a (nested) state_dict so training can keep mutating the originals
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().clone()
+    if isinstance(obj, dict):
+        return {key: clone_tensors(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(clone_tensors(value) for value in obj)
+    return obj
+
+def snapshot_state(model, progress):
+    return {"model": clone_tensors(model.state_dict()),
+            "optimizer": clone_tensors(model.optimizer.state_dict()),
+            "progress": progress}
+
+def load_checkpoint(filename):
+    return torch.load(filename, map_location="cpu", mmap=True, weights_only=True)
+
+def restore_model(model, checkpoint):
+    # Copies the mapped tensors into the model and optimizer and returns the progress dict
+    model.load_state_dict(checkpoint["model"])
+    model.optimizer.load_state_dict(checkpoint["optimizer"])
+    return checkpoint["progress"]
+
+class checkpointWriter():
+    # Writes snapshots in a background thread. Each write goes to a temporary file that
+    # replaces the checkpoint atomically, so an interrupted save leaves the previous one intact.
+    def __init__(self, filename):
+        self.filename = filename
+        self.thread = None
+        self.error = None
+
+    def save(self, state):
+        # Waits for the previous write, so at most one snapshot is held in memory besides the model
+        self.wait()
+        self.thread = threading.Thread(target=self.write, args=(state,), daemon=True)
+        self.thread.start()
+
+    def write(self, state):
+        tmp_filename = f"{self.filename}.tmp"
+        try:
+            torch.save(state, tmp_filename)
+            os.replace(tmp_filename, self.filename)
+        except Exception as error:
+            self.error = error
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
@@ -0,0 +1,239 @@
+import torch
+from metricsLog import metricsLog, read_metrics, stream_filename
+import datasetCache
+import run_main
+from runStore import runStore
+
+import sys
+import os
+import argparse
+import hmac
+import http.server
+import json
+import secrets
+import threading
+import time
+import types
+import urllib.parse
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(SCRIPT_DIR), "antlr"))
+
+from jsonLoader import process_json, SchemaError
+from compileCache import CompileCache
+from compile_main import compile_model, write_model_file, model_filenames, packet_filename
+from shapeAnalyzer import ShapeError
+from memoryPlanner import MemoryBudgetError
+
+# Long-lived local training server.
+# Keeps torch imported, the dataset cache mapped and the thread pools warm between runs,
+# so a run costs only compilation (usually a compile cache hit) and training.
+#   POST /run?epochs=N   body: model JSON. Compiles it in-process, hot-loads the generated
+#                        class and trains it, streaming newline-delimited JSON events:
+#                        {"event": "compiled", ...}, {"event": "metrics", ...}, {"event": "done", ...}
+#                        ({"event": "reset"}: the metrics stream restarted, drop earlier metrics)
+#   POST /stop           stops the current run at its next checkpoint
+#   GET  /status         {"busy": bool}
+# Runs write the same build files, metrics stream and model_run.log as run_all.sh, so the
+# GUI reads their results unchanged. Must be started from the repository root.
+# The daemon executes the code it generates, so every request must carry the session token
+# in an X-Daemon-Token header. The token is TRAINING_DAEMON_TOKEN if set, otherwise a random
+# one generated at startup; either way it is written to token_filename (readable by the
+# owner only), where the Next.js run-tests route reads it.
+
+DEFAULT_PORT = 8765
+TOKEN_HEADER = "X-Daemon-Token"
+log_filename = "backend/local/build/model_run.log"
+token_filename = "backend/local/build/daemon_token"
+
+def write_token(token):
+    tmp_filename = f"{token_filename}.{os.getpid()}.tmp"
+    with open(os.open(tmp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as token_file:
+        token_file.write(token)
+    os.replace(tmp_filename, token_filename)
+
+class trainingDaemon():
+    def __init__(self, device):
+        self.device = device
+        self.cache = CompileCache()
+        self.store = runStore()
+        # One run at a time; the build files and metrics stream are shared
+        self.run_lock = threading.Lock()
+        self.stop_requested = False
+        self.run_count = 0
+        # Mapped (train, test) datasets, shared by the models of every run
+        self.datasets = {}
+
+    def warm_up(self):
+        # Decode the dataset cache and start torch's intra-op thread pool before the first run.
+        # The datasets are pinned, so the generated models' load_dataset calls reuse them.
+        for name in datasetCache.DECODERS:
+            self.datasets[name] = tuple(datasetCache.pin_dataset(name, "build/data", train) for train in (True, False))
+        torch.ones(256, 256) @ torch.ones(256, 256)
+
+    def log(self, message, reset=False):
+        with open(log_filename, "w" if reset else "a") as log_file:
+            log_file.write(message + "\n")
+
+    def load_model_class(self, source):
+        # Executes the generated source as a fresh module, so every run gets its own class
+        self.run_count += 1
+        module = types.ModuleType(f"PrimaryModel_{self.run_count}")
+        module.__file__ = model_filenames[0]
+        exec(compile(source, model_filenames[0], "exec"), module.__dict__)
+        return module.PrimaryModel
+
+    def run(self, json_str, epochs, emit):
+        # Compiles and trains one model, calling emit with every event
+        start_time = time.perf_counter()
+        self.stop_requested = False
+        self.log("Starting Code Generation...", reset=True)
+        try:
+            json_dict = process_json(json_str)
+            if json_dict["dataset"]["type"] in datasetCache.DECODERS:
+                # the mapped cache is what stays warm between runs
+                json_dict["dataset"]["cache"] = True
+            source, param_count, analysis_lines = compile_model(json_dict, self.cache)
+        except (SchemaError, ShapeError, MemoryBudgetError) as error:
+            self.log(f"MODEL ERROR: {error}")
+            self.log("Code Generation Failed! Please fix the model and try again.")
+            emit({"event": "error", "message": str(error)})
+            return
+        for model_filename in model_filenames:
+            write_model_file(model_filename, source)
+        write_model_file(packet_filename, json.dumps(json_dict))
+        for line in analysis_lines:
+            self.log(line)
+        self.log(f"Total parameters: {param_count} parameters")
+        self.log("Code Generation Finished!")
+        model_class = self.load_model_class(source)
+        emit({"event": "compiled", "parameters": param_count, "seconds": time.perf_counter() - start_time})
+
+        self.log("Starting Model Training...")
+        stream = stream_filename(run_main.out_filename)
+        metricsLog(stream).reset()
+        errors = []
+
+        def train():
+            # Runs share this process: torch's thread count, which num_threads and autotune
+            # change, is restored afterwards, and run_training closes the run's async evaluator
+            num_threads = torch.get_num_threads()
+            try:
+                run_main.run_training(epochs, self.device, model_class=model_class,
+                                      should_stop=lambda results: self.stop_requested,
+                                      packet=json_dict, store=self.store)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                torch.set_num_threads(num_threads)
+
+        trainer_thread = threading.Thread(target=train, daemon=True)
+        trainer_thread.start()
+        offset = 0
+        generation = None
+        running = True
+        while running:
+            trainer_thread.join(0.1)
+            # one more read after the thread ends picks up the last records (or a whole reused run)
+            running = trainer_thread.is_alive()
+            records, offset, generation, reset = read_metrics(stream, offset, generation)
+            if reset:
+                emit({"event": "reset"})
+            for record in records:
+                emit(dict(record, event="metrics"))
+        if errors:
+            self.log(f"Training failed: {errors[0]}")
+            emit({"event": "error", "message": str(errors[0])})
+            return
+        self.log("Model Training Finished! Please check the evaluation results. ")
+        emit({"event": "done", "stopped": self.stop_requested, "seconds": time.perf_counter() - start_time})
+
+class daemonRequestHandler(http.server.BaseHTTPRequestHandler):
+    daemon = None # set by serve
+    token = None # set by serve
+
+    def authorized(self):
+        # Answers 401 and returns False unless the request carries the session token
+        if hmac.compare_digest(self.headers.get(TOKEN_HEADER, "").encode("utf-8"), self.token.encode("utf-8")):
+            return True
+        self.send_json(401, {"error": f"missing or invalid {TOKEN_HEADER} header"})
+        return False
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if urllib.parse.urlparse(self.path).path == "/status":
+            self.send_json(200, {"busy": self.daemon.run_lock.locked()})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        url = urllib.parse.urlparse(self.path)
+        if url.path == "/stop":
+            self.daemon.stop_requested = True
+            self.send_json(200, {"stopping": self.daemon.run_lock.locked()})
+            return
+        if url.path != "/run":
+            self.send_json(404, {"error": "not found"})
+            return
+        epochs = int(urllib.parse.parse_qs(url.query).get("epochs", ["2"])[0])
+        json_str = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        if not self.daemon.run_lock.acquire(blocking=False):
+            self.send_json(409, {"error": "a run is already in progress"})
+            return
+        try:
+            # The body is streamed until the connection closes, one JSON event per line
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+
+            def emit(event):
+                # A client that disconnects does not cancel the run; the lock is held until it ends
+                try:
+                    self.wfile.write((json.dumps(event) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            try:
+                self.daemon.run(json_str, epochs, emit)
+            except Exception as error:
+                emit({"event": "error", "message": str(error)})
+        finally:
+            self.daemon.run_lock.release()
+
+    def log_message(self, format, *args):
+        pass # training output is the interesting part of the daemon's stdout
+
+def serve(port, device):
+    daemon = trainingDaemon(device)
+    daemon.warm_up()
+    daemonRequestHandler.daemon = daemon
+    daemonRequestHandler.token = os.environ.get("TRAINING_DAEMON_TOKEN") or secrets.token_hex(32)
+    write_token(daemonRequestHandler.token)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), daemonRequestHandler)
+    print(f"Training daemon listening on 127.0.0.1:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(token_filename):
+            os.remove(token_filename)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve compile-and-train requests from a warm process")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    os.makedirs("backend/local/build", exist_ok=True)
+    os.makedirs("backend/antlr/build", exist_ok=True)
+    serve(args.port, torch.device('cuda' if torch.cuda.is_available() else 'cpu'))
@@ -0,0 +1,122 @@
+import torch
+import torchvision
+import os
+
+# Pre-decoded dataset cache.
+# Each supported dataset is decoded once into normalized float32 image and int64 label
+# tensors, saved under <root>/cache, and memory-mapped on every later load. Samples match
+# what torchvision's ToTensor() produces, so cached and uncached runs train identically.
+
+CACHE_VERSION = 1
+
+# Datasets pinned by a long-lived process (see daemon_main.py), by cache filename
+pinned = {}
+
+def decode_mnist(root, train):
+    dataset = torchvision.datasets.MNIST(root, train=train, download=True)
+    images = dataset.data.unsqueeze(1).to(torch.float32).div_(255)
+    return images.contiguous(), dataset.targets.to(torch.int64)
+
+DECODERS = {
+    "mnist": decode_mnist,
+}
+
+def cache_filename(name, root, train):
+    split = "train" if train else "test"
+    return os.path.join(root, "cache", f"{name}-{split}-v{CACHE_VERSION}.pt")
+
+def build_cache(name, root, train):
+    images, targets = DECODERS[name](root, train)
+    filename = cache_filename(name, root, train)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    torch.save({"images": images, "targets": targets}, tmp_filename)
+    os.replace(tmp_filename, filename)
+    return filename
+
+def load_dataset(name, root, train=True):
+    # Returns a cachedDataset backed by a memory-mapped tensor file, decoding on first use.
+    # A pinned dataset is returned as is, without reading the file again.
+    if name not in DECODERS:
+        raise Exception(f"Dataset '{name}' does not support caching")
+    filename = cache_filename(name, root, train)
+    if filename in pinned:
+        return pinned[filename]
+    if not os.path.exists(filename):
+        build_cache(name, root, train)
+    tensors = torch.load(filename, mmap=True, weights_only=True)
+    return cachedDataset(tensors["images"], tensors["targets"])
+
+def pin_dataset(name, root, train=True):
+    # Loads a dataset and keeps it, so every later load_dataset call in this process shares
+    # the same mapping
+    dataset = load_dataset(name, root, train)
+    pinned[cache_filename(name, root, train)] = dataset
+    return dataset
+
+def synthetic_dataset(shape, num_classes, num_samples, seed=0):
+    # Random images in [0, 1) and uniform labels, generated in memory from seed
+    generator = torch.Generator().manual_seed(seed)
+    images = torch.rand((num_samples,) + tuple(shape), generator=generator)
+    targets = torch.randint(num_classes, (num_samples,), generator=generator)
+    return cachedDataset(images, targets)
+
+class cachedDataset(torch.utils.data.Dataset):
+    # Indexable by int, slice or index tensor, so a whole batch is fetched in one operation
+    def __init__(self, images, targets):
+        self.images = images
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        return self.images[idx], self.targets[idx]
+
+class batchSampler(torch.utils.data.Sampler):
+    # Yields one index per batch: contiguous slices (zero-copy views of the mapping) when
+    # not shuffling, otherwise a random index tensor gathered in a single vectorized copy.
+    # With world_size > 1, rank gets an equal-size strided shard of each shuffled epoch, or a
+    # contiguous block of the unshuffled data. set_start_batch skips the first batches of an
+    # epoch without fetching them (resuming mid-epoch).
+    def __init__(self, num_samples, batch_size, shuffle=False, rank=0, world_size=1, seed=0):
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rank = rank
+        self.world_size = world_size
+        # the order of an epoch depends only on seed and epoch, so ranks and resumed runs agree
+        self.seed = seed
+        self.epoch = 0
+        self.start_batch = 0
+        if shuffle:
+            self.start = 0
+            self.end = num_samples // world_size
+        else:
+            self.start = num_samples * rank // world_size
+            self.end = num_samples * (rank + 1) // world_size
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def set_start_batch(self, start_batch):
+        self.start_batch = start_batch
+
+    def __len__(self):
+        return (self.end - self.start + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        if self.shuffle:
+            generator = torch.Generator().manual_seed(self.seed + self.epoch)
+            perm = torch.randperm(self.num_samples, generator=generator)
+            perm = perm[self.rank::self.world_size][:self.end]
+            for start in range(self.start_batch * self.batch_size, self.end, self.batch_size):
+                yield perm[start:start + self.batch_size]
+        else:
+            for start in range(self.start + self.start_batch * self.batch_size, self.end, self.batch_size):
+                yield slice(start, min(start + self.batch_size, self.end))
+
+def make_loader(dataset, batch_size, shuffle=False, rank=0, world_size=1, seed=0, **kwargs):
+    # batch_size=None makes DataLoader hand each sampler item straight to __getitem__
+    sampler = batchSampler(len(dataset), batch_size, shuffle, rank, world_size, seed)
+    return torch.utils.data.DataLoader(dataset, batch_size=None, sampler=sampler, **kwargs)
@@ -0,0 +1,137 @@
+import torch
+import copy
+from torch.func import stack_module_state, functional_call, vmap
+from modelTrain import modelTrainer
+from metricsLog import metricsLog, stream_filename
+
+# Lockstep training of K copies of one generated model.
+# The members' parameters are stacked along a new leading dimension and the model's forward
+# and loss are vmapped over it, so every batch runs as one set of K-wide kernels instead of
+# K small ones. Members differ in their initialization seed and, optionally, learning rate.
+# Each member keeps its own optimizer state (the optimizer runs on the stacked tensors) and
+# its own metrics stream.
+
+def member_filename(out_filename, member):
+    # build/local_results.json -> build/local_results.member3.json
+    base = out_filename[:-len(".json")] if out_filename.endswith(".json") else out_filename
+    return f"{base}.member{member}.json"
+
+def reset_parameters(model, seed):
+    torch.manual_seed(seed)
+    for module in model.modules():
+        if module is not model and hasattr(module, "reset_parameters"):
+            module.reset_parameters()
+
+class ensembleTrainer(modelTrainer):
+    def __init__(self, p_model, members, learning_rates=None, seed=0, device=torch.device("cpu")):
+        # Reuses modelTrainer's options and data loaders; autotune and async eval tune or
+        # evaluate a single model, so they are off here, as is layer profiling
+        super().__init__(p_model)
+        self.autotune = False
+        self.async_eval = False
+        if self.profiler is not None:
+            # layer hooks do not apply to vmapped forwards
+            self.profiler.enabled = False
+            self.profiler = None
+        if learning_rates is not None and len(learning_rates) != members:
+            raise Exception(f"Expected {members} learning rates, got {len(learning_rates)}")
+        base_lr = p_model.optimizer.defaults["lr"]
+        self.members = members
+        self.learning_rates = list(learning_rates) if learning_rates is not None else [base_lr] * members
+        self.seeds = [seed + member for member in range(members)]
+        # Member copies share the datasets and get no optimizer of their own
+        memo = {id(p_model.optimizer): None}
+        for attr in ("train_dataset", "test_dataset"):
+            if hasattr(p_model, attr):
+                memo[id(getattr(p_model, attr))] = getattr(p_model, attr)
+        copies = []
+        for member_seed in self.seeds:
+            # deepcopy fills in the memo, so every copy starts from a fresh one
+            member_model = copy.deepcopy(p_model, dict(memo))
+            reset_parameters(member_model, member_seed)
+            copies.append(member_model.to(device))
+        self.params, self.buffers = stack_module_state(copies)
+        self.model = p_model.to(device) # forward template for functional_call
+        self.optimizer = type(p_model.optimizer)(self.params.values(), **p_model.optimizer.defaults)
+        # The optimizer steps with base_lr; each member's update is rescaled to its own rate.
+        # Exact for SGD and Adam(W), whose updates are linear in lr given the same state.
+        self.lr_scale = torch.tensor([lr / base_lr for lr in self.learning_rates], device=device)
+        self.uniform_lr = all(lr == base_lr for lr in self.learning_rates)
+        self.train_loss = [[] for _ in range(members)]
+        self.train_acc = [[] for _ in range(members)]
+
+    def forward(self, images):
+        # Returns the stacked (members, batch, ...) outputs
+        def member_forward(params, buffers, images):
+            return functional_call(self.model, (params, buffers), (images,))
+        return vmap(member_forward, in_dims=(0, 0, None))(self.params, self.buffers, images)
+
+    def member_losses(self, outputs, targets):
+        return vmap(self.model.loss_function, in_dims=(0, None))(outputs, targets)
+
+    def step(self):
+        if self.uniform_lr:
+            self.optimizer.step()
+            return
+        with torch.no_grad():
+            before = [param.clone() for param in self.params.values()]
+            self.optimizer.step()
+            for param, old in zip(self.params.values(), before):
+                scale = self.lr_scale.view((-1,) + (1,) * (param.dim() - 1))
+                param.copy_(old + (param - old) * scale)
+
+    def member_state_dict(self, member):
+        # state_dict of one member, loadable into the generated model class
+        state = {name: param[member].detach().clone() for name, param in self.params.items()}
+        state.update({name: buffer[member].clone() for name, buffer in self.buffers.items()})
+        return state
+
+    def test(self, device, loader=None):
+        # Returns one {"loss", "accuracy"} dict per member
+        if loader is None:
+            loader = self.test_loader
+        was_training = self.model.training
+        self.model.eval()
+        test_loss = torch.zeros(self.members, device=device)
+        num_correct = torch.zeros(self.members, dtype=torch.long, device=device)
+        total_num = 0
+        with torch.no_grad():
+            for images, targets in loader:
+                images = images.to(device)
+                targets = targets.to(device)
+                test_output = self.forward(images)
+                test_loss += self.member_losses(test_output, targets)
+                num_correct += (test_output.argmax(dim=-1) == targets).sum(dim=1)
+                total_num += len(targets)
+        self.model.train(was_training)
+        test_loss = (test_loss / len(loader)).tolist()
+        num_correct = num_correct.tolist()
+        return [{"loss": test_loss[member], "accuracy": num_correct[member] / total_num} for member in range(self.members)]
+
+    def record_member_results(self, progress, test_stats, out_filename):
+        for member, test_stat in enumerate(test_stats):
+            self.train_loss[member].append((progress, test_stat["loss"]))
+            self.train_acc[member].append((progress, test_stat["accuracy"]))
+            record = {"progress": progress, "loss": test_stat["loss"], "accuracy": test_stat["accuracy"]}
+            metricsLog(stream_filename(member_filename(out_filename, member))).append([record])
+
+    def train(self, device, epoch, out_filename, divs=10):
+        self.model.train()
+        if hasattr(self.train_loader.sampler, "set_epoch"):
+            self.train_loader.sampler.set_epoch(epoch)
+        last_print_batch_idx = 0
+        for batch_idx, (images, targets) in enumerate(self.train_loader):
+            images = images.to(device)
+            targets = targets.to(device)
+            self.optimizer.zero_grad()
+            # Members are independent, so the gradient of the summed loss is each member's own
+            loss = self.member_losses(self.forward(images), targets).sum()
+            loss.backward()
+            self.step()
+
+            if (batch_idx - last_print_batch_idx > (len(self.train_loader) / divs)):
+                last_print_batch_idx = batch_idx
+                batch_size = int(self.loader_options["batch_size"])
+                curr_progress = epoch + (batch_idx*batch_size) / (len(self.model.train_dataset))
+                self.record_member_results(curr_progress, self.test(device, loader=self.checkpoint_loader), out_filename)
+        return self.train_loss, self.train_acc
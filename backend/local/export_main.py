@@ -0,0 +1,124 @@
+import torch
+from checkpoint import load_checkpoint
+import run_main
+
+import sys
+import os
+import argparse
+import copy
+import inspect
+import json
+import statistics
+import time
+
+# Inference export of the trained PrimaryModel.
+# The trained weights are loaded from the run_main checkpoint into a copy of the model that
+# keeps only its layers: the datasets, optimizer, loss function and training options that
+# the generated __init__ attaches are dropped. The copy is traced, frozen and saved as
+# TorchScript, and exported to ONNX when the onnx package is installed. The TorchScript
+# module is then benchmarked on CPU over a grid of batch sizes and thread counts.
+
+export_dir = "backend/local/build/export"
+torchscript_filename = os.path.join(export_dir, "PrimaryModel.pt")
+onnx_filename = os.path.join(export_dir, "PrimaryModel.onnx")
+report_filename = os.path.join(export_dir, "inference_bench.json")
+
+TRAINING_ATTRIBUTES = ["train_dataset", "test_dataset", "optimizer", "loss_function", "training_config"]
+BATCH_SIZES = [1, 8, 32, 128]
+
+def thread_counts():
+    cpu_count = os.cpu_count() or 1
+    return sorted({1, max(1, cpu_count // 2), cpu_count})
+
+def inference_model(model):
+    # Returns an eval-mode copy of model without its training-only attributes
+    memo = {id(getattr(model, attr)): None for attr in TRAINING_ATTRIBUTES if hasattr(model, attr)}
+    stripped = copy.deepcopy(model, memo)
+    for attr in TRAINING_ATTRIBUTES:
+        if hasattr(stripped, attr):
+            delattr(stripped, attr)
+    return stripped.eval()
+
+def export_torchscript(model, example):
+    # Tracing records only tensor operations, so the functional layer attributes and the
+    # optional layer profiler of generated models do not end up in the exported graph
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(model, example))
+    with torch.no_grad():
+        if not torch.allclose(traced(example), model(example), atol=1e-5):
+            raise Exception("TorchScript output differs from the eager model")
+    traced.save(torchscript_filename)
+    return traced
+
+def export_onnx(model, example):
+    # Returns True if written; ONNX export needs the optional onnx package
+    try:
+        import onnx
+    except ImportError:
+        print("ONNX export skipped: the onnx package is not installed")
+        return False
+    kwargs = {"input_names": ["input"], "output_names": ["output"],
+              "dynamic_axes": {"input": {0: "batch"}, "output": {0: "batch"}}}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False # the TorchScript-based exporter supports dynamic_axes without onnxscript
+    with torch.no_grad():
+        torch.onnx.export(model, (example,), onnx_filename, **kwargs)
+    onnx.checker.check_model(onnx.load(onnx_filename))
+    return True
+
+def benchmark(module, sample_shape, batch_sizes, threads, iterations=100, warmup=10):
+    # Returns one {batch_size, threads, p50_ms, p99_ms, samples_per_sec} entry per setting
+    results = []
+    default_threads = torch.get_num_threads()
+    try:
+        for num_threads in threads:
+            torch.set_num_threads(num_threads)
+            for batch_size in batch_sizes:
+                inputs = torch.rand((batch_size,) + tuple(sample_shape))
+                latencies = []
+                with torch.inference_mode():
+                    for _ in range(warmup):
+                        module(inputs)
+                    for _ in range(iterations):
+                        start_time = time.perf_counter()
+                        module(inputs)
+                        latencies.append(time.perf_counter() - start_time)
+                latencies.sort()
+                results.append({"batch_size": batch_size, "threads": num_threads,
+                                "p50_ms": 1000 * statistics.median(latencies),
+                                "p99_ms": 1000 * latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+                                "samples_per_sec": batch_size * len(latencies) / sum(latencies)})
+    finally:
+        torch.set_num_threads(default_threads)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the trained PrimaryModel and benchmark CPU inference")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--threads", type=int, nargs="+", default=None)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--no-bench", action="store_true", help="only write the export artifacts")
+    args = parser.parse_args()
+    os.makedirs(export_dir, exist_ok=True)
+
+    model = run_main.primary_model_class()()
+    model.load_state_dict(load_checkpoint(run_main.model_filename)["model"])
+    sample_shape = tuple(model.test_dataset[0][0].shape)
+    model = inference_model(model)
+    example = torch.rand((1,) + sample_shape)
+    traced = export_torchscript(model, example)
+    print(f"TorchScript model written to {torchscript_filename}")
+    if export_onnx(model, example):
+        print(f"ONNX model written to {onnx_filename}")
+    if args.no_bench:
+        sys.exit(0)
+
+    results = benchmark(traced, sample_shape, args.batch_sizes, args.threads or thread_counts(), args.iterations)
+    for entry in results:
+        print(f"batch {entry['batch_size']:>4}, threads {entry['threads']:>3}: p50 {entry['p50_ms']:8.3f} ms, "
+              f"p99 {entry['p99_ms']:8.3f} ms, {entry['samples_per_sec']:12.1f} samples/sec")
+    peak = max(results, key=lambda entry: entry["samples_per_sec"])
+    print(f"Peak throughput: {peak['samples_per_sec']:.1f} samples/sec (batch {peak['batch_size']}, {peak['threads']} threads)")
+    with open(report_filename, "w") as report_file:
+        report_file.write(json.dumps({"torch": torch.__version__, "sample_shape": list(sample_shape),
+                                      "results": results, "peak": peak}, indent=4))
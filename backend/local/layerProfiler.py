@@ -0,0 +1,120 @@
+import torch
+import os
+import time
+
+# Per-layer profiler used by models generated with CodeGenerator(profile=True).
+# The generated forward brackets every layer, including the inline view and max_pool2d ops,
+# with start/stop calls. stop records the forward wall time and output size, and hooks the
+# autograd node that produced the output to time its backward. Only passes with gradients
+# enabled (training steps) are recorded, so checkpoint evaluations do not skew the numbers,
+# and forwards that activation checkpointing recomputes during backward are skipped, so
+# calls and forward_ms count each layer once per step.
+# peak_memory_bytes is the CUDA allocator peak during the layer on GPU. On CPU, where no
+# allocator statistics exist, it is the layer's output plus parameter bytes; memory_source
+# says which one a record holds.
+# modelTrainer calls step() after every optimizer step and appends one aggregate record
+# per window of steps to layer_profile.jsonl next to the metrics stream.
+
+def profile_filename(out_filename):
+    return os.path.join(os.path.dirname(out_filename), "layer_profile.jsonl")
+
+def in_backward():
+    # True while the autograd engine runs a backward pass, which is when activation
+    # checkpointing recomputes its segments' forwards
+    graph_task_id = getattr(torch._C, "_current_graph_task_id", None)
+    return graph_task_id is not None and graph_task_id() != -1
+
+def synchronize():
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        torch.cuda.synchronize()
+
+class layerProfiler():
+    def __init__(self, layer_types, window=50):
+        # layer_types maps each profiled layer name ("layerN") to its layer type
+        self.layer_types = layer_types
+        self.window = window
+        self.enabled = True
+        self.steps = 0
+        self.start_times = {}
+        # parameter bytes of every profiled layer, filled in by attach()
+        self.parameter_bytes = {name: 0 for name in layer_types}
+        self.reset()
+
+    def attach(self, model):
+        # Reads the parameter sizes of model's profiled layers
+        for name in self.layer_types:
+            layer = getattr(model, name, None)
+            if isinstance(layer, torch.nn.Module):
+                self.parameter_bytes[name] = sum(param.numel() * param.element_size() for param in layer.parameters())
+
+    def reset(self):
+        self.window_steps = 0
+        self.stats = {name: {"calls": 0, "forward_seconds": 0.0, "backward_seconds": 0.0, "output_bytes": 0, "peak_memory_bytes": None}
+                      for name in self.layer_types}
+
+    def recording(self):
+        return self.enabled and torch.is_grad_enabled() and not in_backward()
+
+    def start(self, name):
+        if not self.recording():
+            return
+        synchronize()
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            torch.cuda.reset_peak_memory_stats()
+        self.start_times[name] = time.perf_counter()
+
+    def stop(self, name, output):
+        if not self.recording():
+            return
+        synchronize()
+        stats = self.stats[name]
+        stats["forward_seconds"] += time.perf_counter() - self.start_times.pop(name)
+        stats["calls"] += 1
+        stats["output_bytes"] += output.numel() * output.element_size()
+        if output.is_cuda:
+            peak = torch.cuda.max_memory_allocated(output.device)
+            stats["peak_memory_bytes"] = max(stats["peak_memory_bytes"] or 0, peak)
+        if output.grad_fn is not None:
+            self.hook_backward(name, output.grad_fn)
+
+    def hook_backward(self, name, grad_fn):
+        backward_start = []
+
+        def pre_hook(grad_outputs):
+            synchronize()
+            backward_start.append(time.perf_counter())
+
+        def post_hook(grad_inputs, grad_outputs):
+            synchronize()
+            if backward_start:
+                self.stats[name]["backward_seconds"] += time.perf_counter() - backward_start.pop()
+
+        grad_fn.register_prehook(pre_hook)
+        grad_fn.register_hook(post_hook)
+
+    def step(self):
+        # Counts one training step; returns True when a full window is ready to collect
+        if not self.enabled:
+            return False
+        self.steps += 1
+        self.window_steps += 1
+        return self.window_steps >= self.window
+
+    def collect(self):
+        # Returns the aggregate record of the current window and starts a new one
+        layers = []
+        for name, stats in self.stats.items():
+            calls = max(stats["calls"], 1)
+            output_bytes = stats["output_bytes"] // calls
+            if stats["peak_memory_bytes"] is not None:
+                peak_memory, memory_source = stats["peak_memory_bytes"], "cuda_peak"
+            else:
+                peak_memory, memory_source = output_bytes + self.parameter_bytes[name], "output_plus_parameters"
+            layers.append({"layer": name, "type": self.layer_types[name], "calls": stats["calls"],
+                           "forward_ms": 1000 * stats["forward_seconds"] / calls,
+                           "backward_ms": 1000 * stats["backward_seconds"] / calls,
+                           "output_bytes": output_bytes, "parameter_bytes": self.parameter_bytes[name],
+                           "peak_memory_bytes": peak_memory, "memory_source": memory_source})
+        record = {"step": self.steps, "window": self.window_steps, "layers": layers}
+        self.reset()
+        return record
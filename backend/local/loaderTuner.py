@@ -0,0 +1,87 @@
+import torch
+import copy
+import os
+import time
+
+# Throughput auto-tuner for modelTrainer's data loading.
+# Candidate settings are benchmarked with a few real training steps each. The search runs
+# in two stages to stay short: intra-op threads and batch size with in-process loading
+# first, then worker count and prefetch depth for the winner. Model and optimizer state
+# are restored afterwards, so tuning does not affect the training run itself.
+
+BATCH_SIZES = [32, 64, 128, 256]
+PREFETCH_FACTORS = [2, 4]
+
+def thread_candidates():
+    cpu_count = os.cpu_count() or 1
+    return sorted({1, max(1, cpu_count // 2), cpu_count})
+
+def worker_candidates():
+    cpu_count = os.cpu_count() or 1
+    return sorted({count for count in (0, 1, 2, 4, 8) if count <= cpu_count})
+
+def measure_throughput(trainer, device, options, num_batches=20, warmup_batches=3):
+    # Returns training samples/sec for one candidate setting
+    torch.set_num_threads(int(options["num_threads"]))
+    model = trainer.model
+    loader = trainer.make_train_loader(options)
+    num_samples = 0
+    start_time = None
+    for batch_idx, (images, targets) in enumerate(loader):
+        if batch_idx == warmup_batches:
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            start_time = time.perf_counter()
+        if batch_idx >= warmup_batches + num_batches:
+            break
+        images = images.to(device, non_blocking=bool(options["pin_memory"]))
+        targets = targets.to(device, non_blocking=bool(options["pin_memory"]))
+        model.optimizer.zero_grad()
+        loss = model.loss_function(model(images), targets)
+        loss.backward()
+        model.optimizer.step()
+        if start_time is not None:
+            num_samples += len(images)
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    del loader # shuts down any worker processes before the next candidate
+    if start_time is None:
+        return 0.0
+    return num_samples / (time.perf_counter() - start_time)
+
+def autotune_loader(trainer, device, fixed_batch_size=False):
+    # Returns a copy of trainer.loader_options with the fastest settings found on this host
+    model = trainer.model
+    model_state = copy.deepcopy(model.state_dict())
+    optimizer_state = copy.deepcopy(model.optimizer.state_dict())
+    best_options = dict(trainer.loader_options)
+    best_options["num_workers"] = 0
+    best_options["pin_memory"] = best_options["pin_memory"] or device.type == "cuda"
+    best_options["num_threads"] = best_options["num_threads"] or torch.get_num_threads()
+    best_rate = 0.0
+    try:
+        batch_sizes = [int(best_options["batch_size"])] if fixed_batch_size else BATCH_SIZES
+        stage_one = [(threads, batch_size) for threads in thread_candidates() for batch_size in batch_sizes]
+        stage_one_options = best_options
+        for threads, batch_size in stage_one:
+            options = dict(best_options, num_threads=threads, batch_size=batch_size)
+            rate = measure_throughput(trainer, device, options)
+            if rate > best_rate:
+                best_rate, stage_one_options = rate, options
+        best_options = stage_one_options
+        for num_workers in worker_candidates():
+            if num_workers == 0:
+                continue
+            for prefetch_factor in PREFETCH_FACTORS:
+                options = dict(best_options, num_workers=num_workers, prefetch_factor=prefetch_factor, persistent_workers=True)
+                rate = measure_throughput(trainer, device, options)
+                if rate > best_rate:
+                    best_rate, best_options = rate, options
+    finally:
+        model.load_state_dict(model_state)
+        model.optimizer.load_state_dict(optimizer_state)
+    torch.set_num_threads(int(best_options["num_threads"]))
+    print(f"Autotune: batch_size={best_options['batch_size']}, num_workers={best_options['num_workers']}, "
+          f"prefetch_factor={best_options['prefetch_factor']}, num_threads={best_options['num_threads']} "
+          f"({best_rate:.0f} samples/sec)")
+    return best_options
@@ -0,0 +1,80 @@
+import json
+import os
+import uuid
+
+# Append-only JSONL stream of checkpoint metrics.
+# Each record is one line: {"progress": epochs, "loss": test loss, "accuracy": test accuracy}.
+# Readers only ever consume complete lines, so they never see a half-written record.
+# Every run (and resume) starts a new stream with reset(), whose first line is a header
+# {"stream": <generation id>}. Incremental readers pass back the generation they read with
+# their offset, and read_metrics restarts them from the top when it changed, even if the new
+# stream has already grown past their offset.
+
+def stream_filename(results_filename):
+    # backend/local/build/local_results.json -> backend/local/build/local_results.jsonl
+    return os.path.splitext(results_filename)[0] + ".jsonl"
+
+class metricsLog():
+    def __init__(self, filename):
+        self.filename = filename
+
+    def reset(self):
+        # Atomically replaces the stream with a new one holding only the header
+        tmp_filename = f"{self.filename}.tmp{os.getpid()}"
+        with open(tmp_filename, "w") as tmp_file:
+            tmp_file.write(json.dumps({"stream": uuid.uuid4().hex}) + "\n")
+        os.replace(tmp_filename, self.filename)
+
+    def append(self, records):
+        if not records:
+            return
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode("utf-8")
+        # O_APPEND with a single write keeps concurrent appends from interleaving
+        fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            written = 0
+            while written < len(data):
+                written += os.write(fd, data[written:])
+        finally:
+            os.close(fd)
+
+def stream_header(metrics_file):
+    # (generation id, length in bytes) of the stream's header line, or (None, 0) without one
+    line = metrics_file.readline()
+    if line.endswith(b"\n"):
+        try:
+            header = json.loads(line)
+        except ValueError:
+            header = None
+        if isinstance(header, dict) and list(header) == ["stream"]:
+            return header["stream"], len(line)
+    return None, 0
+
+def read_metrics(filename, offset=0, generation=None):
+    # Returns the records after byte offset, then the offset and generation to pass on the
+    # next call, and whether the stream was reset since the last call (a new generation, or
+    # truncated below offset), in which case the records are read from its start and replace
+    # everything read before
+    try:
+        with open(filename, "rb") as metrics_file:
+            current, header_end = stream_header(metrics_file)
+            reset = offset > 0 and (current != generation or offset > os.fstat(metrics_file.fileno()).st_size)
+            if offset == 0 or reset:
+                offset = header_end
+            metrics_file.seek(offset)
+            data = metrics_file.read()
+    except FileNotFoundError:
+        return [], offset, generation, False
+    end = data.rfind(b"\n") + 1
+    records = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return records, offset + end, current, reset
+
+def compact_metrics(filename, results_filename):
+    # Rewrites the legacy {"losses": [...], "accuracies": [...]} results file from the stream
+    records = read_metrics(filename)[0]
+    jsondict = {"losses": [(record["progress"], record["loss"]) for record in records],
+                "accuracies": [(record["progress"], record["accuracy"]) for record in records]}
+    tmp_filename = f"{results_filename}.tmp"
+    with open(tmp_filename, "w") as outfile:
+        outfile.write(json.dumps(jsondict, indent=4))
+    os.replace(tmp_filename, results_filename)
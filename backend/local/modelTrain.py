@@ -1,55 +1,414 @@
 import torch
-import json
+import contextlib
+import copy
+import itertools
+import queue
+import threading
+import time
+from metricsLog import metricsLog, stream_filename
+from datasetCache import cachedDataset, make_loader
+from loaderTuner import autotune_loader
+from checkpoint import snapshot_state
+from layerProfiler import profile_filename, synchronize
+from runTelemetry import runTelemetry, telemetry_filename, DEFAULT_WINDOW
+
+# Data loading options, each overridable from the "training" section of the model JSON.
+# num_threads sets torch's intra-op thread count (None keeps torch's default).
+LOADER_DEFAULTS = {
+    "batch_size": 64,
+    "test_batch_size": 1000,
+    "num_workers": 0,
+    "pin_memory": False,
+    "persistent_workers": False,
+    "prefetch_factor": 2,
+    "num_threads": None,
+}
+
+class resumableSampler(torch.utils.data.distributed.DistributedSampler):
+    # DistributedSampler whose set_start_batch skips the indices of an epoch's first batches,
+    # so resuming mid-epoch does not load them (as datasetCache.batchSampler does)
+    def __init__(self, dataset, batch_size, **kwargs):
+        super().__init__(dataset, **kwargs)
+        self.batch_size = batch_size
+        self.start_batch = 0
+
+    def set_start_batch(self, start_batch):
+        self.start_batch = start_batch
+
+    def __iter__(self):
+        return itertools.islice(super().__iter__(), self.start_batch * self.batch_size, None)
+
+def make_data_loader(dataset, batch_size, shuffle, options=LOADER_DEFAULTS, rank=0, world_size=1, seed=0):
+    # Shuffled loaders draw each epoch's order from seed and the epoch number (see set_epoch),
+    # so resumed runs replay the same order. With world_size > 1 each rank loads its own
+    # shard: equal-size random shards for training, so ranks step in lockstep, and
+    # contiguous blocks covering everything for eval.
+    kwargs = {"num_workers": int(options["num_workers"]), "pin_memory": bool(options["pin_memory"])}
+    if kwargs["num_workers"] > 0:
+        # only valid with worker processes
+        kwargs["persistent_workers"] = bool(options["persistent_workers"])
+        kwargs["prefetch_factor"] = int(options["prefetch_factor"])
+    # Cached datasets are sliced a whole batch at a time instead of sample by sample
+    if isinstance(dataset, cachedDataset):
+        return make_loader(dataset, batch_size, shuffle, rank=rank, world_size=world_size, seed=seed, **kwargs)
+    if shuffle:
+        sampler = resumableSampler(dataset, batch_size, num_replicas=world_size, rank=rank, shuffle=True,
+                                   seed=seed, drop_last=world_size > 1)
+        return torch.utils.data.DataLoader(dataset, batch_size=batch_size, sampler=sampler, **kwargs)
+    if world_size > 1:
+        shard = range(len(dataset) * rank // world_size, len(dataset) * (rank + 1) // world_size)
+        dataset = torch.utils.data.Subset(dataset, shard)
+    return torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False, **kwargs)
+
+def stratified_indices(dataset, num_samples, seed=0):
+    # Picks a fixed subsample of dataset whose class proportions match the full dataset
+    targets = getattr(dataset, "targets", None)
+    if targets is None:
+        targets = [dataset[idx][1] for idx in range(len(dataset))]
+    targets = torch.as_tensor(targets)
+    if num_samples >= len(targets):
+        return list(range(len(targets)))
+    generator = torch.Generator().manual_seed(seed)
+    indices = []
+    for label in torch.unique(targets):
+        class_indices = torch.nonzero(targets == label).flatten()
+        class_count = max(1, round(num_samples * len(class_indices) / len(targets)))
+        perm = torch.randperm(len(class_indices), generator=generator)[:class_count]
+        indices += class_indices[perm].tolist()
+    return sorted(indices)
+
+class asyncEvaluator():
+    # Evaluates weight snapshots on a shadow copy of the model in a background thread,
+    # so that checkpoints do not stall the training loop
+    def __init__(self, trainer, device, loader):
+        self.trainer = trainer
+        self.device = device
+        self.loader = loader
+        model = trainer.model
+        # The shadow model shares the datasets with the training model and gets no optimizer
+        memo = {id(model.optimizer): None}
+        for attr in ("train_dataset", "test_dataset"):
+            if hasattr(model, attr):
+                memo[id(getattr(model, attr))] = getattr(model, attr)
+        self.shadow_model = copy.deepcopy(model, memo)
+        # At most two snapshots wait for evaluation; submit blocks beyond that
+        self.pending = queue.Queue(maxsize=2)
+        self.results = []
+        self.error = None
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, progress):
+        with torch.no_grad():
+            snapshot = {name: tensor.detach().clone() for name, tensor in self.trainer.model.state_dict().items()}
+        self.pending.put((progress, snapshot))
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                # close() sentinel
+                self.pending.task_done()
+                return
+            progress, snapshot = item
+            try:
+                self.shadow_model.load_state_dict(snapshot)
+                test_stat = self.trainer.test(self.device, loader=self.loader, model=self.shadow_model)
+                with self.lock:
+                    self.results.append((progress, test_stat["loss"], test_stat["accuracy"]))
+            except Exception as error:
+                with self.lock:
+                    self.error = error
+            finally:
+                self.pending.task_done()
+
+    def collect(self):
+        # Returns the (progress, loss, accuracy) results finished since the last call
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            results, self.results = self.results, []
+        return results
+
+    def wait(self):
+        self.pending.join()
+        return self.collect()
+
+    def close(self):
+        # Stops the worker thread once the queued snapshots are evaluated, releasing its
+        # references to the trainer and the shadow model
+        self.pending.put(None)
+        self.worker.join()
 
 class modelTrainer():
-    def __init__(self, p_model):
+    def __init__(self, p_model, rank=0, world_size=1):
         self.model = p_model
-        self.train_loader = torch.utils.data.DataLoader(p_model.train_dataset, batch_size=64, shuffle=True)
-        self.test_loader = torch.utils.data.DataLoader(p_model.train_dataset, batch_size=1000, shuffle=False)
+        # Optional training options emitted by CodeGenerator from the model JSON
+        self.config = getattr(p_model, "training_config", {})
+        # Data-parallel training: this process is rank out of world_size, and only rank 0
+        # records results. Requires an initialized torch.distributed process group.
+        self.rank = rank
+        self.world_size = world_size
+        # Execution options: channels_last memory format for conv inputs and weights,
+        # "bfloat16" autocast for the forward pass and loss, and torch.compile for the
+        # training and eval forwards (falling back to eager if compilation fails)
+        self.channels_last = bool(self.config.get("channels_last", False))
+        self.autocast = str(self.config.get("precision", "float32")).lower() in ("bfloat16", "bf16")
+        if self.channels_last:
+            p_model.to(memory_format=torch.channels_last)
+        self.train_model = p_model
+        if world_size > 1:
+            self.train_model = torch.nn.parallel.DistributedDataParallel(p_model)
+        self.eager_train_model = self.train_model
+        self.eval_model = p_model
+        self.compiled = bool(self.config.get("compile", False))
+        if self.compiled:
+            self.eval_model = torch.compile(p_model)
+            self.train_model = self.eval_model if world_size == 1 else torch.compile(self.train_model)
+        # Seed of the training shuffle order, saved in checkpoints
+        self.shuffle_seed = int(torch.randint(2**31 - 1, ()))
+        # Optional checkpoint.checkpointWriter, given a snapshot at every checkpoint
+        self.checkpointer = None
+        # Optional early-stopping hook: called with each checkpoint's (progress, loss, accuracy)
+        # results, training stops (and self.stopped is set) once it returns True
+        self.should_stop = None
+        self.stopped = False
+        # Per-layer profiler of models generated with profiling enabled (see layerProfiler.py)
+        self.profiler = getattr(p_model, "profiler", None)
+        if self.profiler is not None:
+            self.profiler.attach(p_model)
+        # Run-level telemetry (see runTelemetry.py); None when disabled
+        self.telemetry = None
+        if self.config.get("telemetry", False):
+            self.telemetry = runTelemetry(int(self.config.get("telemetry_window", DEFAULT_WINDOW)))
+        self.loader_options = {key: self.config.get(key, default) for key, default in LOADER_DEFAULTS.items()}
+        if self.loader_options["num_threads"]:
+            torch.set_num_threads(int(self.loader_options["num_threads"]))
+        # With autotune, the first call to train benchmarks loader settings on this host
+        self.autotune = bool(self.config.get("autotune", False))
+        # "full" evaluates every checkpoint on the whole test set, "sampled" evaluates
+        # mid-epoch checkpoints on a fixed stratified subsample of it
+        self.eval_mode = self.config.get("eval_mode", "full")
+        self.sample_dataset = None
+        if self.eval_mode == "sampled":
+            sample_indices = stratified_indices(p_model.test_dataset, int(self.config.get("eval_samples", 1000)))
+            self.sample_dataset = torch.utils.data.Subset(p_model.test_dataset, sample_indices)
+        self.build_loaders()
+        # With async_eval, mid-epoch checkpoints are evaluated in the background.
+        # Both it and autotune are single-process only: a background collective would race
+        # DDP's gradient all-reduce, and per-rank tuning could pick mismatched batch sizes.
+        # Gradient accumulation: each batch is trained as this many micro-batches, whose
+        # gradients add up to the whole batch's (set by the memory planner or explicitly)
+        self.micro_batches = int(self.config.get("micro_batches", 1))
+        self.async_eval = bool(self.config.get("async_eval", False)) and world_size == 1
+        self.autotune = self.autotune and world_size == 1
+        self.evaluator = None
+
+    def close(self):
+        # Releases per-run background resources; the trainer is not used afterwards
+        if self.evaluator is not None:
+            self.evaluator.close()
+            self.evaluator = None
+
+    def make_train_loader(self, options):
+        return make_data_loader(self.model.train_dataset, int(options["batch_size"]), True, options, self.rank, self.world_size, self.shuffle_seed)
+
+    def build_loaders(self):
+        options = self.loader_options
+        self.train_loader = self.make_train_loader(options)
+        self.test_loader = make_data_loader(self.model.test_dataset, int(options["test_batch_size"]), False, options, self.rank, self.world_size)
+        self.checkpoint_loader = self.test_loader
+        if self.sample_dataset is not None:
+            self.checkpoint_loader = make_data_loader(self.sample_dataset, int(options["test_batch_size"]), False, options, self.rank, self.world_size)
     
-    def test(self, device):
-        test_loss = 0
-        num_correct = 0
-        total_num = len(self.test_loader.dataset)
-        num_batches = len(self.test_loader)
-        preds = []
-        self.model = self.model.to(device)
-        with torch.no_grad():
-            for images, targets in self.test_loader:
-                test_output = self.model(images.to(device))
-                test_loss += self.model.loss_function(test_output, targets.to(device)).item()
-                pred = test_output.data.max(1, keepdim=True)[1]
-                num_correct += pred.eq(targets.to(device).data.view_as(pred)).sum().item()
-                preds += pred
-        test_stat = {"loss": test_loss / num_batches, "accuracy": num_correct / total_num, "prediction": torch.tensor(preds)}
+    def autocast_context(self, device):
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=self.autocast)
+
+    def prepare_images(self, images, device):
+        if self.channels_last and images.dim() == 4:
+            return images.to(device, memory_format=torch.channels_last)
+        return images.to(device)
+
+    def use_eager(self):
+        self.compiled = False
+        self.train_model = self.eager_train_model
+        self.eval_model = self.model
+
+    def run_model(self, images, training=True):
+        # Forward pass of the training or eval model. If the compiled model fails, training
+        # continues eagerly from then on.
+        try:
+            return (self.train_model if training else self.eval_model)(images)
+        except Exception as error:
+            if not self.compiled:
+                raise
+            print(f"torch.compile failed, falling back to eager execution: {error}")
+            self.use_eager()
+            return self.run_model(images, training)
+
+    def test(self, device, loader=None, model=None):
+        # model evaluates a different copy of the model (such as asyncEvaluator's shadow) eagerly
+        if loader is None:
+            loader = self.test_loader
+        shadow = model is not None
+        if model is None:
+            self.model = self.model.to(device)
+            model = self.model
+        num_batches = len(loader)
+        was_training = model.training
+        model.eval()
+        # Accumulate on-device and synchronize once at the end instead of once per batch
+        preds = torch.empty(len(loader.dataset), dtype=torch.long, device=device)
+        test_loss = torch.zeros((), device=device)
+        num_correct = torch.zeros((), dtype=torch.long, device=device)
+        offset = 0
+        telemetry = self.telemetry
+        if telemetry is not None:
+            eval_start = batch_start = time.perf_counter()
+            batch_ms = []
+        with torch.no_grad(), self.autocast_context(device):
+            for images, targets in loader:
+                images = self.prepare_images(images, device)
+                targets = targets.to(device)
+                test_output = model(images) if shadow else self.run_model(images, training=False)
+                test_loss += model.loss_function(test_output, targets)
+                pred = test_output.argmax(dim=1)
+                num_correct += (pred == targets).sum()
+                preds[offset:offset + len(pred)] = pred
+                offset += len(pred)
+                if telemetry is not None:
+                    synchronize()
+                    batch_end = time.perf_counter()
+                    batch_ms.append(1000 * (batch_end - batch_start))
+                    batch_start = batch_end
+        model.train(was_training)
+        totals = [test_loss.item(), num_correct.item(), offset, num_batches]
+        if telemetry is not None:
+            # background: evaluated by asyncEvaluator's thread, off the training loop
+            telemetry.record_eval(time.perf_counter() - eval_start, offset, batch_ms, background=shadow)
+        if self.world_size > 1:
+            # every rank evaluated its own shard; sum the totals across ranks
+            totals = torch.tensor(totals, dtype=torch.float64)
+            torch.distributed.all_reduce(totals)
+            totals = totals.tolist()
+        test_loss, num_correct, total_num, num_batches = totals
+        # prediction only holds this rank's shard when training data-parallel
+        test_stat = {"loss": test_loss / num_batches, "accuracy": num_correct / total_num, "prediction": preds[:offset].cpu()}
         # print(f"Test result: total samples: {total_num}, Avg loss: {test_stat['loss']:.3f}, Accuracy: {100*test_stat['accuracy']:.3f}%")
         return test_stat
     
-    def train(self, device, epoch, train_loss, train_acc, out_filename, divs=10):
+    def record_results(self, results, train_loss, train_acc, out_filename):
+        # Merges (progress, loss, accuracy) checkpoint results and appends them to the
+        # metrics stream next to out_filename
+        if not results or self.rank != 0:
+            return
+        for curr_progress, curr_loss, curr_acc in results:
+            train_loss.append((curr_progress, curr_loss))
+            train_acc.append((curr_progress, curr_acc))
+        records = [{"progress": curr_progress, "loss": curr_loss, "accuracy": curr_acc} for curr_progress, curr_loss, curr_acc in results]
+        metricsLog(stream_filename(out_filename)).append(records)
+
+    def record_profile(self, out_filename):
+        # Appends the profiler's current window to layer_profile.jsonl next to out_filename
+        record = self.profiler.collect()
+        if self.rank == 0:
+            metricsLog(profile_filename(out_filename)).append([record])
+
+    def record_telemetry(self, out_filename, records=None):
+        # Appends the queued eval records and then records (by default, the telemetry's
+        # current window) to telemetry.jsonl next to out_filename
+        records = self.telemetry.drain() + (records if records is not None else [self.telemetry.collect()])
+        if self.rank == 0:
+            metricsLog(telemetry_filename(out_filename)).append(records)
+
+    def save_checkpoint(self, epoch, next_batch, train_loss, train_acc):
+        # Snapshots the training state on this thread; the checkpointer writes it in the background
+        if self.checkpointer is None or self.rank != 0:
+            return
+        # loader_options keeps a resumed run on the batch size next_batch was counted in
+        progress = {"epoch": epoch, "batch": next_batch, "losses": list(train_loss), "accuracies": list(train_acc),
+                    "shuffle_seed": self.shuffle_seed, "loader_options": dict(self.loader_options)}
+        self.checkpointer.save(snapshot_state(self.model, progress))
+
+    def accumulate_gradients(self, images, targets):
+        # Weighting each micro-batch's mean loss by its share of the batch makes the summed
+        # gradients equal the full batch's. DDP all-reduces only on the last backward.
+        chunks = list(zip(images.chunk(self.micro_batches), targets.chunk(self.micro_batches)))
+        for chunk_idx, (chunk_images, chunk_targets) in enumerate(chunks):
+            last_chunk = chunk_idx == len(chunks) - 1
+            with self.eager_train_model.no_sync() if self.world_size > 1 and not last_chunk else contextlib.nullcontext():
+                with self.autocast_context(images.device):
+                    loss = self.model.loss_function(self.run_model(chunk_images), chunk_targets)
+                (loss * (len(chunk_targets) / len(targets))).backward()
+
+    def train(self, device, epoch, train_loss, train_acc, out_filename, divs=10, start_batch=0):
+        # start_batch skips the batches of this epoch that a resumed checkpoint already trained on
         self.model.train()
         self.model = self.model.to(device)
-        last_print_batch_idx = 0
-        for batch_idx, (images, targets) in enumerate(self.train_loader):
-            images = images.to(device)
+        if self.autotune:
+            self.loader_options = autotune_loader(self, device, fixed_batch_size="batch_size" in self.config)
+            self.build_loaders()
+            self.autotune = False
+            if self.profiler is not None:
+                # drop the layer timings of the benchmark steps
+                self.profiler.reset()
+        if self.async_eval and self.evaluator is None:
+            self.evaluator = asyncEvaluator(self, device, self.checkpoint_loader)
+        if hasattr(self.train_loader.sampler, "set_epoch"):
+            # reshuffles identically on every rank
+            self.train_loader.sampler.set_epoch(epoch)
+        # the sampler skips the batches before start_batch without loading them
+        self.train_loader.sampler.set_start_batch(start_batch)
+        last_print_batch_idx = max(0, start_batch - 1)
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.start_epoch(epoch)
+        for batch_idx, (images, targets) in enumerate(self.train_loader, start=start_batch):
+            images = self.prepare_images(images, device)
             targets = targets.to(device)
+            if telemetry is not None:
+                telemetry.batch_ready()
             self.model.optimizer.zero_grad()
-            train_output = self.model(images)
-            loss = self.model.loss_function(train_output, targets)
-            loss.backward()
+            if self.micro_batches > 1:
+                self.accumulate_gradients(images, targets)
+            else:
+                with self.autocast_context(device):
+                    train_output = self.run_model(images)
+                    loss = self.model.loss_function(train_output, targets)
+                loss.backward()
             self.model.optimizer.step()
+            if self.profiler is not None and self.profiler.step():
+                self.record_profile(out_filename)
+            if telemetry is not None and telemetry.step_done(len(targets)):
+                self.record_telemetry(out_filename)
             # train_loss.append(loss.item())
 
             if (batch_idx - last_print_batch_idx > (len(self.train_loader) / divs)):
                 last_print_batch_idx = batch_idx
-                curr_progress = epoch + (batch_idx*len(images)) / (len(self.train_loader.dataset))
-                test_stat = self.test(device=device)
-                curr_loss = test_stat["loss"]
-                curr_acc = test_stat["accuracy"]
-                train_loss.append((curr_progress, curr_loss))
-                train_acc.append((curr_progress, curr_acc))
-                with open(out_filename, "w+") as outfile:
-                    jsondict = {"losses": train_loss, "accuracies": train_acc}
-                    outfile.write(json.dumps(jsondict, indent=4))
+                batch_size = int(self.loader_options["batch_size"])
+                curr_progress = epoch + (batch_idx*batch_size*self.world_size) / (len(self.model.train_dataset))
+                if telemetry is not None:
+                    eval_start = time.perf_counter()
+                if self.evaluator is not None:
+                    # Snapshot now, merge whichever earlier snapshots have finished
+                    self.evaluator.submit(curr_progress)
+                    results = self.evaluator.collect()
+                else:
+                    test_stat = self.test(device=device, loader=self.checkpoint_loader)
+                    results = [(curr_progress, test_stat["loss"], test_stat["accuracy"])]
+                self.record_results(results, train_loss, train_acc, out_filename)
+                self.save_checkpoint(epoch, batch_idx + 1, train_loss, train_acc)
+                if telemetry is not None:
+                    # Checkpoint overhead on the training loop; with async_eval the evaluation
+                    # itself runs in the background and only the snapshot is counted
+                    telemetry.eval_done(time.perf_counter() - eval_start)
+                if self.should_stop is not None and self.should_stop(results):
+                    self.stopped = True
+                    break
                 # print(f'Current Epoch: Progress: [{batch_idx*len(images)}/{len(self.train_loader.dataset)}], Current Loss: {loss.item():.3f}')
 
-        return train_loss, train_acc
\ No newline at end of file
+        if self.evaluator is not None:
+            # Drain outstanding checkpoints so results stay ordered by progress
+            self.record_results(self.evaluator.wait(), train_loss, train_acc, out_filename)
+        return train_loss, train_acc
@@ -0,0 +1,194 @@
+import torch
+from modelTrain import modelTrainer
+from checkpoint import load_checkpoint
+from export_main import inference_model, benchmark, export_dir
+import run_main
+
+import os
+import argparse
+import copy
+import io
+import json
+
+# Post-training int8 quantization of the trained PrimaryModel.
+# The forward pass is traced with torch.fx and split into regions: runs of conv2d layers and
+# the activations and max pools between them that read only the previous op. Each region is
+# quantized statically with a single quantize/dequantize stub pair around it, and its
+# activation ranges are calibrated on training batches, so tensors stay int8 from the first
+# conv of a region to its last op. Linear layers are quantized dynamically (int8 weights,
+# activations quantized per batch). Models that cannot be traced (such as ones with
+# checkpointed segments or the layer profiler) fall back to dynamic quantization only.
+# The quantized model is evaluated with modelTrainer.test and compared with the float model
+# on accuracy, size and CPU latency.
+
+report_filename = os.path.join(export_dir, "quantization_report.json")
+quantized_filename = os.path.join(export_dir, "PrimaryModel_int8.pt")
+
+# Functions and tensor methods that accept quantized tensors and may continue a region.
+# The in-place sigmoid_ and tanh_ have no quantized kernels, so inside a region they are
+# replaced with their out-of-place versions.
+REGION_FUNCTIONS = (torch.relu, torch.relu_, torch.nn.functional.relu, torch.nn.functional.relu_,
+                    torch.sigmoid, torch.tanh, torch.nn.functional.max_pool2d, torch.max_pool2d)
+REGION_METHODS = ("relu", "relu_", "sigmoid", "tanh")
+OUT_OF_PLACE = {torch.sigmoid_: torch.sigmoid, torch.tanh_: torch.tanh, "sigmoid_": "sigmoid", "tanh_": "tanh"}
+
+def select_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise Exception("This torch build has no quantized CPU engine")
+
+def is_conv(node, modules):
+    return node.op == "call_module" and isinstance(modules.get(node.target), torch.nn.Conv2d)
+
+def continues_region(node, prev, modules):
+    # node may join prev's region if it is a quantizable op and prev's only reader
+    if len(prev.users) != 1 or not node.args or node.args[0] is not prev:
+        return False
+    if any(isinstance(arg, torch.fx.Node) for arg in list(node.args[1:]) + list(node.kwargs.values())):
+        return False
+    if node.op == "call_function":
+        return OUT_OF_PLACE.get(node.target, node.target) in REGION_FUNCTIONS
+    if node.op == "call_method":
+        return OUT_OF_PLACE.get(node.target, node.target) in REGION_METHODS
+    return is_conv(node, modules)
+
+def quant_regions(graph_module):
+    # Lists of graph nodes, each a region that starts with a conv2d layer
+    modules = dict(graph_module.named_modules())
+    regions = []
+    region = None
+    for node in graph_module.graph.nodes:
+        if region is not None and continues_region(node, region[-1], modules):
+            region.append(node)
+        elif is_conv(node, modules):
+            region = [node]
+            regions.append(region)
+        else:
+            region = None
+    return regions
+
+def insert_stubs(graph_module, regions, qconfig):
+    # Wraps every region in one QuantStub/DeQuantStub pair. The dequantized output is made
+    # contiguous: quantized convolutions produce channels_last tensors, which the view calls
+    # of generated models cannot reshape.
+    graph = graph_module.graph
+    modules = dict(graph_module.named_modules())
+    for region_idx, region in enumerate(regions):
+        start, end = region[0], region[-1]
+        quant_name, dequant_name = f"quant{region_idx}", f"dequant{region_idx}"
+        graph_module.add_module(quant_name, torch.ao.quantization.QuantStub(qconfig))
+        graph_module.add_module(dequant_name, torch.ao.quantization.DeQuantStub(qconfig))
+        for node in region:
+            if is_conv(node, modules):
+                modules[node.target].qconfig = qconfig
+            else:
+                node.target = OUT_OF_PLACE.get(node.target, node.target)
+        with graph.inserting_before(start):
+            quant = graph.call_module(quant_name, (start.args[0],))
+        start.replace_input_with(start.args[0], quant)
+        with graph.inserting_after(end):
+            dequant = graph.call_module(dequant_name, (end,))
+        with graph.inserting_after(dequant):
+            contiguous = graph.call_method("contiguous", (dequant,))
+        end.replace_all_uses_with(contiguous, delete_user_cb=lambda user: user is not dequant)
+    graph.lint()
+    graph_module.recompile()
+
+def quantize_model(model, calibration_loader, engine, calibration_batches=32, static=True):
+    # Returns (quantized copy of model sharing its datasets and loss function, number of
+    # statically quantized regions). 0 regions means dynamic quantization only.
+    memo = {id(model.optimizer): None}
+    for attr in ("train_dataset", "test_dataset"):
+        memo[id(getattr(model, attr))] = getattr(model, attr)
+    quantized = copy.deepcopy(model, memo).eval()
+    graph_module = None
+    if static:
+        try:
+            graph_module = torch.fx.symbolic_trace(quantized)
+        except (torch.fx.proxy.TraceError, TypeError, RuntimeError) as error:
+            print(f"Could not trace the model ({error}); quantizing linear layers dynamically only")
+    regions = quant_regions(graph_module) if graph_module is not None else []
+    if regions:
+        insert_stubs(graph_module, regions, torch.ao.quantization.get_default_qconfig(engine))
+        for attr in ("train_dataset", "test_dataset", "loss_function"):
+            setattr(graph_module, attr, getattr(quantized, attr))
+        quantized = graph_module
+        torch.ao.quantization.prepare(quantized, inplace=True)
+        with torch.no_grad():
+            for batch_idx, (images, _) in enumerate(calibration_loader):
+                if batch_idx >= calibration_batches:
+                    break
+                quantized(images)
+        torch.ao.quantization.convert(quantized, inplace=True)
+    quantized = torch.ao.quantization.quantize_dynamic(quantized, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return quantized, len(regions)
+
+def state_size(model):
+    # Serialized size of the model weights in bytes
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+def speedups(float_latency, int8_latency):
+    # float32 over int8 p50 latency for every benchmarked batch size
+    return [float_entry["p50_ms"] / int8_entry["p50_ms"] for float_entry, int8_entry in zip(float_latency, int8_latency)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantize the trained PrimaryModel to int8 and compare it with the float model")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--calibration-batches", type=int, default=32)
+    args = parser.parse_args()
+    os.makedirs(export_dir, exist_ok=True)
+
+    device = torch.device("cpu")
+    model = run_main.primary_model_class()()
+    model.load_state_dict(load_checkpoint(run_main.model_filename)["model"])
+    trainer = modelTrainer(model)
+    engine = select_engine()
+    sample_shape = tuple(model.test_dataset[0][0].shape)
+    threads = [torch.get_num_threads()]
+    float_model = inference_model(model)
+    float_latency = benchmark(float_model, sample_shape, args.batch_sizes, threads, args.iterations)
+
+    quantized, num_regions = quantize_model(model, trainer.train_loader, engine, args.calibration_batches)
+    int8_model = inference_model(quantized)
+    int8_latency = benchmark(int8_model, sample_shape, args.batch_sizes, threads, args.iterations)
+    if num_regions and max(speedups(float_latency, int8_latency)) < 1:
+        # Small convolutions can run slower in int8 than the quantize/dequantize steps save;
+        # keep them in float when dynamic quantization alone is faster
+        dynamic, _ = quantize_model(model, trainer.train_loader, engine, static=False)
+        dynamic_model = inference_model(dynamic)
+        dynamic_latency = benchmark(dynamic_model, sample_shape, args.batch_sizes, threads, args.iterations)
+        if sum(speedups(float_latency, dynamic_latency)) > sum(speedups(float_latency, int8_latency)):
+            print(f"Statically quantized convolutions ({num_regions} regions) were slower than float32; "
+                  f"falling back to dynamic quantization of linear layers only")
+            quantized, num_regions, int8_model, int8_latency = dynamic, 0, dynamic_model, dynamic_latency
+
+    float_test = trainer.test(device)
+    quantized_test = trainer.test(device, model=quantized)
+    report = {"engine": engine, "static_regions": num_regions, "mode": "static" if num_regions else "dynamic", "models": {}}
+    for label, test_stat, inference, latency in (("float32", float_test, float_model, float_latency),
+                                                 ("int8", quantized_test, int8_model, int8_latency)):
+        report["models"][label] = {"accuracy": test_stat["accuracy"], "loss": test_stat["loss"],
+                                   "size_bytes": state_size(inference), "latency": latency}
+    with torch.no_grad():
+        torch.jit.trace(int8_model, torch.rand((1,) + sample_shape)).save(quantized_filename)
+    with open(report_filename, "w") as report_file:
+        report_file.write(json.dumps(report, indent=4))
+
+    float_report, int8_report = report["models"]["float32"], report["models"]["int8"]
+    print(f"Engine: {engine}")
+    print(f"Quantization: {num_regions} statically quantized conv regions" if num_regions else "Quantization: dynamic (linear layers only)")
+    print(f"Accuracy: {100*float_report['accuracy']:.2f}% float32, {100*int8_report['accuracy']:.2f}% int8")
+    print(f"Size: {float_report['size_bytes']} bytes float32, {int8_report['size_bytes']} bytes int8 "
+          f"({float_report['size_bytes'] / int8_report['size_bytes']:.2f}x smaller)")
+    for float_entry, int8_entry in zip(float_latency, int8_latency):
+        print(f"Batch {float_entry['batch_size']:>4}: p50 {float_entry['p50_ms']:.3f} ms float32, {int8_entry['p50_ms']:.3f} ms int8 "
+              f"({float_entry['p50_ms'] / int8_entry['p50_ms']:.2f}x faster)")
+    if min(speedups(float_latency, int8_latency)) < 1:
+        print("Warning: the int8 model is slower than float32 for some batch sizes; keep the float model for those")
+    print(f"Quantized TorchScript model written to {quantized_filename}")
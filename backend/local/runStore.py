@@ -0,0 +1,198 @@
+import torch
+from checkpoint import load_checkpoint
+
+import sys
+import os
+import hashlib
+import json
+import shutil
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(SCRIPT_DIR), "antlr"))
+
+from modelGraph import layer_inputs
+
+# Local store of trained runs.
+# A finished single-process run is saved under a hash of its normalized model JSON (layers,
+# dataset, loss, optimizer, result-affecting training options), epoch count and seed, as its
+# final checkpoint (<key>.pt) plus a metadata file (<key>.json) holding one structural
+# signature per layer. An identical request restores the checkpoint and its metrics instead
+# of training. Otherwise the new model is warm-started from the stored run sharing the
+# longest prefix of identical layers: those layers' weights are loaded (and by default
+# frozen, so backward stops at the first changed layer) and only the rest is trained.
+# Warm-started runs are not stored, so a stored run depends only on what its key hashes.
+# Neither are autotuned runs without an explicit batch_size: the batch size autotune picks
+# depends on the host's measured throughput, which the key cannot capture. The seed is
+# training.seed, or DEFAULT_SEED, so by default every run of the same model initializes (and
+# is stored) identically.
+# Entries are evicted least recently used first once the store exceeds max_bytes.
+
+STORE_DIR = "backend/local/build/run_store"
+MAX_BYTES = 1024**3
+DEFAULT_SEED = 0
+
+# Training options that change how a run executes but not the metrics and weights it produces
+# (autotune only tunes loader settings once batch_size is fixed, see storable)
+NON_RESULT_OPTIONS = ("test_batch_size", "num_workers", "pin_memory", "persistent_workers", "prefetch_factor",
+                      "num_threads", "async_eval", "profile", "profile_window", "compile", "telemetry",
+                      "telemetry_window", "autotune")
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+def dataset_signature(packet):
+    # The cache flag only changes how the same samples are loaded
+    return {"type": packet["dataset"]["type"], "shape": packet["dataset"]["shape"]}
+
+def storable(packet):
+    # Whether a run of packet may be reused from and saved to the store
+    training = packet.get("training", {})
+    return not (training.get("autotune", False) and "batch_size" not in training)
+
+def run_seed(packet):
+    return int(packet.get("training", {}).get("seed", DEFAULT_SEED))
+
+def run_key(packet, epochs, seed):
+    training = {key: value for key, value in packet.get("training", {}).items() if key not in NON_RESULT_OPTIONS}
+    dataset = {key: value for key, value in packet["dataset"].items() if key != "cache"}
+    keyed = {"model": packet["model"], "dataset": dataset, "loss_function": packet["loss_function"],
+             "optimizer": packet["optimizer"], "training": training, "epochs": epochs, "seed": seed}
+    return hashlib.sha256(canonical(keyed).encode("utf-8")).hexdigest()
+
+def layer_signatures(packet):
+    # The dataset, then one entry per layer: its fields with the input references resolved
+    # to layer positions, so renaming layer ids does not break a match
+    signatures = [canonical(dataset_signature(packet))]
+    for layer, inputs in zip(packet["model"]["layers"], layer_inputs(packet)):
+        fields = {key: value for key, value in layer.items() if key not in ("id", "inputs")}
+        fields["inputs"] = inputs
+        signatures.append(canonical(fields))
+    return signatures
+
+def matching_prefix(signatures, stored, inputs):
+    # Number of leading layers that are identical and read only from within the prefix
+    if not stored or stored[0] != signatures[0]:
+        return 0
+    length = 0
+    while length + 1 < min(len(signatures), len(stored)) and signatures[length + 1] == stored[length + 1]:
+        length += 1
+    reads = [0]
+    for srcs in inputs[:length]:
+        reads.append(max(reads[-1], max(srcs)))
+    while length > 0 and reads[length] > length:
+        length -= 1
+    return length
+
+def layer_parameters(model, num_layers):
+    # Parameters of the generated self.layer1 ... self.layer<num_layers> attributes
+    prefix = {f"layer{layer_idx}" for layer_idx in range(1, num_layers + 1)}
+    return [(name, param) for name, param in model.named_parameters() if name.split(".")[0] in prefix]
+
+class runStore():
+    def __init__(self, store_dir=STORE_DIR, max_bytes=MAX_BYTES):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+
+    def paths(self, key):
+        return os.path.join(self.store_dir, f"{key}.pt"), os.path.join(self.store_dir, f"{key}.json")
+
+    def touch(self, key):
+        # mtimes order the entries for eviction
+        for path in self.paths(key):
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+    def get(self, key):
+        # Returns the metadata of a stored run, or None
+        checkpoint_path, meta_path = self.paths(key)
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(checkpoint_path):
+            return None
+        self.touch(key)
+        return meta
+
+    def restore(self, key, checkpoint_filename):
+        # Copies the stored checkpoint to checkpoint_filename and returns its progress dict
+        tmp_filename = f"{checkpoint_filename}.tmp"
+        shutil.copyfile(self.paths(key)[0], tmp_filename)
+        os.replace(tmp_filename, checkpoint_filename)
+        return load_checkpoint(checkpoint_filename)["progress"]
+
+    def put(self, key, checkpoint_filename, signatures):
+        os.makedirs(self.store_dir, exist_ok=True)
+        checkpoint_path, meta_path = self.paths(key)
+        shutil.copyfile(checkpoint_filename, f"{checkpoint_path}.tmp")
+        os.replace(f"{checkpoint_path}.tmp", checkpoint_path)
+        meta = {"key": key, "signatures": signatures, "bytes": os.path.getsize(checkpoint_path)}
+        with open(f"{meta_path}.tmp", "w") as meta_file:
+            meta_file.write(json.dumps(meta))
+        os.replace(f"{meta_path}.tmp", meta_path)
+        self.evict(keep=key)
+
+    def entries(self):
+        # (mtime, key, metadata) of every stored run, least recently used first
+        try:
+            filenames = os.listdir(self.store_dir)
+        except OSError:
+            return []
+        entries = []
+        for filename in filenames:
+            if not filename.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.store_dir, filename)
+            try:
+                with open(meta_path, "r") as meta_file:
+                    meta = json.load(meta_file)
+                entries.append((os.path.getmtime(meta_path), meta["key"], meta))
+            except (OSError, ValueError, KeyError):
+                continue
+        entries.sort(key=lambda entry: entry[0])
+        return entries
+
+    def evict(self, keep=None):
+        entries = self.entries()
+        total = sum(meta["bytes"] for _, _, meta in entries)
+        for _, key, meta in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            for path in self.paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= meta["bytes"]
+
+    def warm_start(self, model, packet, freeze=True):
+        # Loads the longest matching layer prefix of any stored run into model. Returns the
+        # number of layers loaded (0 if nothing matched) and whether they were frozen.
+        signatures = layer_signatures(packet)
+        inputs = layer_inputs(packet)
+        best_length, best_key = 0, None
+        for _, key, meta in self.entries():
+            length = matching_prefix(signatures, meta["signatures"], inputs)
+            if length >= best_length and length > 0:
+                best_length, best_key = length, key
+        if best_key is None:
+            return 0, False
+        stored_state = load_checkpoint(self.paths(best_key)[0])["model"]
+        params = layer_parameters(model, best_length)
+        if not params or any(name not in stored_state or stored_state[name].shape != param.shape for name, param in params):
+            return 0, False
+        with torch.no_grad():
+            for name, param in params:
+                param.copy_(stored_state[name])
+        self.touch(best_key)
+        # Freezing every parameter would leave nothing to train, so the weights are then only initialized
+        frozen = freeze and len(params) < len(list(model.parameters()))
+        if frozen:
+            for _, param in params:
+                param.requires_grad_(False)
+        return best_length, frozen
@@ -0,0 +1,176 @@
+import torch
+import bisect
+import os
+import sys
+import threading
+import time
+from layerProfiler import synchronize
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+# Run-level performance telemetry, enabled with "training": {"telemetry": true} or
+# run_main.py --telemetry.
+# modelTrainer splits every training step into data wait (fetching the batch from the loader
+# and copying it to the device) and compute (forward, backward and optimizer step), and times
+# the checkpoint evaluations that run on the training thread. Every telemetry_window steps it
+# appends a "train" record to telemetry.jsonl next to the metrics stream: step latency
+# percentiles and histogram, samples/sec, the data wait / compute / eval split of the window's
+# wall time, and process RSS and thread counts. modelTrainer.test queues an "eval" record per
+# evaluation, written out ahead of the next record, and run_main adds an "epoch" record per
+# epoch and a final "run" summary.
+# Disabled, modelTrainer holds None instead and only checks for it.
+
+# Upper bounds of the step latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+DEFAULT_WINDOW = 100
+
+def telemetry_filename(out_filename):
+    return os.path.join(os.path.dirname(out_filename), "telemetry.jsonl")
+
+def percentiles(values_ms):
+    # Nearest-rank p50/p90/p99, mean and max of a list of milliseconds
+    if not values_ms:
+        return None
+    ordered = sorted(values_ms)
+    rank = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {"p50": rank(0.5), "p90": rank(0.9), "p99": rank(0.99), "mean": sum(ordered) / len(ordered), "max": ordered[-1]}
+
+def histogram(values_ms):
+    counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for value in values_ms:
+        counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value)] += 1
+    return {"bounds_ms": list(LATENCY_BUCKETS_MS), "counts": counts}
+
+def status_field(name):
+    # A field of /proc/self/status (Linux only), or None
+    try:
+        with open("/proc/self/status", "r") as status_file:
+            for line in status_file:
+                if line.startswith(name + ":"):
+                    return line.split()[1]
+    except OSError:
+        pass
+    return None
+
+def process_stats():
+    # Resident memory and thread usage of this process
+    rss_kb = status_field("VmRSS")
+    os_threads = status_field("Threads")
+    stats = {"rss_bytes": int(rss_kb) * 1024 if rss_kb is not None else None,
+             "peak_rss_bytes": None,
+             "torch_threads": torch.get_num_threads(),
+             "interop_threads": torch.get_num_interop_threads(),
+             "python_threads": threading.active_count(),
+             "os_threads": int(os_threads) if os_threads is not None else None}
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        stats["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        stats["cuda_allocated_bytes"] = torch.cuda.memory_allocated()
+        stats["cuda_peak_bytes"] = torch.cuda.max_memory_allocated()
+    return stats
+
+def new_totals():
+    return {"steps": 0, "samples": 0, "data_wait_seconds": 0.0, "compute_seconds": 0.0, "eval_seconds": 0.0}
+
+class runTelemetry():
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.steps = 0
+        self.epoch = 0
+        self.mark = time.perf_counter()
+        self.data_wait = 0.0
+        self.pending = []
+        self.lock = threading.Lock()
+        # totals of the whole run and of the current epoch, for the "run" and "epoch" records
+        self.run_totals = new_totals()
+        self.epoch_totals = new_totals()
+        self.reset()
+
+    def reset(self):
+        self.window_start = time.perf_counter()
+        self.window_samples = 0
+        self.step_ms = []
+        self.data_wait_ms = []
+        self.compute_ms = []
+        self.eval_seconds = 0.0
+
+    def add(self, **amounts):
+        for totals in (self.run_totals, self.epoch_totals):
+            for key, amount in amounts.items():
+                totals[key] += amount
+
+    def start_epoch(self, epoch):
+        self.epoch = epoch
+        self.epoch_totals = new_totals()
+        self.mark = time.perf_counter()
+
+    def batch_ready(self):
+        # Called once the batch is on the device: the time since the last step is data wait
+        now = time.perf_counter()
+        self.data_wait = now - self.mark
+        self.mark = now
+
+    def step_done(self, samples):
+        # Called after the optimizer step; returns True when a full window is ready to collect
+        synchronize()
+        now = time.perf_counter()
+        compute = now - self.mark
+        self.mark = now
+        self.steps += 1
+        self.window_samples += samples
+        self.step_ms.append(1000 * (self.data_wait + compute))
+        self.data_wait_ms.append(1000 * self.data_wait)
+        self.compute_ms.append(1000 * compute)
+        self.add(steps=1, samples=samples, data_wait_seconds=self.data_wait, compute_seconds=compute)
+        return len(self.step_ms) >= self.window
+
+    def eval_done(self, seconds):
+        # Foreground evaluation time within the training loop; not counted as data wait
+        self.eval_seconds += seconds
+        self.add(eval_seconds=seconds)
+        self.mark = time.perf_counter()
+
+    def collect(self):
+        # Returns the "train" record of the current window and starts a new one
+        seconds = time.perf_counter() - self.window_start
+        data_wait = sum(self.data_wait_ms) / 1000
+        compute = sum(self.compute_ms) / 1000
+        record = {"type": "train", "epoch": self.epoch, "step": self.steps, "steps": len(self.step_ms),
+                  "samples": self.window_samples, "seconds": seconds,
+                  "samples_per_sec": self.window_samples / seconds if seconds > 0 else None,
+                  "step_ms": percentiles(self.step_ms), "data_wait_ms": percentiles(self.data_wait_ms),
+                  "compute_ms": percentiles(self.compute_ms), "histogram": histogram(self.step_ms),
+                  "data_wait_fraction": data_wait / seconds if seconds > 0 else None,
+                  "compute_fraction": compute / seconds if seconds > 0 else None,
+                  "eval_fraction": self.eval_seconds / seconds if seconds > 0 else None,
+                  "process": process_stats()}
+        self.reset()
+        return record
+
+    def record_eval(self, seconds, samples, batch_ms, background):
+        # Queues an "eval" record; may be called from asyncEvaluator's thread
+        record = {"type": "eval", "epoch": self.epoch, "step": self.steps, "samples": samples, "seconds": seconds,
+                  "samples_per_sec": samples / seconds if seconds > 0 else None,
+                  "batch_ms": percentiles(batch_ms), "background": background}
+        with self.lock:
+            self.pending.append(record)
+
+    def drain(self):
+        # Returns the "eval" records queued since the last call
+        with self.lock:
+            records, self.pending = self.pending, []
+        return records
+
+    def summary(self, record_type, seconds, **fields):
+        # "epoch" or "run" record covering seconds of wall time
+        totals = self.run_totals if record_type == "run" else self.epoch_totals
+        record = dict(totals, type=record_type, epoch=self.epoch, seconds=seconds,
+                      samples_per_sec=totals["samples"] / seconds if seconds > 0 else None,
+                      process=process_stats())
+        record.update(fields)
+        return record
@@ -1,34 +1,223 @@
 import torch, torchvision
 from modelTrain import modelTrainer
+from metricsLog import metricsLog, stream_filename, compact_metrics
+from checkpoint import checkpointWriter, load_checkpoint, restore_model
+from ensembleTrain import ensembleTrainer, member_filename
+from layerProfiler import profile_filename
+from runStore import runStore, run_key, run_seed, storable, layer_signatures
+from runTelemetry import runTelemetry, telemetry_filename
 
 import sys
 import os
+import argparse
 import json
+import socket
+import time
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 #print(SCRIPT_DIR)
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
-from build.PrimaryModel import PrimaryModel
+out_filename = "backend/local/build/local_results.json"
+# Checkpoint of the model, optimizer and training progress (a torch archive, see checkpoint.py)
+model_filename = "backend/local/build/model_params.txt"
+ensemble_filename = "backend/local/build/ensemble_results.json"
+# Normalized model JSON of the current build/PrimaryModel.py, written by compile_main.py
+packet_filename = "backend/local/build/PrimaryModel.json"
+
+def primary_model_class():
+    # Imported on first use, so other tools can import this module before build/PrimaryModel.py exists
+    from build.PrimaryModel import PrimaryModel
+    return PrimaryModel
+
+def load_packet():
+    try:
+        with open(packet_filename, "r") as packet_file:
+            return json.load(packet_file)
+    except (OSError, ValueError):
+        return None
+
+def restore_stored_run(store, key):
+    # Publishes a stored run's checkpoint and metrics as if it had just been trained
+    progress = store.restore(key, model_filename)
+    metrics_log = metricsLog(stream_filename(out_filename))
+    metrics_log.reset()
+    metrics_log.append([{"progress": curr_progress, "loss": curr_loss, "accuracy": curr_acc}
+                        for (curr_progress, curr_loss), (_, curr_acc) in zip(progress["losses"], progress["accuracies"])])
+    compact_metrics(stream_filename(out_filename), out_filename)
+
+def run_training(epochs, device, rank=0, world_size=1, resume=False, model_class=None, should_stop=None, packet=None, store=None,
+                 telemetry=False):
+    # model_class defaults to build/PrimaryModel.py; should_stop is modelTrainer's early-stopping hook.
+    # telemetry records runTelemetry.py's stream even if the model JSON does not enable it.
+    # With the model's normalized JSON (packet) and a runStore, a single-process run is seeded,
+    # reused if stored, warm-started from the longest stored layer prefix otherwise, and stored.
+    # Warm-started runs are not stored: their weights depend on what the store held, not only
+    # on the inputs of run_key. Autotuned runs without a fixed batch size bypass the store.
+    use_store = store is not None and packet is not None and world_size == 1 and not resume and storable(packet)
+    if use_store:
+        seed = run_seed(packet)
+        key = run_key(packet, epochs, seed)
+        if store.get(key) is not None:
+            restore_stored_run(store, key)
+            print(f"Reused stored run {key[:12]}: identical model, data, optimizer and seed")
+            return
+        torch.manual_seed(seed)
+    curr_model = (model_class or primary_model_class())()
+    warm_started = False
+    if use_store:
+        warm_start = packet.get("training", {}).get("warm_start", "freeze")
+        if warm_start != "off":
+            num_layers, frozen = store.warm_start(curr_model, packet, freeze=warm_start == "freeze")
+            warm_started = num_layers > 0
+            if num_layers:
+                print(f"Warm-started layers 1-{num_layers} from a stored run{' (frozen)' if frozen else ''}")
+    trainer = modelTrainer(curr_model, rank, world_size)
+    trainer.should_stop = should_stop
+    if telemetry and trainer.telemetry is None:
+        trainer.telemetry = runTelemetry()
+    try:
+        loss = []
+        accs = []
+        start_epoch = 0
+        start_batch = 0
+        if resume:
+            progress = restore_model(curr_model, load_checkpoint(model_filename))
+            loss = [tuple(entry) for entry in progress["losses"]]
+            accs = [tuple(entry) for entry in progress["accuracies"]]
+            start_epoch = progress["epoch"]
+            start_batch = progress["batch"]
+            trainer.shuffle_seed = progress["shuffle_seed"]
+            # Reuse the checkpointed loader options (batch counts depend on batch_size) instead
+            # of autotuning again, which could pick a different batch size
+            trainer.autotune = False
+            if "loader_options" in progress:
+                trainer.loader_options = dict(progress["loader_options"])
+                if trainer.loader_options["num_threads"]:
+                    torch.set_num_threads(int(trainer.loader_options["num_threads"]))
+            trainer.build_loaders()
+            print(f"Resuming from epoch {start_epoch}, batch {start_batch}")
+        if rank == 0:
+            trainer.checkpointer = checkpointWriter(model_filename)
+            # restart the metrics stream from the restored history
+            metrics_log = metricsLog(stream_filename(out_filename))
+            metrics_log.reset()
+            metrics_log.append([{"progress": curr_progress, "loss": curr_loss, "accuracy": curr_acc}
+                                for (curr_progress, curr_loss), (_, curr_acc) in zip(loss, accs)])
+            if trainer.profiler is not None:
+                metricsLog(profile_filename(out_filename)).reset()
+            if trainer.telemetry is not None:
+                metricsLog(telemetry_filename(out_filename)).reset()
+        run_start = time.perf_counter()
+        for epoch in range(start_epoch, epochs):
+            epoch_start = time.perf_counter()
+            train_loss, train_acc = trainer.train(device, epoch, loss, accs, out_filename, start_batch=start_batch)
+            start_batch = 0
+            if trainer.stopped:
+                break
+            eval_start = time.perf_counter()
+            test_result = trainer.test(device)
+            if trainer.telemetry is not None:
+                trainer.telemetry.eval_done(time.perf_counter() - eval_start)
+                trainer.record_telemetry(out_filename, [trainer.telemetry.summary("epoch", time.perf_counter() - epoch_start)])
+            loss = train_loss
+            accs = train_acc
+            trainer.record_results([(float(epoch+1), test_result["loss"], test_result["accuracy"])], loss, accs, out_filename)
+            trainer.save_checkpoint(epoch + 1, 0, loss, accs)
+            if rank == 0:
+                # Compact the metrics stream into the legacy results file once per epoch
+                compact_metrics(stream_filename(out_filename), out_filename)
+        if trainer.telemetry is not None:
+            # the last partial window, then the summary of the whole run
+            records = [trainer.telemetry.collect()] if trainer.telemetry.step_ms else []
+            run_record = trainer.telemetry.summary("run", time.perf_counter() - run_start, epochs=epochs, world_size=world_size)
+            trainer.record_telemetry(out_filename, records + [run_record])
+            if rank == 0:
+                print(f"Telemetry: {run_record['samples_per_sec'] or 0:.1f} samples/sec, "
+                      f"{run_record['data_wait_seconds']:.1f}s data wait, {run_record['compute_seconds']:.1f}s compute, "
+                      f"{run_record['eval_seconds']:.1f}s eval over {run_record['seconds']:.1f}s")
+        if trainer.checkpointer is not None:
+            trainer.checkpointer.wait()
+            if use_store and not trainer.stopped and not warm_started:
+                store.put(key, model_filename, layer_signatures(packet))
+    finally:
+        trainer.close()
+
+def run_ensemble(epochs, device, members, learning_rates=None):
+    # Trains members copies of PrimaryModel in lockstep; each member's metrics go to
+    # local_results.member<k>.json(l) and the summary to ensemble_results.json
+    trainer = ensembleTrainer(primary_model_class()(), members, learning_rates, int(torch.randint(2**31 - 1, ())), device)
+    for member in range(members):
+        metricsLog(stream_filename(member_filename(out_filename, member))).reset()
+    for epoch in range(epochs):
+        trainer.train(device, epoch, out_filename)
+        trainer.record_member_results(float(epoch+1), trainer.test(device), out_filename)
+        for member in range(members):
+            compact_metrics(stream_filename(member_filename(out_filename, member)), member_filename(out_filename, member))
+    summary = [{"member": member, "seed": trainer.seeds[member], "learning_rate": trainer.learning_rates[member],
+                "loss": trainer.train_loss[member][-1][1], "accuracy": trainer.train_acc[member][-1][1]}
+               for member in range(members)]
+    with open(ensemble_filename, "w") as summary_file:
+        summary_file.write(json.dumps(summary, indent=4))
+    for entry in summary:
+        print(f"Member {entry['member']} (lr={entry['learning_rate']}): loss {entry['loss']:.4f}, accuracy {entry['accuracy']:.4f}")
+
+def run_worker(rank, world_size, epochs, port, seed, resume, telemetry=False):
+    # Entry point of one data-parallel CPU worker process
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    torch.distributed.init_process_group("gloo", rank=rank, world_size=world_size)
+    # split the cores between workers instead of oversubscribing them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    # identical seeds give every rank the same initial weights and shuffle order
+    torch.manual_seed(seed)
+    try:
+        run_training(epochs, torch.device("cpu"), rank, world_size, resume, telemetry=telemetry)
+    finally:
+        torch.distributed.destroy_process_group()
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
 
 # WARNING:
 # This file REQUIRES compile_main.py to be run before execution.
 # This is such that build/PrimaryModel.py exists and is up-to-date. 
 if __name__ == "__main__":
-    curr_model = PrimaryModel()
-    trainer = modelTrainer(curr_model)
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    loss = []
-    accs = []
-    out_filename = "backend/local/build/local_results.json"
-    model_filename = "backend/local/build/model_params.txt"
-    for epoch in range(int(sys.argv[1])):
-        train_loss, train_acc = trainer.train(device, epoch, loss, accs, out_filename)
-        test_result = trainer.test(device)
-        loss = train_loss
-        accs = train_acc
-        loss.append((float(epoch+1), test_result["loss"]))
-        accs.append((float(epoch+1), test_result["accuracy"]))
-        with open(out_filename, "w+") as outfile:
-            jsondict = {"losses": loss, "accuracies": accs}
-            outfile.write(json.dumps(jsondict, indent=4))
+    parser = argparse.ArgumentParser(description="Train the generated PrimaryModel")
+    parser.add_argument("epochs", type=int)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="train data-parallel on CPU across this many processes (gloo backend)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the checkpoint in build/model_params.txt")
+    parser.add_argument("--ensemble", type=int, default=0,
+                        help="train this many independently initialized copies in lockstep (vmapped)")
+    parser.add_argument("--learning-rates", type=float, nargs="+", default=None,
+                        help="one learning rate per ensemble member (implies --ensemble)")
+    parser.add_argument("--no-store", action="store_true",
+                        help="train from scratch with a random seed, without reusing or saving runs in build/run_store")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the weight initialization; defaults to the model's training.seed, else 0 (random "
+                             "with --no-store), so repeated runs of an unchanged model are reused from build/run_store")
+    parser.add_argument("--telemetry", action="store_true",
+                        help="record step latency, throughput and resource usage to build/telemetry.jsonl")
+    args = parser.parse_args()
+    if args.ensemble or args.learning_rates:
+        if args.processes > 1 or args.resume:
+            parser.error("--ensemble cannot be combined with --processes or --resume")
+        members = args.ensemble or len(args.learning_rates)
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        run_ensemble(args.epochs, device, members, args.learning_rates)
+    elif args.processes > 1:
+        seed = int(torch.randint(2**31 - 1, ()))
+        torch.multiprocessing.spawn(run_worker, args=(args.processes, args.epochs, free_port(), seed, args.resume, args.telemetry), nprocs=args.processes)
+    else:
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        packet = None if args.no_store else load_packet()
+        if args.seed is not None:
+            torch.manual_seed(args.seed)
+            if packet is not None:
+                packet.setdefault("training", {})["seed"] = args.seed
+        run_training(args.epochs, device, resume=args.resume, packet=packet, store=runStore(),
+                     telemetry=args.telemetry)
@@ -0,0 +1,239 @@
+import torch
+from modelTrain import modelTrainer
+from metricsLog import metricsLog, stream_filename
+import datasetCache
+
+import sys
+import os
+import argparse
+import concurrent.futures
+import copy
+import importlib.util
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import statistics
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(SCRIPT_DIR), "antlr"))
+
+from modelCodeGen import CodeGenerator
+from jsonLoader import process_json, load_model_json
+from shapeAnalyzer import analyze_layer, analyze_model, input_shape
+from modelGraph import layer_inputs, topological_order, INPUT
+
+# Hyperparameter sweep over a base model JSON.
+# The search space file looks like
+#   {"method": "grid" | "random", "num_trials": 20, "seed": 0,
+#    "parameters": {"optimizer.parameters.learning_rate": {"low": 1e-4, "high": 1e-1, "log": true},
+#                   "training.batch_size": [32, 64, 128],
+#                   "model.layers.1.width": [64, 128]}}
+# Keys are dotted paths into the model JSON (list positions are 0-based). Values are lists
+# of choices, or low/high ranges for random search. A ".width" key sets a linear layer's
+# out_shape or a conv2d layer's out_channels, and the inputs of downstream layers are
+# resized to match. Every variant is compiled under its own class name and trained in a
+# process pool; trials that fall below the median of their peers at the same checkpoint
+# are stopped early (median stopping rule).
+
+SWEEP_DIR = "backend/local/build/sweep"
+RESULTS_FILENAME = "backend/local/build/sweep_results.json"
+
+def set_path(tree, path, value):
+    keys = path.split(".")
+    for key in keys[:-1]:
+        tree = tree[int(key)] if isinstance(tree, list) else tree.setdefault(key, {})
+    if isinstance(tree, list):
+        tree[int(keys[-1])] = value
+    else:
+        tree[keys[-1]] = value
+
+def set_width(model_dict, path, value):
+    # path is "model.layers.<i>.width"
+    layer = model_dict["model"]["layers"][int(path.split(".")[-2])]
+    if layer["layer_type"] == "linear":
+        layer["out_shape"] = str(value)
+    elif layer["layer_type"] == "conv2d":
+        layer["out_channels"] = int(value)
+    else:
+        raise Exception(f"Cannot set the width of a {layer['layer_type']} layer")
+
+def repair_widths(model_dict):
+    # Rewrites the input sizes of linear, conv2d and flattening view layers to match their
+    # actual inputs, so that changing one layer's width keeps the graph consistent
+    layers = model_dict["model"]["layers"]
+    inputs = layer_inputs(model_dict)
+    shapes = {INPUT: input_shape(model_dict)}
+    for layer_idx in topological_order(inputs):
+        layer = layers[layer_idx - 1]
+        in_shapes = [shapes[src] for src in inputs[layer_idx - 1]]
+        if layer["layer_type"] == "linear":
+            layer["in_shape"] = in_shapes[0][-1]
+        elif layer["layer_type"] == "conv2d":
+            layer["in_channels"] = in_shapes[0][0]
+        elif layer["layer_type"] == "view" and "," not in str(layer["out_shape"]):
+            layer["out_shape"] = str(math.prod(in_shapes[0]))
+        shapes[layer_idx] = analyze_layer(layer_idx, layer, in_shapes)[0]
+
+def sample_value(spec, rng):
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    low, high = spec["low"], spec["high"]
+    if spec.get("log", False):
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    if isinstance(low, int) and isinstance(high, int):
+        return rng.randint(low, high)
+    return rng.uniform(low, high)
+
+def sample_trials(space):
+    parameters = space["parameters"]
+    if space.get("method", "grid") == "grid":
+        names = list(parameters)
+        return [dict(zip(names, values)) for values in itertools.product(*(parameters[name] for name in names))]
+    rng = random.Random(space.get("seed", 0))
+    return [{name: sample_value(spec, rng) for name, spec in parameters.items()} for _ in range(int(space.get("num_trials", 10)))]
+
+def compile_variant(base_dict, params, trial_id):
+    # Returns (filename, class name) of the generated variant; raises on an invalid graph
+    model_dict = copy.deepcopy(base_dict)
+    for path, value in params.items():
+        if path.endswith(".width"):
+            set_width(model_dict, path, value)
+        else:
+            set_path(model_dict, path, value)
+    # Sampled values bypass the checks the base packet went through, so the variant is
+    # validated and normalized again (raises SchemaError)
+    model_dict = load_model_json(model_dict)
+    repair_widths(model_dict)
+    # Trials read the pre-decoded dataset cache, which the sweep builds once up front
+    if model_dict["dataset"]["type"] in datasetCache.DECODERS:
+        model_dict["dataset"]["cache"] = True
+    analyze_model(model_dict)
+    class_name = f"SweepModel{trial_id}"
+    gen_obj = CodeGenerator(class_name)
+    gen_obj.set_model_dict(model_dict)
+    gen_str = gen_obj.str_traversal_codegen(gen_obj.codegen_model())
+    filename = os.path.join(SWEEP_DIR, f"{class_name}.py")
+    with open(filename, "w") as model_file:
+        model_file.write(gen_str)
+    return filename, class_name
+
+def init_worker(num_threads):
+    torch.set_num_threads(num_threads)
+
+def load_model_class(filename, class_name):
+    spec = importlib.util.spec_from_file_location(class_name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, class_name)
+
+def run_trial(trial, epochs, deadline, board, board_lock, min_reports):
+    # Trains one variant in a pool worker and returns its result record
+    result = {"trial": trial["trial"], "params": trial["params"], "status": "completed", "loss": None, "accuracy": None}
+    if time.time() > deadline:
+        result["status"] = "skipped"
+        return result
+    start_time = time.time()
+    model = load_model_class(trial["filename"], trial["class_name"])()
+    trainer = modelTrainer(model)
+    checkpoint_count = [0]
+
+    def should_stop(results):
+        if time.time() > deadline:
+            result["status"] = "timeout"
+            return True
+        for _, _, curr_acc in results:
+            checkpoint_idx = checkpoint_count[0]
+            checkpoint_count[0] += 1
+            with board_lock:
+                peers = board.get(checkpoint_idx, [])
+                board[checkpoint_idx] = peers + [curr_acc]
+            if len(peers) >= min_reports and curr_acc < statistics.median(peers):
+                result["status"] = "stopped"
+                return True
+        return False
+
+    trainer.should_stop = should_stop
+    out_dir = os.path.join(SWEEP_DIR, f"trial{trial['trial']}")
+    os.makedirs(out_dir, exist_ok=True)
+    out_filename = os.path.join(out_dir, "results.json")
+    # Clear the stream of any earlier sweep that ran this trial number
+    metricsLog(stream_filename(out_filename)).reset()
+    device = torch.device("cpu")
+    loss = []
+    accs = []
+    for epoch in range(epochs):
+        loss, accs = trainer.train(device, epoch, loss, accs, out_filename)
+        if trainer.stopped:
+            break
+        test_result = trainer.test(device)
+        trainer.record_results([(float(epoch+1), test_result["loss"], test_result["accuracy"])], loss, accs, out_filename)
+    if accs:
+        result["loss"] = loss[-1][1]
+        result["accuracy"] = accs[-1][1]
+    result["seconds"] = time.time() - start_time
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a hyperparameter sweep over a model JSON")
+    parser.add_argument("base_json")
+    parser.add_argument("space_json")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--time-budget", type=float, default=None, help="seconds before remaining trials are stopped")
+    parser.add_argument("--min-reports", type=int, default=3,
+                        help="peer results needed at a checkpoint before a trial can be stopped early")
+    args = parser.parse_args()
+
+    with open(args.base_json, "r") as json_file:
+        base_dict = process_json(json_file.read())
+    with open(args.space_json, "r") as space_file:
+        space = json.load(space_file)
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+
+    trials = []
+    results = []
+    for trial_id, params in enumerate(sample_trials(space)):
+        try:
+            filename, class_name = compile_variant(base_dict, params, trial_id)
+            trials.append({"trial": trial_id, "params": params, "filename": filename, "class_name": class_name})
+        except Exception as error:
+            results.append({"trial": trial_id, "params": params, "status": "invalid", "error": str(error), "loss": None, "accuracy": None})
+    print(f"Compiled {len(trials)} trials ({len(results)} invalid)")
+
+    # Decode the dataset once; every worker then maps the same cache file
+    dataset_type = base_dict["dataset"]["type"]
+    if dataset_type in datasetCache.DECODERS:
+        for train in (True, False):
+            if not os.path.exists(datasetCache.cache_filename(dataset_type, "build/data", train)):
+                datasetCache.build_cache(dataset_type, "build/data", train)
+
+    deadline = time.time() + args.time_budget if args.time_budget is not None else math.inf
+    num_threads = max(1, (os.cpu_count() or 1) // args.workers)
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        board = manager.dict()
+        board_lock = manager.Lock()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, mp_context=context,
+                                                    initializer=init_worker, initargs=(num_threads,)) as pool:
+            futures = {pool.submit(run_trial, trial, args.epochs, deadline, board, board_lock, args.min_reports): trial for trial in trials}
+            for future in concurrent.futures.as_completed(futures):
+                trial = futures[future]
+                try:
+                    result = future.result()
+                except Exception as error:
+                    result = {"trial": trial["trial"], "params": trial["params"], "status": "failed", "error": str(error), "loss": None, "accuracy": None}
+                print(f"Trial {result['trial']}: {result['status']}, accuracy {result['accuracy']}, params {result['params']}")
+                results.append(result)
+
+    results.sort(key=lambda result: -1 if result["accuracy"] is None else result["accuracy"], reverse=True)
+    with open(RESULTS_FILENAME, "w") as results_file:
+        results_file.write(json.dumps(results, indent=4))
+    if results and results[0]["accuracy"] is not None:
+        print(f"Best trial {results[0]['trial']}: accuracy {results[0]['accuracy']}, params {results[0]['params']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
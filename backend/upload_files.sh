@@ -1,13 +1,15 @@
 cd ../
 mkdir -p backend/local/build
+# Results come from Colab, so drop any metrics stream left by a local run
+rm -f backend/local/build/local_results.jsonl
 (echo Starting Code Generation...) > backend/local/build/model_run.log
 (python3 backend/antlr/compile_main.py frontend/build/model.json) >> backend/local/build/model_run.log 2>&1
 (echo Code Generation Finished!) >> backend/local/build/model_run.log
 (echo Starting Notebook Generation...) >> backend/local/build/model_run.log
-python3 backend/google/gen_notebook.py
+(python3 backend/google/gen_notebook.py) >> backend/local/build/model_run.log 2>&1
 (echo Notebook Generation Finished!) >> backend/local/build/model_run.log
 
 (echo Starting Notebook Upload...) >> backend/local/build/model_run.log
 python3 backend/google/gen_clientsecrets.py
-python3 backend/google/file_uploader.py backend/google/build/PrimaryModel.ipynb
+python3 backend/google/file_uploader.py backend/google/build/PrimaryModel.ipynb backend/google/build/bundle.json
 (echo Notebook Upload Finished!) >> backend/local/build/model_run.log
\ No newline at end of file
@@ -0,0 +1,46 @@
+import { NextResponse } from 'next/server';
+import path from 'path';
+import { readStream } from '@/lib/jsonlStream';
+
+interface LayerStats {
+  layer: string;
+  type: string;
+  calls: number;
+  forward_ms: number;
+  backward_ms: number;
+  output_bytes: number;
+  parameter_bytes: number;
+  // CUDA allocator peak on GPU; output plus parameter bytes on CPU
+  peak_memory_bytes: number;
+  memory_source: 'cuda_peak' | 'output_plus_parameters';
+}
+
+interface ProfileWindow {
+  step: number;
+  window: number;
+  layers: LayerStats[];
+}
+
+// Returns the per-layer profile windows written during training of a model compiled with
+// "training": {"profile": true}. ?all=1 returns every window, otherwise only the latest.
+export async function GET(request: Request) {
+  try {
+    // Construct the path relative to the project root (one level up from frontend cwd)
+    const projectRoot = path.resolve(process.cwd(), '..');
+    const profilePath = path.join(projectRoot, 'backend/local/build/layer_profile.jsonl');
+
+    // Only complete lines, without the stream header
+    const { records: windows } = await readStream<ProfileWindow>(profilePath);
+
+    if (new URL(request.url).searchParams.get('all') !== null) {
+      return NextResponse.json({ windows });
+    }
+    return NextResponse.json({ latest: windows.length > 0 ? windows[windows.length - 1] : null });
+  } catch (error) {
+    console.error('Error reading layer profile:', error);
+    if ((error as NodeJS.ErrnoException).code === 'ENOENT') {
+      return NextResponse.json({ error: 'Layer profile not found.' }, { status: 404 });
+    }
+    return NextResponse.json({ error: 'Failed to load layer profile.' }, { status: 500 });
+  }
+}
@@ -1,15 +1,33 @@
 import { NextResponse } from 'next/server';
 import fs from 'fs/promises';
 import path from 'path';
+import { readStream, streamPosition } from '@/lib/jsonlStream';
 
-export async function GET() {
+// Returns model_run.log as text. ?stream=telemetry instead returns the run's telemetry
+// records ("train" windows, "eval", "epoch" and "run", see backend/local/runTelemetry.py) as
+// JSON; with ?offset=N&generation=G only the records appended since that read.
+export async function GET(request: Request) {
   try {
     console.log("pwd", process.cwd());
-    const logPath = path.resolve(process.cwd(), '../../torchblocks/backend/local/build/model_run.log');
-    
+    const buildDir = path.resolve(process.cwd(), '../../torchblocks/backend/local/build');
+
+    if (new URL(request.url).searchParams.get('stream') === 'telemetry') {
+      const { offset, generation } = streamPosition(request.url);
+      try {
+        return NextResponse.json(await readStream(path.join(buildDir, 'telemetry.jsonl'), offset, generation));
+      } catch (error) {
+        if ((error as NodeJS.ErrnoException).code === 'ENOENT') {
+          return NextResponse.json({ error: 'Telemetry not found. Enable "telemetry" in the training options.' }, { status: 404 });
+        }
+        throw error;
+      }
+    }
+
+    const logPath = path.join(buildDir, 'model_run.log');
+
     // Read the log file
     const logContent = await fs.readFile(logPath, 'utf-8');
-    
+
     return new NextResponse(logContent, {
       headers: {
         'Content-Type': 'text/plain',
@@ -19,4 +37,4 @@ export async function GET() {
     console.error('Error fetching logs:', error);
     return NextResponse.json({ error: 'Failed to fetch logs' }, { status: 500 });
   }
-} 
\ No newline at end of file
+}
@@ -1,12 +1,41 @@
 import { NextResponse } from 'next/server';
 import fs from 'fs/promises';
 import path from 'path';
+import { readStream, streamPosition } from '@/lib/jsonlStream';
 
-export async function GET() {
+interface MetricsRecord {
+  progress: number;
+  loss: number;
+  accuracy: number;
+}
+
+export async function GET(request: Request) {
   try {
     // Construct the path relative to the project root (one level up from frontend cwd)
     const projectRoot = path.resolve(process.cwd(), '..');
     const filePath = path.join(projectRoot, 'backend/local/build/local_results.json');
+    const streamPath = path.join(projectRoot, 'backend/local/build/local_results.jsonl');
+
+    // Incremental polling (TestResultsView): ?offset=N&generation=G returns only the records
+    // appended since the last poll, or every record with reset: true if a new run restarted
+    // the stream
+    if (new URL(request.url).searchParams.get('offset') !== null) {
+      const { offset, generation } = streamPosition(request.url);
+      return NextResponse.json(await readStream<MetricsRecord>(streamPath, offset, generation));
+    }
+
+    // Full history in the legacy format, preferring the live stream when present
+    try {
+      const { records } = await readStream<MetricsRecord>(streamPath);
+      return NextResponse.json({
+        losses: records.map((record) => [record.progress, record.loss]),
+        accuracies: records.map((record) => [record.progress, record.accuracy]),
+      });
+    } catch (streamError) {
+      if ((streamError as NodeJS.ErrnoException).code !== 'ENOENT') {
+        throw streamError;
+      }
+    }
 
     // Read the file content
     const data = await fs.readFile(filePath, 'utf-8');
@@ -31,4 +60,4 @@ export async function GET() {
 
     return NextResponse.json({ error: errorMessage }, { status });
   }
-} 
\ No newline at end of file
+}
@@ -1,9 +1,57 @@
 import { exec } from 'child_process';
 import { NextResponse } from 'next/server';
+import fs from 'fs/promises';
 import path from 'path';
 
+// Warm training daemon (backend/local/daemon_main.py), used when one is running
+const DAEMON_URL = process.env.TRAINING_DAEMON_URL ?? 'http://127.0.0.1:8765';
+// Session token the daemon requires in every request; it writes it here at startup
+const DAEMON_TOKEN_PATH = path.resolve(process.cwd(), '../../torchblocks/backend/local/build/daemon_token');
+
+async function daemonToken(): Promise<string | null> {
+  if (process.env.TRAINING_DAEMON_TOKEN) {
+    return process.env.TRAINING_DAEMON_TOKEN;
+  }
+  try {
+    return (await fs.readFile(DAEMON_TOKEN_PATH, 'utf-8')).trim();
+  } catch {
+    return null;
+  }
+}
+
+// Compiles and trains the saved model on the daemon, waiting for its event stream to end.
+// Returns false if no daemon is running, so the caller can fall back to run_all.sh.
+async function runOnDaemon(): Promise<boolean> {
+  const token = await daemonToken();
+  if (token === null) {
+    return false;
+  }
+  const modelJson = await fs.readFile(path.resolve(process.cwd(), 'build/model.json'), 'utf-8');
+  let response: Response;
+  try {
+    response = await fetch(`${DAEMON_URL}/run?epochs=2`, {
+      method: 'POST',
+      headers: { 'X-Daemon-Token': token },
+      body: modelJson,
+    });
+  } catch {
+    return false;
+  }
+  if (!response.ok) {
+    throw new Error(`Training daemon returned ${response.status}`);
+  }
+  // Model and training errors are reported in model_run.log, as with run_all.sh
+  const events = await response.text();
+  console.log(`Daemon output: ${events}`);
+  return true;
+}
+
 export async function POST() {
   try {
+    if (await runOnDaemon()) {
+      return NextResponse.json({ success: true });
+    }
+
     const scriptPath = path.resolve(process.cwd(), '../../torchblocks/backend/run_all.sh');
     
     // Execute the shell script
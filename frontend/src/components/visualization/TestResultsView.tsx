@@ -21,42 +21,95 @@ interface ResultsData {
   accuracies: [number, number][];
 }
 
+interface MetricsRecord {
+  progress: number;
+  loss: number;
+  accuracy: number;
+}
+
+interface StreamRead {
+  records: MetricsRecord[];
+  offset: number;
+  generation: string | null;
+  reset: boolean;
+}
+
+const POLL_INTERVAL_MS = 2000;
+
+const toDataPoint = (record: MetricsRecord): DataPoint => ({
+  epoch: parseFloat(record.progress.toFixed(2)),
+  loss: record.loss,
+  accuracy: record.accuracy,
+});
+
 const TestResultsView: React.FC = () => {
   const [chartData, setChartData] = useState<DataPoint[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
-    const fetchData = async () => {
-      setIsLoading(true);
-      setError(null);
+    // Polls the metrics stream incrementally: each request returns only the records appended
+    // since the last one, or the whole new stream (reset) once a new run has restarted it
+    let offset = 0;
+    let generation: string | null = null;
+    let cancelled = false;
+    let timer: ReturnType<typeof setTimeout> | undefined;
+
+    // Results without a stream (such as a Colab run's) come as one legacy results file
+    const fetchFullHistory = async () => {
+      const response = await fetch('/api/get-test-results');
+      if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+      }
+      const results: ResultsData = await response.json();
+      return results.losses.map((lossPoint, index) => {
+        const accuracyPoint = results.accuracies[index] || [lossPoint[0], 0]; // Handle potential mismatch
+        return toDataPoint({ progress: lossPoint[0], loss: lossPoint[1], accuracy: accuracyPoint[1] });
+      });
+    };
+
+    const poll = async () => {
       try {
-        const response = await fetch('/api/get-test-results');
-        if (!response.ok) {
+        const query = `offset=${offset}` + (generation !== null ? `&generation=${encodeURIComponent(generation)}` : '');
+        const response = await fetch(`/api/get-test-results?${query}`);
+        if (response.status === 404 && offset === 0) {
+          const fullHistory = await fetchFullHistory();
+          if (!cancelled) {
+            setChartData(fullHistory);
+            setError(null);
+          }
+        } else if (!response.ok) {
           const errorData = await response.json();
           throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+        } else {
+          const read: StreamRead = await response.json();
+          const points = read.records.map(toDataPoint);
+          if (!cancelled && (read.reset || offset === 0 || points.length > 0)) {
+            const replace = read.reset || offset === 0;
+            setChartData((previous) => (replace ? points : previous.concat(points)));
+            setError(null);
+          }
+          offset = read.offset;
+          generation = read.generation;
         }
-        const results: ResultsData = await response.json();
-
-        // Process data for recharts
-        const processedData: DataPoint[] = results.losses.map((lossPoint, index) => {
-          const accuracyPoint = results.accuracies[index] || [lossPoint[0], 0]; // Handle potential mismatch
-          return {
-            epoch: parseFloat(lossPoint[0].toFixed(2)), // Use epoch from loss data, format
-            loss: lossPoint[1],
-            accuracy: accuracyPoint[1],
-          };
-        });
-
-        setChartData(processedData);
       } catch (e) {
-        setError(e instanceof Error ? e.message : 'Failed to load test results');
+        if (!cancelled) {
+          setError(e instanceof Error ? e.message : 'Failed to load test results');
+        }
         console.error('Fetch error:', e);
       }
-      setIsLoading(false);
+      if (!cancelled) {
+        setIsLoading(false);
+        timer = setTimeout(poll, POLL_INTERVAL_MS);
+      }
     };
 
-    fetchData();
+    poll();
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
   }, []);
 
   if (isLoading) {
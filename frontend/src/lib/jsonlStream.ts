@@ -0,0 +1,71 @@
+import fs from 'fs/promises';
+
+// Incremental reader of the append-only JSONL streams written by backend/local/metricsLog.py
+// (metrics, telemetry and layer profile). A stream starts with a header line
+// {"stream": <generation id>} that changes every time a run resets it. Callers pass back the
+// offset and generation of their last read; a changed generation (or a stream shorter than
+// the offset) means it was reset, so it is read again from the start with reset: true.
+// Only complete lines are returned; a trailing partial line is a write in progress.
+
+export interface StreamRead<T> {
+  records: T[];
+  offset: number;
+  generation: string | null;
+  reset: boolean;
+}
+
+// A header line is about 45 bytes; this bounds how much is read to find it
+const HEADER_BYTES = 256;
+
+async function readHeader(handle: fs.FileHandle) {
+  const buffer = Buffer.alloc(HEADER_BYTES);
+  const { bytesRead } = await handle.read(buffer, 0, HEADER_BYTES, 0);
+  const end = buffer.subarray(0, bytesRead).indexOf('\n');
+  if (end >= 0) {
+    try {
+      const header = JSON.parse(buffer.subarray(0, end).toString('utf-8'));
+      if (header !== null && typeof header === 'object' && Object.keys(header).length === 1 && 'stream' in header) {
+        return { generation: String(header.stream), headerEnd: end + 1 };
+      }
+    } catch {
+      // not a header: a stream written before headers existed
+    }
+  }
+  return { generation: null, headerEnd: 0 };
+}
+
+export async function readStream<T>(streamPath: string, offset = 0, generation: string | null = null): Promise<StreamRead<T>> {
+  const handle = await fs.open(streamPath, 'r');
+  try {
+    const { size } = await handle.stat();
+    const header = await readHeader(handle);
+    const reset = offset > 0 && (header.generation !== generation || offset > size);
+    if (offset === 0 || reset) {
+      offset = header.headerEnd;
+    }
+    if (size <= offset) {
+      return { records: [], offset, generation: header.generation, reset };
+    }
+    const buffer = Buffer.alloc(size - offset);
+    const { bytesRead } = await handle.read(buffer, 0, buffer.length, offset);
+    const end = buffer.subarray(0, bytesRead).lastIndexOf('\n') + 1;
+    const records = buffer
+      .subarray(0, end)
+      .toString('utf-8')
+      .split('\n')
+      .filter((line) => line.trim().length > 0)
+      .map((line) => JSON.parse(line) as T);
+    return { records, offset: offset + end, generation: header.generation, reset };
+  } finally {
+    await handle.close();
+  }
+}
+
+// Reads ?offset=N&generation=G from a request URL
+export function streamPosition(url: string) {
+  const searchParams = new URL(url).searchParams;
+  return {
+    offset: Math.max(0, parseInt(searchParams.get('offset') ?? '0', 10) || 0),
+    generation: searchParams.get('generation'),
+  };
+}